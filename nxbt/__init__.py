@@ -1,12 +1,46 @@
-from .controller import ControllerServer
-from .controller import ControllerProtocol
-from .controller import SwitchReportParser
-from .controller import SwitchResponses
-from .controller import Controller
-from .bluez import *
-from .nxbt import Nxbt
-from .nxbt import Buttons
-from .nxbt import Sticks
-from .nxbt import JOYCON_L
-from .nxbt import JOYCON_R
-from .nxbt import PRO_CONTROLLER
+from .lazy import lazy_attributes
+
+
+# Public attributes are loaded lazily (PEP 562) so that importing
+# nxbt (or one of its lightweight submodules) doesn't pull in D-Bus
+# and the other heavy dependencies until they're actually needed.
+# Maps each attribute name to the submodule that defines it.
+_LAZY_ATTRIBUTES = {
+    # Controller
+    "ControllerServer": ".controller",
+    "ControllerProtocol": ".controller",
+    "SwitchReportParser": ".controller",
+    "SwitchResponses": ".controller",
+    "Controller": ".controller",
+    # BlueZ
+    "SERVICE_NAME": ".bluez",
+    "BLUEZ_OBJECT_PATH": ".bluez",
+    "ADAPTER_INTERFACE": ".bluez",
+    "PROFILEMANAGER_INTERFACE": ".bluez",
+    "DEVICE_INTERFACE": ".bluez",
+    "OBJECT_MANAGER_INTERFACE": ".bluez",
+    "PROPERTIES_INTERFACE": ".bluez",
+    "find_object_path": ".bluez",
+    "find_objects": ".bluez",
+    "toggle_clean_bluez": ".bluez",
+    "clean_sdp_records": ".bluez",
+    "get_random_controller_mac": ".bluez",
+    "replace_mac_addresses": ".bluez",
+    "find_devices_by_alias": ".bluez",
+    "disconnect_devices_by_alias": ".bluez",
+    "BlueZ": ".bluez",
+    "BlueZObjectIndex": ".bluez",
+    "get_object_index": ".bluez",
+    "invalidate_object_index": ".bluez",
+    # Nxbt
+    "Nxbt": ".nxbt",
+    "Buttons": ".nxbt",
+    "Sticks": ".nxbt",
+    "JOYCON_L": ".nxbt",
+    "JOYCON_R": ".nxbt",
+    "PRO_CONTROLLER": ".nxbt",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES.keys())
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
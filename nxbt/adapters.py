@@ -0,0 +1,287 @@
+import time
+import logging
+from threading import RLock
+
+from .bluez import get_object_index, ADAPTER_INTERFACE
+
+
+class AdapterPool():
+    """Tracks the Bluetooth adapters available to nxbt and assigns
+    controllers to the healthiest free adapter.
+
+    Each adapter's health is scored from its connection history:
+    the success rate of its controllers, how long they took to connect
+    and how often they had to reconnect. Adapters being plugged in or
+    removed are picked up from the BlueZ object index.
+    """
+
+    # Penalty caps for slow connections and frequent reconnects.
+    # The success rate is the main component of an adapter's score.
+    CONNECT_TIME_PENALTY_CAP = 0.25
+    CONNECT_TIME_PENALTY_SCALE = 120
+    RECONNECT_PENALTY_CAP = 0.25
+    RECONNECT_PENALTY_SCALE = 0.05
+
+    def __init__(self):
+
+        self.logger = logging.getLogger('nxbt')
+        self._lock = RLock()
+
+        # Adapter path -> adapter statistics
+        self._adapters = {}
+        # Controller index -> assignment tracking
+        self._assignments = {}
+
+        self.index = get_object_index()
+        for path in self.index.find_objects(ADAPTER_INTERFACE):
+            self._add_adapter(path)
+        self.index.add_object_listener(self._on_object_changed)
+
+    def _add_adapter(self, path):
+
+        with self._lock:
+            adapter = self._adapters.get(path)
+            if adapter is None:
+                adapter = {
+                    "present": True,
+                    "controller_index": None,
+                    "attempts": 0,
+                    "successes": 0,
+                    "failures": 0,
+                    "reconnects": 0,
+                    "connect_times": [],
+                    "hotplug_adds": 0,
+                    "hotplug_removes": 0,
+                    "last_hotplug": None,
+                }
+                self._adapters[path] = adapter
+            adapter["present"] = True
+
+            return adapter
+
+    def _on_object_changed(self, path, interfaces, added):
+
+        if ADAPTER_INTERFACE not in interfaces:
+            return
+
+        with self._lock:
+            if added:
+                adapter = self._add_adapter(path)
+                adapter["hotplug_adds"] += 1
+                self.logger.debug(f"Adapter added: {path}")
+            else:
+                adapter = self._adapters.get(path)
+                if adapter is None:
+                    return
+                adapter["present"] = False
+                adapter["hotplug_removes"] += 1
+                self.logger.debug(f"Adapter removed: {path}")
+            adapter["last_hotplug"] = time.time()
+
+    def _sync(self):
+        """Reconciles the pool with the index when hot-plug signals
+        aren't available.
+        """
+
+        if self.index.subscribed:
+            return
+
+        paths = set(self.index.find_objects(ADAPTER_INTERFACE))
+        with self._lock:
+            for path in paths:
+                adapter = self._adapters.get(path)
+                if adapter is None or not adapter["present"]:
+                    self._on_object_changed(path, [ADAPTER_INTERFACE], True)
+            for path, adapter in list(self._adapters.items()):
+                if adapter["present"] and path not in paths:
+                    self._on_object_changed(path, [ADAPTER_INTERFACE], False)
+
+    def score(self, path):
+        """Calculates the health score of an adapter. Higher is better.
+
+        :param path: The DBus path of the adapter
+        :type path: str
+        :return: The adapter's score
+        :rtype: float
+        """
+
+        with self._lock:
+            adapter = self._adapters[path]
+
+            # Smoothed so that unused adapters start at 0.5
+            success_rate = (adapter["successes"] + 1) / (adapter["attempts"] + 2)
+
+            penalty = 0
+            if adapter["connect_times"]:
+                mean_time = sum(adapter["connect_times"]) / len(adapter["connect_times"])
+                penalty += min(mean_time / self.CONNECT_TIME_PENALTY_SCALE,
+                               self.CONNECT_TIME_PENALTY_CAP)
+            reconnect_rate = adapter["reconnects"] / max(adapter["successes"], 1)
+            penalty += min(reconnect_rate * self.RECONNECT_PENALTY_SCALE,
+                           self.RECONNECT_PENALTY_CAP)
+
+            return success_rate - penalty
+
+    @property
+    def adapters(self):
+        """The paths of all present adapters, best scoring first.
+
+        :return: A list of adapter paths
+        :rtype: list
+        """
+
+        self._sync()
+        with self._lock:
+            paths = [path for path, adapter in self._adapters.items()
+                     if adapter["present"]]
+            # Sorting by path first keeps ties in a stable order
+            return sorted(sorted(paths), key=self.score, reverse=True)
+
+    @property
+    def free_adapters(self):
+        """The paths of all present adapters without a controller,
+        best scoring first.
+
+        :return: A list of adapter paths
+        :rtype: list
+        """
+
+        with self._lock:
+            return [path for path in self.adapters
+                    if self._adapters[path]["controller_index"] is None]
+
+    def acquire(self, controller_index, adapter_path=None):
+        """Assigns a controller to an adapter. If no adapter is
+        specified, the best scoring free adapter is used.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :param adapter_path: The DBus path of an adapter, defaults to None
+        :type adapter_path: str, optional
+        :raises ValueError: If specified adapter is unavailable
+        :raises ValueError: If specified adapter is in use
+        :raises ValueError: If no adapters are available
+        :return: The DBus path of the assigned adapter
+        :rtype: str
+        """
+
+        with self._lock:
+            if adapter_path:
+                if adapter_path not in self.adapters:
+                    raise ValueError("Specified adapter is unavailable")
+                if self._adapters[adapter_path]["controller_index"] is not None:
+                    raise ValueError("Specified adapter in use")
+            else:
+                free = self.free_adapters
+                if len(free) < 1:
+                    raise ValueError("No adapters available")
+                adapter_path = free[0]
+
+            adapter = self._adapters[adapter_path]
+            adapter["controller_index"] = controller_index
+            adapter["attempts"] += 1
+            self._assignments[controller_index] = {
+                "adapter_path": adapter_path,
+                "connected": False,
+                "crashed": False,
+                "reconnects": 0,
+            }
+
+            return adapter_path
+
+    def release(self, controller_index):
+        """Frees the adapter assigned to a controller.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :return: The DBus path of the freed adapter or None if the
+        controller wasn't assigned to one
+        :rtype: str or None
+        """
+
+        with self._lock:
+            assignment = self._assignments.pop(controller_index, None)
+            if assignment is None:
+                return None
+
+            adapter = self._adapters.get(assignment["adapter_path"])
+            if adapter and adapter["controller_index"] == controller_index:
+                adapter["controller_index"] = None
+
+            return assignment["adapter_path"]
+
+    def adapter_for(self, controller_index):
+        """Gets the adapter assigned to a controller.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :return: The DBus path of the adapter or None
+        :rtype: str or None
+        """
+
+        with self._lock:
+            assignment = self._assignments.get(controller_index)
+            return assignment["adapter_path"] if assignment else None
+
+    def observe(self, controller_index, state):
+        """Records the outcome of a controller's connection attempts
+        from its shared state.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :param state: The controller's state dict
+        :type state: dict
+        """
+
+        with self._lock:
+            assignment = self._assignments.get(controller_index)
+            if assignment is None:
+                return
+            adapter = self._adapters[assignment["adapter_path"]]
+
+            if state["state"] == "connected" and not assignment["connected"]:
+                assignment["connected"] = True
+                adapter["successes"] += 1
+                if state.get("connection_time") is not None:
+                    adapter["connect_times"].append(state["connection_time"])
+                    # Only the recent history is kept
+                    del adapter["connect_times"][:-20]
+            elif state["state"] == "crashed" and not assignment["crashed"]:
+                assignment["crashed"] = True
+                adapter["failures"] += 1
+
+            reconnects = state.get("reconnects", 0)
+            if reconnects > assignment["reconnects"]:
+                adapter["reconnects"] += reconnects - assignment["reconnects"]
+                assignment["reconnects"] = reconnects
+
+    def stats(self):
+        """Gets the statistics of every adapter the pool has seen.
+
+        :return: A dict of adapter paths to their statistics
+        :rtype: dict
+        """
+
+        self._sync()
+        stats = {}
+        with self._lock:
+            for path, adapter in self._adapters.items():
+                connect_times = adapter["connect_times"]
+                stats[path] = {
+                    "present": adapter["present"],
+                    "controller_index": adapter["controller_index"],
+                    "attempts": adapter["attempts"],
+                    "successes": adapter["successes"],
+                    "failures": adapter["failures"],
+                    "success_rate": (adapter["successes"] / adapter["attempts"]
+                                     if adapter["attempts"] else None),
+                    "reconnects": adapter["reconnects"],
+                    "mean_connection_time": (sum(connect_times) / len(connect_times)
+                                             if connect_times else None),
+                    "hotplug_adds": adapter["hotplug_adds"],
+                    "hotplug_removes": adapter["hotplug_removes"],
+                    "last_hotplug": adapter["last_hotplug"],
+                    "score": self.score(path),
+                }
+
+        return stats
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import fcntl
+import logging
+
+
+DEFAULT_AFFINITY_PATH = os.path.join(
+    os.path.expanduser("~"), ".nxbt", "switch_affinity.json")
+
+
+class SwitchAffinityCache():
+    """An on-disk cache mapping each Bluetooth adapter's MAC address
+    to the Nintendo Switch it last connected to successfully.
+
+    Reconnecting controllers try the affine Switch first, which
+    avoids working through every previously connected Switch.
+    The cache file is shared by all controller processes, so reads
+    and writes are serialized with a file lock.
+    """
+
+    def __init__(self, path=None):
+        """Initializes the cache.
+
+        :param path: The location of the cache file, defaults to
+        ~/.nxbt/switch_affinity.json (or the NXBT_AFFINITY_PATH
+        environment variable, if set)
+        :type path: str, optional
+        """
+
+        self.logger = logging.getLogger('nxbt')
+
+        if path is None:
+            path = os.environ.get("NXBT_AFFINITY_PATH", DEFAULT_AFFINITY_PATH)
+        self.path = path
+
+    def _load(self, f):
+
+        f.seek(0)
+        try:
+            return json.loads(f.read() or "{}")
+        except ValueError:
+            # A corrupt cache is treated as empty
+            return {}
+
+    def _open(self):
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a+")
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+        return f
+
+    def get(self, adapter_address):
+        """Gets the address of the Switch an adapter last connected to.
+
+        :param adapter_address: The Bluetooth MAC address of the adapter
+        :type adapter_address: str
+        :return: The affine Switch's address or None
+        :rtype: str or None
+        """
+
+        try:
+            with self._open() as f:
+                entry = self._load(f).get(adapter_address.upper())
+        except OSError as e:
+            self.logger.debug(e)
+            return None
+
+        if entry is None:
+            return None
+
+        return entry["address"]
+
+    def record(self, adapter_address, switch_address):
+        """Records a successful connection between an adapter
+        and a Switch.
+
+        :param adapter_address: The Bluetooth MAC address of the adapter
+        :type adapter_address: str
+        :param switch_address: The Bluetooth MAC address of the Switch
+        :type switch_address: str
+        """
+
+        try:
+            with self._open() as f:
+                cache = self._load(f)
+                cache[adapter_address.upper()] = {
+                    "address": switch_address.upper(),
+                    "timestamp": time.time(),
+                }
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(cache, indent=4))
+        except OSError as e:
+            # The cache is only an optimization
+            self.logger.debug(e)
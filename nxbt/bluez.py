@@ -6,15 +6,360 @@ import logging
 from shutil import which
 import random
 from pathlib import Path
+from threading import Thread, RLock
 
 import dbus
 
+from . import hci
+
 
 SERVICE_NAME = "org.bluez"
 BLUEZ_OBJECT_PATH = "/org/bluez"
 ADAPTER_INTERFACE = SERVICE_NAME + ".Adapter1"
 PROFILEMANAGER_INTERFACE = SERVICE_NAME + ".ProfileManager1"
 DEVICE_INTERFACE = SERVICE_NAME + ".Device1"
+OBJECT_MANAGER_INTERFACE = "org.freedesktop.DBus.ObjectManager"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+
+class BlueZObjectIndex():
+    """A process-local, in-memory index of the objects BlueZ exposes
+    over D-Bus (adapters, devices, etc) along with their properties.
+
+    The index is seeded with a single GetManagedObjects call and is
+    kept current with the InterfacesAdded, InterfacesRemoved and
+    PropertiesChanged signals. Receiving signals requires a GLib
+    mainloop (PyGObject). If it's unavailable, the index falls back
+    to reseeding itself when a lookup finds it older than max_age.
+    Changes made by NXBT itself (Eg: adapter resets) invalidate the
+    index so that the next lookup reseeds it either way.
+    """
+
+    def __init__(self, max_age=1.0, subscribe=True):
+        """Initializes the index, subscribes to BlueZ signals,
+        and seeds the index.
+
+        :param max_age: The maximum age (in seconds) of the index
+        before it's reseeded when signals are unavailable,
+        defaults to 1.0
+        :type max_age: float, optional
+        :param subscribe: Whether to subscribe to BlueZ signals, which
+        starts a mainloop thread. Processes that go on to fork
+        shouldn't subscribe, defaults to True
+        :type subscribe: bool, optional
+        """
+
+        self.logger = logging.getLogger('nxbt')
+        self.pid = os.getpid()
+        self.max_age = max_age
+
+        self._lock = RLock()
+        self._objects = {}
+        self._last_refresh = 0
+        self._stale = False
+        self._listeners = []
+        self._object_listeners = []
+
+        self.subscribed = False
+        self.bus = None
+        if subscribe:
+            self._subscribe()
+        if self.bus is None:
+            self.bus = dbus.SystemBus(private=True)
+
+        self.refresh()
+
+    def _subscribe(self):
+        """Attempts to subscribe to the BlueZ object signals on a
+        private bus driven by a GLib mainloop in a daemon thread.
+        """
+
+        try:
+            from gi.repository import GLib
+            from dbus.mainloop.glib import DBusGMainLoop
+        except ImportError:
+            self.logger.debug(
+                "GLib is unavailable, BlueZ objects will be polled")
+            return
+
+        self.bus = dbus.SystemBus(
+            private=True, mainloop=DBusGMainLoop(set_as_default=False))
+        self.bus.add_signal_receiver(
+            self._on_interfaces_added,
+            dbus_interface=OBJECT_MANAGER_INTERFACE,
+            signal_name="InterfacesAdded",
+            bus_name=SERVICE_NAME)
+        self.bus.add_signal_receiver(
+            self._on_interfaces_removed,
+            dbus_interface=OBJECT_MANAGER_INTERFACE,
+            signal_name="InterfacesRemoved",
+            bus_name=SERVICE_NAME)
+        self.bus.add_signal_receiver(
+            self._on_properties_changed,
+            dbus_interface=PROPERTIES_INTERFACE,
+            signal_name="PropertiesChanged",
+            bus_name=SERVICE_NAME,
+            path_keyword="path")
+        # BlueZ doesn't announce its objects' removal when the
+        # service restarts, so the index is reseeded instead.
+        self.bus.watch_name_owner(SERVICE_NAME, self._on_owner_changed)
+
+        loop = GLib.MainLoop()
+        loop_thread = Thread(target=loop.run, daemon=True)
+        loop_thread.start()
+
+        self.subscribed = True
+
+    def refresh(self):
+        """Reseeds the index with the objects currently managed by BlueZ.
+        """
+
+        manager = dbus.Interface(
+            self.bus.get_object(SERVICE_NAME, "/"),
+            OBJECT_MANAGER_INTERFACE)
+        objects = {}
+        for path, interfaces in manager.GetManagedObjects().items():
+            objects[str(path)] = {
+                str(iface): dict(props) for iface, props in interfaces.items()}
+
+        with self._lock:
+            self._objects = objects
+            self._last_refresh = time.monotonic()
+            self._stale = False
+
+    def close(self):
+        """Closes the index's private D-Bus connection.
+        """
+
+        self.bus.close()
+
+    def invalidate(self):
+        """Marks the index as stale so that it's reseeded on the
+        next lookup.
+        """
+
+        with self._lock:
+            self._stale = True
+
+    def _refresh_if_stale(self):
+
+        if self._stale:
+            self.refresh()
+        elif (not self.subscribed and
+                time.monotonic() - self._last_refresh > self.max_age):
+            self.refresh()
+
+    def _on_interfaces_added(self, path, interfaces):
+
+        with self._lock:
+            obj = self._objects.setdefault(str(path), {})
+            for iface, props in interfaces.items():
+                obj[str(iface)] = dict(props)
+            listeners = list(self._object_listeners)
+
+        self._notify(listeners, str(path), [str(i) for i in interfaces], True)
+
+    def _on_interfaces_removed(self, path, interfaces):
+
+        with self._lock:
+            obj = self._objects.get(str(path))
+            if obj is None:
+                return
+            for iface in interfaces:
+                obj.pop(str(iface), None)
+            if not obj:
+                del self._objects[str(path)]
+            listeners = list(self._object_listeners)
+
+        self._notify(listeners, str(path), [str(i) for i in interfaces], False)
+
+    def _notify(self, listeners, *args):
+
+        for listener in listeners:
+            try:
+                listener(*args)
+            except Exception as e:
+                self.logger.debug(e)
+
+    def _on_properties_changed(self, interface, changed, invalidated, path=None):
+
+        with self._lock:
+            obj = self._objects.get(str(path))
+            if obj is None or str(interface) not in obj:
+                return
+            props = obj[str(interface)]
+            props.update(changed)
+            for prop in invalidated:
+                props.pop(str(prop), None)
+            listeners = list(self._listeners)
+
+        self._notify(listeners, str(path), str(interface), dict(changed))
+
+    def add_listener(self, callback):
+        """Adds a callback that is run on the signal thread whenever
+        an indexed object's properties change. The callback is passed
+        the object path, the interface name and a dict of the changed
+        properties. Listeners are only run if the index is subscribed
+        to BlueZ signals.
+
+        :param callback: The callback function
+        :type callback: function
+        """
+
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Removes a previously added property change callback.
+
+        :param callback: The callback function
+        :type callback: function
+        """
+
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def add_object_listener(self, callback):
+        """Adds a callback that is run on the signal thread whenever
+        interfaces are added to or removed from an object (Eg: when
+        an adapter is plugged in or removed). The callback is passed
+        the object path, a list of the interface names and a boolean
+        that's True if the interfaces were added. Listeners are only
+        run if the index is subscribed to BlueZ signals.
+
+        :param callback: The callback function
+        :type callback: function
+        """
+
+        with self._lock:
+            self._object_listeners.append(callback)
+
+    def remove_object_listener(self, callback):
+        """Removes a previously added object callback.
+
+        :param callback: The callback function
+        :type callback: function
+        """
+
+        with self._lock:
+            if callback in self._object_listeners:
+                self._object_listeners.remove(callback)
+
+    def _on_owner_changed(self, owner):
+
+        if owner:
+            try:
+                self.refresh()
+            except dbus.exceptions.DBusException as e:
+                self.logger.debug(e)
+        else:
+            with self._lock:
+                self._objects = {}
+
+    def find_objects(self, interface_name):
+        """Gets the paths of all indexed objects that implement
+        a given interface.
+
+        :param interface_name: The name of a D-Bus interface
+        :type interface_name: string
+        :return: A list of object paths
+        :rtype: list
+        """
+
+        self._refresh_if_stale()
+        with self._lock:
+            return [path for path, ifaces in self._objects.items()
+                    if interface_name in ifaces]
+
+    def get_properties(self, path, interface_name):
+        """Gets a copy of the indexed properties of an object's interface.
+
+        :param path: The D-Bus object path
+        :type path: string
+        :param interface_name: The name of a D-Bus interface
+        :type interface_name: string
+        :return: The properties or None if the object or interface
+        isn't indexed
+        :rtype: dict or None
+        """
+
+        self._refresh_if_stale()
+        with self._lock:
+            props = self._objects.get(str(path), {}).get(interface_name)
+            if props is None:
+                return None
+            return dict(props)
+
+    def find_devices(self, alias=None, address=None, connected=None):
+        """Finds the indexed devices matching the given filters.
+        Aliases and addresses are compared case-insensitively.
+
+        :param alias: The alias of the devices, defaults to None
+        :type alias: string, optional
+        :param address: The Bluetooth MAC address of the devices,
+        defaults to None
+        :type address: string, optional
+        :param connected: The connection status of the devices,
+        defaults to None
+        :type connected: bool, optional
+        :return: A list of (path, properties) tuples
+        :rtype: list
+        """
+
+        self._refresh_if_stale()
+        devices = []
+        with self._lock:
+            for path, ifaces in self._objects.items():
+                props = ifaces.get(DEVICE_INTERFACE)
+                if props is None:
+                    continue
+                if (alias is not None and
+                        str(props.get("Alias", "")).upper() != alias.upper()):
+                    continue
+                if (address is not None and
+                        str(props.get("Address", "")).upper() != address.upper()):
+                    continue
+                if (connected is not None and
+                        bool(props.get("Connected", False)) != connected):
+                    continue
+                devices.append((path, dict(props)))
+
+        return devices
+
+
+_object_index = None
+_object_index_lock = RLock()
+
+
+def get_object_index():
+    """Gets the BlueZ object index for the current process,
+    creating it on first use.
+
+    :return: The process-local BlueZ object index
+    :rtype: BlueZObjectIndex
+    """
+
+    global _object_index
+
+    with _object_index_lock:
+        # Indexes aren't shared with forked processes, since
+        # the signal thread doesn't survive the fork.
+        if _object_index is None or _object_index.pid != os.getpid():
+            _object_index = BlueZObjectIndex()
+
+    return _object_index
+
+
+def invalidate_object_index():
+    """Marks the current process' BlueZ object index (if it has one)
+    as stale. Used after changes to the adapters that BlueZ may not
+    have signalled yet, such as address changes and resets.
+    """
+
+    with _object_index_lock:
+        if _object_index is not None and _object_index.pid == os.getpid():
+            _object_index.invalidate()
 
 
 def find_object_path(bus, service_name, interface_name, object_name=None):
@@ -37,9 +382,23 @@ def find_object_path(bus, service_name, interface_name, object_name=None):
     :rtype: string
     """
 
+    # BlueZ objects are looked up in the process-local index
+    if service_name == SERVICE_NAME:
+        index = get_object_index()
+        for path in index.find_objects(interface_name):
+            managed_interface = index.get_properties(path, interface_name)
+            # The object was removed since it was found
+            if managed_interface is None:
+                continue
+            if (not object_name or
+                    object_name == managed_interface.get("Address") or
+                    path.endswith(object_name)):
+                return path
+        return None
+
     manager = dbus.Interface(
         bus.get_object(service_name, "/"),
-        "org.freedesktop.DBus.ObjectManager")
+        OBJECT_MANAGER_INTERFACE)
 
     # Iterating over objects under the specified service
     # and searching for the specified interface
@@ -74,9 +433,13 @@ def find_objects(bus, service_name, interface_name):
     :rtype: array
     """
 
+    # BlueZ objects are looked up in the process-local index
+    if service_name == SERVICE_NAME:
+        return get_object_index().find_objects(interface_name)
+
     manager = dbus.Interface(
         bus.get_object(service_name, "/"),
-        "org.freedesktop.DBus.ObjectManager")
+        OBJECT_MANAGER_INTERFACE)
     paths = []
 
     # Iterating over objects under the specified service
@@ -146,6 +509,7 @@ def toggle_clean_bluez(toggle):
 
     # Kill a bit of time here to ensure all services have restarted
     time.sleep(0.5)
+    invalidate_object_index()
 
 
 def clean_sdp_records():
@@ -242,27 +606,35 @@ def replace_mac_addresses(adapter_paths, addresses):
     :param addresses: A list of Bluetooth MAC addresses,
     defaults to False
     :type addresses: bool, optional
+    :raises OSError: If an address can't be written to an adapter
     """
-    if which("hcitool") is None:
-        raise Exception("hcitool is not available on this system." +
-                        "If you can, please install this tool, as " +
-                        "it is required for proper functionality.")
-    if which("hciconfig") is None:
-        raise Exception("hciconfig is not available on this system." +
-                        "If you can, please install this tool, as " +
-                        "it is required for proper functionality.")
 
     if addresses:
         assert len(addresses) == len(adapter_paths)
 
+    def replace_address(adapter_path, address, errors):
+        try:
+            dev_id = hci.device_id_from_path(adapter_path)
+            hci.write_bd_address(dev_id, address)
+            hci.reset_device(dev_id)
+        except OSError as e:
+            errors.append(e)
+
+    # Adapters are independent, so they're updated concurrently
+    errors = []
+    threads = []
     for i in range(len(adapter_paths)):
-        adapter_id = adapter_paths[i].split('/')[-1]
-        mac = addresses[i].split(':')
-        cmds = ['hcitool', '-i', adapter_id, 'cmd', '0x3f', '0x001',
-                f'0x{mac[5]}',f'0x{mac[4]}',f'0x{mac[3]}',f'0x{mac[2]}',
-                f'0x{mac[1]}',f'0x{mac[0]}']
-        _run_command(cmds)
-        _run_command(['hciconfig', adapter_id, 'reset'])
+        thread = Thread(
+            target=replace_address,
+            args=(adapter_paths[i], addresses[i], errors))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    invalidate_object_index()
+
+    if errors:
+        raise errors[0]
 
 
 def find_devices_by_alias(alias, return_path=False, created_bus=None):
@@ -271,44 +643,23 @@ def find_devices_by_alias(alias, return_path=False, created_bus=None):
     are converted to uppercase before comparison
     as BlueZ usually converts aliases to uppercase.
 
-    :param address: The Bluetooth MAC address
-    :type address: string
-    :return: The path to the D-Bus object or None
-    :rtype: string or None
+    :param alias: The device alias
+    :type alias: string
+    :param return_path: Whether or not the device paths should
+    also be returned, defaults to False
+    :type return_path: bool, optional
+    :param created_bus: Unused, devices are found with the
+    process-local BlueZ object index, defaults to None
+    :type created_bus: DBus, optional
+    :return: The addresses (and paths) of the matching devices
+    :rtype: list or tuple
     """
 
-    if created_bus is not None:
-        bus = created_bus
-    else:
-        bus = dbus.SystemBus()
-    # Find all connected/paired/discovered devices
-    devices = find_objects(
-        bus,
-        SERVICE_NAME,
-        DEVICE_INTERFACE)
-
     addresses = []
     matching_paths = []
-    for path in devices:
-        # Get the device's address and paired status
-        device_props = dbus.Interface(
-            bus.get_object(SERVICE_NAME, path),
-            "org.freedesktop.DBus.Properties")
-        device_alias = device_props.Get(
-            DEVICE_INTERFACE,
-            "Alias").upper()
-        device_addr = device_props.Get(
-            DEVICE_INTERFACE,
-            "Address").upper()
-
-        # Check for an address match
-        if device_alias.upper() == alias.upper():
-            addresses.append(device_addr)
-            matching_paths.append(path)
-
-    # Close the dbus connection if we created one
-    if created_bus is None:
-        bus.close()
+    for path, props in get_object_index().find_devices(alias=alias):
+        addresses.append(str(props["Address"]).upper())
+        matching_paths.append(path)
 
     if return_path:
         return addresses, matching_paths
@@ -327,32 +678,15 @@ def disconnect_devices_by_alias(alias, created_bus=None):
         bus = created_bus
     else:
         bus = dbus.SystemBus()
-    # Find all connected/paired/discovered devices
-    devices = find_objects(
-        bus,
-        SERVICE_NAME,
-        DEVICE_INTERFACE)
 
-    addresses = []
-    matching_paths = []
-    for path in devices:
-        # Get the device's address and paired status
-        device_props = dbus.Interface(
+    for path, props in get_object_index().find_devices(alias=alias):
+        device = dbus.Interface(
             bus.get_object(SERVICE_NAME, path),
-            "org.freedesktop.DBus.Properties")
-        device_alias = device_props.Get(
-            DEVICE_INTERFACE,
-            "Alias").upper()
-
-        # Check for an alias match
-        if device_alias.upper() == alias.upper():
-            device = dbus.Interface(
-                bus.get_object(SERVICE_NAME, path),
-                DEVICE_INTERFACE)
-            try:
-                device.Disconnect()
-            except Exception as e:
-                print(e)
+            DEVICE_INTERFACE)
+        try:
+            device.Disconnect()
+        except Exception as e:
+            print(e)
 
     # Close the dbus connection if we created one
     if created_bus is None:
@@ -414,42 +748,45 @@ class BlueZ():
         return self.device.Get(ADAPTER_INTERFACE, "Address").upper()
 
     def set_address(self, mac):
-        """Sets the Bluetooth MAC address of the Bluetooth adapter.
-        The hciconfig CLI is required for setting the address.
-        For changes to apply, the Bluetooth interface needs to be
-        restarted.
+        """Sets the Bluetooth MAC address of the Bluetooth adapter
+        with a vendor HCI command and resets the adapter so that
+        the change applies.
 
         :param mac: A Bluetooth MAC address in 
         the form of "XX:XX:XX:XX:XX:XX
         :type mac: str
         :raises PermissionError: On run as non-root user
-        :raises Exception: On CLI errors
-        """
-        if which("hcitool") is None:
-            raise Exception("hcitool is not available on this system." +
-                            "If you can, please install this tool, as " +
-                            "it is required for proper functionality.")
-        # Reverse MAC (element position-wise) for use with hcitool
-        mac = mac.split(":")
-        cmds = ['hcitool', '-i', self.device_id, 'cmd', '0x3f', '0x001',
-                f'0x{mac[5]}',f'0x{mac[4]}',f'0x{mac[3]}',f'0x{mac[2]}',
-                f'0x{mac[1]}',f'0x{mac[0]}']
-        _run_command(cmds)
-        _run_command(['hciconfig', self.device_id, 'reset'])
+        :raises OSError: On HCI errors
+        """
+
+        dev_id = hci.device_id_from_path(self.device_id)
+        try:
+            hci.write_bd_address(dev_id, mac)
+            hci.reset_device(dev_id)
+        finally:
+            invalidate_object_index()
 
     def set_class(self, device_class):
-        if which("hciconfig") is None:
-            raise Exception("hciconfig is not available on this system." +
-                            "If you can, please install this tool, as " +
-                            "it is required for proper functionality.")
-        _run_command(['hciconfig', self.device_id, 'class', device_class])
+        """Sets the Bluetooth class of the adapter over HCI.
+
+        :param device_class: The class as a hexadecimal string
+        :type device_class: string
+        :raises OSError: On HCI errors
+        """
+
+        hci.write_class_of_device(
+            hci.device_id_from_path(self.device_id), device_class)
 
     def reset_adapter(self):
-        if which("hciconfig") is None:
-            raise Exception("hciconfig is not available on this system." +
-                            "If you can, please install this tool, as " +
-                            "it is required for proper functionality.")
-        _run_command(['hciconfig', self.device_id, 'reset'])
+        """Resets the adapter by bringing it down and back up.
+
+        :raises OSError: On HCI errors
+        """
+
+        try:
+            hci.reset_device(hci.device_id_from_path(self.device_id))
+        finally:
+            invalidate_object_index()
 
     @property
     def name(self):
@@ -584,15 +921,11 @@ class BlueZ():
         :rtype: string
         """
 
-        # This is another hacky bit. We're using hciconfig here instead
+        # This is another hacky bit. We're using HCI here instead
         # of the D-Bus API so that results match the setter. See the
-        # setter for further justification on using hciconfig.
-        result = subprocess.run(
-            ["hciconfig", self.device_id, "class"],
-            stdout=subprocess.PIPE)
-        device_class = result.stdout.decode("utf-8").split("Class: ")[1][0:8]
-
-        return device_class
+        # setter for further justification on using HCI.
+        return hci.read_class_of_device(
+            hci.device_id_from_path(self.device_id))
 
     def set_device_class(self, device_class):
         """Sets the Bluetooth class of the device. This represents what type
@@ -616,14 +949,7 @@ class BlueZ():
         # This is a bit of a hack. BlueZ allows you to set this value, however,
         # a config file needs to filled and the BT daemon restarted. This is a
         # good compromise but requires super user privileges. Not ideal.
-        result = subprocess.run(
-            ["hciconfig", self.device_id, "class", device_class],
-            stderr=subprocess.PIPE)
-
-        # Checking if there was a problem setting the device class
-        cmd_err = result.stderr.decode("utf-8").replace("\n", "")
-        if cmd_err != "":
-            raise Exception(cmd_err)
+        self.set_class(device_class)
 
     @property
     def powered(self):
@@ -699,6 +1025,7 @@ class BlueZ():
         cmd_err = result.stderr.decode("utf-8").replace("\n", "")
         if cmd_err != "":
             raise Exception(cmd_err)
+        invalidate_object_index()
 
         self.device = dbus.Interface(
             self.bus.get_object(
@@ -728,15 +1055,9 @@ class BlueZ():
         :rtype: dictionary
         """
 
-        bluez_objects = dbus.Interface(
-            self.bus.get_object(SERVICE_NAME, "/"),
-            "org.freedesktop.DBus.ObjectManager")
-
         devices = {}
-        objects = bluez_objects.GetManagedObjects()
-        for path, interfaces in list(objects.items()):
-            if DEVICE_INTERFACE in interfaces:
-                devices[str(path)] = interfaces[DEVICE_INTERFACE]
+        for path, props in get_object_index().find_devices():
+            devices[path] = props
 
         return devices
 
@@ -862,58 +1183,23 @@ class BlueZ():
         :rtype: string or None
         """
 
-        # Find all connected/paired/discovered devices
-        devices = find_objects(
-            self.bus,
-            SERVICE_NAME,
-            DEVICE_INTERFACE)
-        for path in devices:
-            # Get the device's address and paired status
-            device_props = dbus.Interface(
-                self.bus.get_object(SERVICE_NAME, path),
-                "org.freedesktop.DBus.Properties")
-            device_addr = device_props.Get(
-                DEVICE_INTERFACE,
-                "Address").upper()
-
-            # Check for an address match
-            if device_addr != address.upper():
-                continue
-            return path
+        devices = get_object_index().find_devices(address=address)
+        if len(devices) > 0:
+            return devices[0][0]
 
         return None
-    
+
     def find_connected_devices(self, alias_filter=False):
-        """Finds the D-Bus path to a device that contains the
-        specified address.
+        """Finds the D-Bus paths of all connected devices,
+        optionally filtered by alias.
 
-        :param address: The Bluetooth MAC address
-        :type address: string
-        :return: The path to the D-Bus object or None
-        :rtype: string or None
+        :param alias_filter: The alias of the devices, defaults to False
+        :type alias_filter: string, optional
+        :return: A list of D-Bus object paths
+        :rtype: list
         """
 
-        devices = find_objects(
-            self.bus,
-            SERVICE_NAME,
-            DEVICE_INTERFACE)
-        conn_devices = []
-        for path in devices:
-            # Get the device's connection status
-            device_props = dbus.Interface(
-                self.bus.get_object(SERVICE_NAME, path),
-                "org.freedesktop.DBus.Properties")
-            device_conn_status = device_props.Get(
-                DEVICE_INTERFACE,
-                "Connected")
-            device_alias = device_props.Get(
-                DEVICE_INTERFACE,
-                "Alias").upper()
-
-            if device_conn_status:
-                if alias_filter and device_alias == alias_filter.upper():
-                    conn_devices.append(path)
-                else:
-                    conn_devices.append(path)
-
-        return conn_devices
+        alias = alias_filter if alias_filter else None
+        devices = get_object_index().find_devices(alias=alias, connected=True)
+
+        return [path for path, props in devices]
@@ -0,0 +1,472 @@
+import os
+import fcntl
+import select
+import struct
+from collections import deque
+from threading import Lock
+
+from .controller.input import MAIN_TRACK
+from .slots import SlotAllocator
+
+
+# Opcode and payload length of each encoded command
+FRAME_HEADER = "<BI"
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER)
+
+# Command opcodes
+OP_MACRO = 1
+OP_STOP = 2
+OP_CLEAR = 3
+OP_TRACK = 4
+OP_REMOVE_TRACK = 5
+OP_MACRO_AT = 6
+OP_INPUT = 7
+OP_SCHEDULE_INPUT = 8
+
+# Macro IDs are sent as their raw bytes
+MACRO_ID_SIZE = 24
+
+# The time.monotonic() start time of a scheduled macro
+START_FORMAT = "<d"
+START_SIZE = struct.calcsize(START_FORMAT)
+
+# Whether direct input is held past a single report and the
+# seconds it's held for (0 for no limit)
+INPUT_FORMAT = "<Bd"
+INPUT_SIZE = struct.calcsize(INPUT_FORMAT)
+
+# Whether scheduled input replaces what's already scheduled
+SCHEDULE_FORMAT = "<B"
+SCHEDULE_SIZE = struct.calcsize(SCHEDULE_FORMAT)
+# The time.monotonic() time and length of each scheduled input frame
+SCHEDULED_INPUT_FORMAT = "<dB"
+SCHEDULED_INPUT_SIZE = struct.calcsize(SCHEDULED_INPUT_FORMAT)
+
+# Track names are prefixed with their length
+TRACK_NAME_FORMAT = "<B"
+TRACK_NAME_SIZE = struct.calcsize(TRACK_NAME_FORMAT)
+# A track's priority, button masks and stick flags
+TRACK_FORMAT = "<h4B"
+TRACK_SIZE = struct.calcsize(TRACK_FORMAT)
+
+# Received data held by a reader before it stops reading its pipe
+READ_BUFFER_SIZE = 65536
+
+
+class CommandChannels():
+    """A fixed set of pipes that carry commands (macros, stops and
+    clears) straight from the client to each controller process,
+    without going through the central command manager.
+
+    The pipes are created up front so that the controller processes
+    inherit them. Each live controller is given its own channel by a
+    SlotAllocator, the same way it's given a StatusTable slot.
+    """
+
+    # Seconds a send waits on a full channel before checking that
+    # its controller is still running
+    WRITE_TIMEOUT = 1.0
+
+    def __init__(self, capacity=64, slots=None, alive=None):
+        """Creates the pipes. This must happen before the controller
+        processes are started.
+
+        :param capacity: The number of channels, defaults to 64
+        :type capacity: int, optional
+        :param slots: The allocator assigning controllers their
+        channel, defaults to None (a new allocator with the channels'
+        capacity)
+        :type slots: SlotAllocator, optional
+        :param alive: Called with a controller index when a send has
+        waited WRITE_TIMEOUT seconds on a full channel. Returns whether
+        the controller is still running, defaults to None (sends wait
+        as long as it takes)
+        :type alive: function, optional
+        """
+
+        self.capacity = capacity
+        self.slots = slots if slots is not None else SlotAllocator(capacity)
+        self.alive = alive
+        # Controller index -> the rest of a partly written send
+        self._unsent = {}
+        self._pipes = []
+        self._locks = []
+        for _ in range(capacity):
+            read_fd, write_fd = os.pipe()
+            flags = fcntl.fcntl(write_fd, fcntl.F_GETFL)
+            fcntl.fcntl(write_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            self._pipes.append((read_fd, write_fd))
+            # Frames larger than a pipe's atomic write size
+            # mustn't interleave between client threads.
+            self._locks.append(Lock())
+
+    def _channel(self, controller_index):
+
+        channel = self.slots.slot(controller_index)
+        if channel is None:
+            raise ValueError(f"Controller {controller_index} doesn't have a channel")
+
+        return channel
+
+    def send(self, controller_index, msg):
+        """Sends a command to a controller.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :param msg: The command (see encode)
+        :type msg: dict
+        :raises ValueError: If the controller doesn't have a channel
+        :raises BrokenPipeError: If the channel is full and the
+        controller isn't running
+        """
+
+        self.send_bytes(controller_index, self.encode(msg))
+
+    def send_many(self, controller_index, msgs):
+        """Sends several commands to a controller in a single write.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :param msgs: The commands (see encode)
+        :type msgs: list
+        :raises ValueError: If the controller doesn't have a channel
+        :raises BrokenPipeError: If the channel is full and the
+        controller isn't running
+        """
+
+        self.send_bytes(controller_index, b"".join(self.encode(msg) for msg in msgs))
+
+    def encode(self, msg):
+        """Encodes a command. Commands are dicts with a "type" of:
+
+        - "macro", with the "macro" as compiled frames, a 48
+          character hex "macro_id" and optionally the "track" to
+          input it on (None for the main track) and the
+          time.monotonic() time to "start_at"
+        - "stop", with a "macro_id"
+        - "clear", with the "track" to clear (None for all tracks)
+        - "track", with the track's "name", the input masks it
+          "owns" and its "priority"
+        - "remove_track", with the track's "name"
+        - "input", with the direct input "frame" as packed bytes,
+          whether to "hold" it past a single report and its "ttl"
+          in seconds when held (or None)
+        - "schedule_input", with a list of "inputs" as
+          (time.monotonic() time, packed frame) pairs and whether to
+          "replace" the inputs already scheduled
+
+        :param msg: The command
+        :type msg: dict
+        :raises ValueError: On an unknown command type
+        :return: The encoded command
+        :rtype: bytes
+        """
+
+        if msg["type"] == "macro":
+            opcode = OP_MACRO
+            # The main track is sent as an empty name
+            payload = (bytes.fromhex(msg["macro_id"]) +
+                       self.encode_track_name(msg.get("track") or "") + msg["macro"])
+            if msg.get("start_at") is not None:
+                opcode = OP_MACRO_AT
+                payload = struct.pack(START_FORMAT, msg["start_at"]) + payload
+        elif msg["type"] == "stop":
+            opcode = OP_STOP
+            payload = bytes.fromhex(msg["macro_id"])
+        elif msg["type"] == "clear":
+            opcode = OP_CLEAR
+            payload = b""
+            if msg.get("track") is not None:
+                payload = self.encode_track_name(msg["track"])
+        elif msg["type"] == "track":
+            opcode = OP_TRACK
+            payload = (struct.pack(TRACK_FORMAT, msg["priority"], *msg["owns"]) +
+                       self.encode_track_name(msg["name"]))
+        elif msg["type"] == "remove_track":
+            opcode = OP_REMOVE_TRACK
+            payload = self.encode_track_name(msg["name"])
+        elif msg["type"] == "input":
+            opcode = OP_INPUT
+            payload = struct.pack(
+                INPUT_FORMAT, bool(msg.get("hold")), msg.get("ttl") or 0) + msg["frame"]
+        elif msg["type"] == "schedule_input":
+            opcode = OP_SCHEDULE_INPUT
+            payload = struct.pack(SCHEDULE_FORMAT, bool(msg.get("replace"))) + b"".join(
+                struct.pack(SCHEDULED_INPUT_FORMAT, at, len(frame)) + frame
+                for at, frame in msg["inputs"])
+        else:
+            raise ValueError(f"Unknown command type: {msg['type']}")
+
+        return struct.pack(FRAME_HEADER, opcode, len(payload)) + payload
+
+    def encode_track_name(self, name):
+
+        name = name.encode()
+        if len(name) > 255:
+            raise ValueError("Track names must be at most 255 bytes")
+
+        return struct.pack(TRACK_NAME_FORMAT, len(name)) + name
+
+    def send_bytes(self, controller_index, data):
+        """Writes one or more frames to a controller's channel in a
+        single operation, waiting for space if the pipe is full.
+
+        If the controller stops running while the pipe is full, the
+        rest of a partly written send is kept and written ahead of
+        the controller's next send, so that its frames stay intact.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :param data: The frames
+        :type data: bytes
+        :raises ValueError: If the controller doesn't have a channel
+        :raises BrokenPipeError: If the channel is full and the
+        controller isn't running
+        """
+
+        channel = self._channel(controller_index)
+        write_fd = self._pipes[channel][1]
+        with self._locks[channel]:
+            unsent = self._unsent.pop(controller_index, b"")
+            view = memoryview(unsent + data)
+            while view:
+                try:
+                    written = os.write(write_fd, view)
+                    view = view[written:]
+                except BlockingIOError:
+                    if select.select([], [write_fd], [], self.WRITE_TIMEOUT)[1]:
+                        continue
+                    if self.alive is None or self.alive(controller_index):
+                        continue
+
+                    # Only bytes that finish a started frame are kept
+                    written = len(unsent) + len(data) - len(view)
+                    if written > len(unsent):
+                        self._unsent[controller_index] = bytes(view)
+                    elif unsent:
+                        self._unsent[controller_index] = unsent[written:]
+                    raise BrokenPipeError(
+                        f"Controller {controller_index} isn't running")
+
+    def reader(self, controller_index):
+        """Gets the controller side of a channel.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :raises ValueError: If the controller doesn't have a channel
+        :return: The channel's reader
+        :rtype: CommandReader
+        """
+
+        return CommandReader(self._pipes[self._channel(controller_index)][0])
+
+
+class CommandReader():
+    """The controller side of a command channel."""
+
+    def __init__(self, fd):
+
+        self.fd = fd
+        self._buffer = bytearray()
+        self._nonblocking = False
+        # Decoded macros waiting for space in the macro buffer
+        # and the size of their frames
+        self._held = deque()
+        self._held_size = 0
+
+    def fileno(self):
+
+        return self.fd
+
+    def _read(self):
+
+        if not self._nonblocking:
+            flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            self._nonblocking = True
+
+        # Leaving data in the pipe blocks the client once it fills.
+        # A first frame larger than the buffer is read whole.
+        while self._held_size + len(self._buffer) < self._read_size():
+            try:
+                data = os.read(self.fd, READ_BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+            self._buffer += data
+
+    def _read_size(self):
+
+        if self._held or len(self._buffer) < FRAME_HEADER_SIZE:
+            return READ_BUFFER_SIZE
+
+        length = struct.unpack_from(FRAME_HEADER, self._buffer)[1]
+        return max(READ_BUFFER_SIZE, FRAME_HEADER_SIZE + length)
+
+    def discard(self):
+        """Drops any commands left in the channel by a previous
+        controller with the same slot.
+        """
+
+        self._read()
+        self._buffer.clear()
+        self._held.clear()
+        self._held_size = 0
+
+    def receive(self, limit=None):
+        """Reads the complete commands waiting in the channel.
+
+        :param limit: The most macros to return, defaults to None
+        (every waiting command). Other commands are always returned.
+        The remaining macros are held back, with the stops, clears
+        and track removals read after them applied, and eventually
+        block the client.
+        :type limit: int, optional
+        :return: The commands, in the order sent, except for held
+        macros returned after the commands read after them
+        :rtype: list
+        """
+
+        self._read()
+
+        # Held macros go first, in the order sent
+        msgs = []
+        released = 0
+        while self._held and (limit is None or released < limit):
+            msg, size = self._held.popleft()
+            self._held_size -= size
+            msgs.append(msg)
+            released += 1
+
+        offset = 0
+        while len(self._buffer) - offset >= FRAME_HEADER_SIZE:
+            opcode, length = struct.unpack_from(FRAME_HEADER, self._buffer, offset)
+            start = offset + FRAME_HEADER_SIZE
+            end = start + length
+            if len(self._buffer) < end:
+                break
+            msg = self.decode(opcode, bytes(self._buffer[start:end]))
+            if opcode not in (OP_MACRO, OP_MACRO_AT):
+                msgs.extend(self._apply_held(msg))
+                msgs.append(msg)
+            elif not self._held and (limit is None or released < limit):
+                msgs.append(msg)
+                released += 1
+            else:
+                self._held.append((msg, end - offset))
+                self._held_size += end - offset
+            offset = end
+        del self._buffer[:offset]
+
+        return msgs
+
+    def _apply_held(self, msg):
+        """Applies a stop, clear or track removal to the held macros.
+
+        :param msg: The command
+        :type msg: dict
+        :return: Stops for the held macros of a removed track, so that
+        they're finished like the track's other macros
+        :rtype: list
+        """
+
+        if not self._held or msg is None:
+            return []
+
+        if msg["type"] == "stop":
+            self._remove_held(
+                lambda held: held["macro_id"] == msg["macro_id"])
+        elif msg["type"] == "clear":
+            self._remove_held(
+                lambda held: msg["track"] is None or
+                (held["track"] or MAIN_TRACK) == msg["track"])
+        elif msg["type"] == "remove_track":
+            removed = self._remove_held(
+                lambda held: (held["track"] or MAIN_TRACK) == msg["name"])
+            return [{"type": "stop", "macro_id": held["macro_id"]} for held in removed]
+
+        return []
+
+    def _remove_held(self, matches):
+
+        removed = []
+        kept = deque()
+        for held, size in self._held:
+            if matches(held):
+                removed.append(held)
+                self._held_size -= size
+            else:
+                kept.append((held, size))
+        self._held = kept
+
+        return removed
+
+    def decode(self, opcode, payload):
+        """Decodes a command's payload into the dict format used by
+        the controller's task queue.
+
+        :param opcode: The command's opcode
+        :type opcode: int
+        :param payload: The command's payload
+        :type payload: bytes
+        :return: The command or None on an unknown opcode
+        :rtype: dict or None
+        """
+
+        if opcode in (OP_MACRO, OP_MACRO_AT):
+            start_at = None
+            if opcode == OP_MACRO_AT:
+                start_at = struct.unpack_from(START_FORMAT, payload)[0]
+                payload = payload[START_SIZE:]
+            track, offset = self.decode_track_name(payload, MACRO_ID_SIZE)
+            return {
+                "type": "macro",
+                "macro": payload[offset:],
+                "macro_id": payload[:MACRO_ID_SIZE].hex(),
+                "track": track or None,
+                "start_at": start_at,
+            }
+        elif opcode == OP_STOP:
+            return {"type": "stop", "macro_id": payload.hex()}
+        elif opcode == OP_CLEAR:
+            track = None
+            if payload:
+                track, _ = self.decode_track_name(payload, 0)
+            return {"type": "clear", "track": track}
+        elif opcode == OP_TRACK:
+            priority, *owns = struct.unpack_from(TRACK_FORMAT, payload)
+            name, _ = self.decode_track_name(payload, TRACK_SIZE)
+            return {
+                "type": "track",
+                "name": name,
+                "owns": tuple(owns),
+                "priority": priority,
+            }
+        elif opcode == OP_REMOVE_TRACK:
+            name, _ = self.decode_track_name(payload, 0)
+            return {"type": "remove_track", "name": name}
+        elif opcode == OP_INPUT:
+            hold, ttl = struct.unpack_from(INPUT_FORMAT, payload)
+            return {"type": "input", "frame": payload[INPUT_SIZE:],
+                    "hold": bool(hold), "ttl": ttl or None}
+        elif opcode == OP_SCHEDULE_INPUT:
+            replace = bool(struct.unpack_from(SCHEDULE_FORMAT, payload)[0])
+            inputs = []
+            offset = SCHEDULE_SIZE
+            while offset < len(payload):
+                at, length = struct.unpack_from(SCHEDULED_INPUT_FORMAT, payload, offset)
+                offset += SCHEDULED_INPUT_SIZE
+                inputs.append((at, payload[offset:offset + length]))
+                offset += length
+            return {"type": "schedule_input", "inputs": inputs, "replace": replace}
+
+        return None
+
+    def decode_track_name(self, payload, offset):
+
+        length = struct.unpack_from(TRACK_NAME_FORMAT, payload, offset)[0]
+        start = offset + TRACK_NAME_SIZE
+        end = start + length
+
+        return payload[start:end].decode(), end
@@ -6,7 +6,6 @@ import traceback
 
 from .nxbt import Nxbt, PRO_CONTROLLER
 from .bluez import find_devices_by_alias
-from .tui import InputTUI
 
 
 parser = argparse.ArgumentParser()
@@ -166,12 +165,14 @@ def demo():
     print("Running Demo...")
     macro_id = nx.macro(controller_idxs[-1], MACRO, block=False)
     while macro_id not in nx.state[controller_idxs[-1]]["finished_macros"]:
-        state = nx.state[controller_idxs[-1]]
-        if state['state'] == 'crashed':
-            print("An error occurred while running the demo:")
-            print(state['errors'])
-            exit(1)
-        sleep(1.0)
+        # Wakes as soon as the controller crashes
+        try:
+            nx.wait_for_state(controller_idxs[-1], ["crashed"], timeout=1.0)
+        except TimeoutError:
+            continue
+        print("An error occurred while running the demo:")
+        print(nx.state[controller_idxs[-1]]['errors'])
+        exit(1)
 
     print("Finished!")
 
@@ -227,24 +228,23 @@ def test():
     print("[4] Waiting for controller to connect with the Switch...")
     timeout = 120
     print(f"Connection timeout is {timeout} seconds for this test script.")
-    elapsed = 0
-    while nx.state[cindex]['state'] != 'connected':
-        if elapsed >= timeout:
-            print("Timeout reached, exiting...")
-            exit(1)
-        elif nx.state[cindex]['state'] == 'crashed':
-            print("An error occurred while connecting:")
-            print(nx.state[cindex]['errors'])
-            exit(1)
-        elapsed += 1
-        sleep(1)
+    try:
+        status = nx.wait_for_state(cindex, ["connected", "crashed"], timeout=timeout)
+    except TimeoutError:
+        print("Timeout reached, exiting...")
+        exit(1)
+    if status['state'] == 'crashed':
+        print("An error occurred while connecting:")
+        print(nx.state[cindex]['errors'])
+        exit(1)
     print("Successfully connected.\n")
 
     # Exit the Change Grip/Order Menu
     print("[5] Attempting to exit the 'Change Grip/Order Menu'...")
     nx.macro(cindex, "B 0.1s\n0.1s")
     sleep(5)
-    if nx.state[cindex]['state'] != 'connected':
+    status = nx.get_status(cindex) or nx.state[cindex]
+    if status['state'] != 'connected':
         print("Controller disconnected after leaving the menu.")
         print("Exiting...")
         exit(1)
@@ -288,14 +288,17 @@ def macro():
     print("Running macro...")
     macro_id = nx.macro(index, macro, block=False)
     while (True):
-        if nx.state[index]["state"] == "crashed":
-            print("Controller crashed while running macro")
-            print(nx.state[index]["errors"])
-            break
         if macro_id in nx.state[index]["finished_macros"]:
             print("Finished running macro. Exiting...")
             break
-        sleep(1/30)
+        # Wakes as soon as the controller crashes
+        try:
+            nx.wait_for_state(index, ["crashed"], timeout=1/30)
+        except TimeoutError:
+            continue
+        print("Controller crashed while running macro")
+        print(nx.state[index]["errors"])
+        break
 
 
 def list_switch_addresses():
@@ -326,10 +329,13 @@ def main():
     elif args.command == 'macro':
         macro()
     elif args.command == 'tui':
+        # The TUI's terminal dependencies are only needed here
+        from .tui import InputTUI
         reconnect_target = get_reconnect_target()
         tui = InputTUI(reconnect_target=reconnect_target)
         tui.start()
     elif args.command == 'remote_tui':
+        from .tui import InputTUI
         reconnect_target = get_reconnect_target()
         tui = InputTUI(reconnect_target=reconnect_target, force_remote=True)
         tui.start()
@@ -1,6 +1,18 @@
-from .server import ControllerServer
-from .controller import ControllerTypes
-from .controller import Controller
-from .protocol import ControllerProtocol
-from .protocol import SwitchReportParser
-from .protocol import SwitchResponses
+from ..lazy import lazy_attributes
+
+
+# Lazily loaded (PEP 562) so that the protocol and input modules
+# can be imported without pulling in the D-Bus backed server.
+_LAZY_ATTRIBUTES = {
+    "ControllerServer": ".server",
+    "ControllerTypes": ".controller",
+    "Controller": ".controller",
+    "ControllerProtocol": ".protocol",
+    "SwitchReportParser": ".protocol",
+    "SwitchResponses": ".protocol",
+    "Handshake": ".handshake",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES.keys())
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
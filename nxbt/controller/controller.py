@@ -2,8 +2,6 @@ from enum import Enum
 import os
 import logging
 
-import dbus
-
 
 class ControllerTypes(Enum):
     """Controller type enumerations for initializing the controller server.
@@ -25,10 +23,12 @@ class Controller():
         ControllerTypes.PRO_CONTROLLER: "Pro Controller"
     }
 
-    def __init__(self, bluetooth, controller_type):
+    def __init__(self, bluetooth, controller_type, prepared=False):
 
         self.bt = bluetooth
         self.logger = logging.getLogger('nxbt')
+        # Whether the adapter has already been prepared ahead of time
+        self.prepared = prepared
 
         if controller_type not in self.ALIASES.keys():
             raise ValueError("Unknown controller type specified")
@@ -39,14 +39,23 @@ class Controller():
         specified controller.
         """
 
+        if not self.prepared:
+            self.prepare()
+
+        self.bt.set_alias(self.alias)
+
+    def prepare(self):
+        """Configures the parts of the Bluetooth device that are the
+        same for every controller type: the adapter options and the
+        SDP record.
+        """
+
         # Setting up Bluetooth adapter options
         self.bt.set_powered(True)
         self.bt.set_pairable(True)
         self.bt.set_pairable_timeout(0)
         self.bt.set_discoverable_timeout(180)
 
-        self.bt.set_alias(self.alias)
-
         # Adding the SDP record
         sdp_record_path = os.path.join(
             os.path.dirname(__file__), "sdp", "switch-controller.xml")
@@ -61,9 +70,15 @@ class Controller():
             "RequireAuthorization": False,
             "AutoConnect": True
         }
+        # Only loaded here so that the controller types can be
+        # imported without D-Bus being available.
+        import dbus
+
         # If the profile has already been registered,
         # catch the error and continue
         try:
             self.bt.register_profile(self.SDP_RECORD_PATH, self.SDP_UUID, opts)
         except dbus.exceptions.DBusException as e:
             self.logger.debug(e)
+
+        self.prepared = True
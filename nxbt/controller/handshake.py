@@ -0,0 +1,127 @@
+import select
+import logging
+from time import perf_counter
+
+from .utils import format_msg_controller, format_msg_switch
+
+
+class Handshake():
+    """Runs the pairing exchange between a controller and a Switch.
+
+    Each subcommand from the Switch is answered as soon as it arrives.
+    When the Switch goes quiet, an input report is sent to prompt it
+    and the wait before the next prompt is doubled, up to
+    MAX_INTERVAL. The round-trip time of every subcommand and the
+    total duration of the exchange are recorded.
+    """
+
+    # Seconds to wait for the Switch's first message
+    FIRST_MESSAGE_INTERVAL = 1
+    # Seconds to wait for the Switch after it last replied
+    QUIET_INTERVAL = 1/15
+    # The longest wait between prompts once the Switch has replied
+    MAX_INTERVAL = 1
+
+    def __init__(self, protocol):
+
+        self.logger = logging.getLogger('nxbt')
+        # Cache logging level to increase performance on checks
+        self.logger_level = self.logger.level
+
+        self.protocol = protocol
+
+        self.duration = None
+        self.round_trips = []
+
+    def send(self, itr, msg):
+        """Sends a report, waiting for the socket to become writable
+        instead of spinning if its buffer is full.
+
+        :param itr: The interrupt socket
+        :type itr: socket.socket
+        :param msg: The report to send
+        :type msg: bytes
+        """
+
+        while True:
+            try:
+                itr.sendall(msg)
+                return
+            except BlockingIOError:
+                select.select([], [itr], [], self.MAX_INTERVAL)
+
+    def run(self, itr):
+        """Answers the Switch until player lights have been set and
+        vibration has been enabled.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        :return: The handshake's statistics
+        :rtype: dict
+        """
+
+        start = perf_counter()
+        last_sent = start
+        received_first_message = False
+        interval = self.FIRST_MESSAGE_INTERVAL
+        self.round_trips = []
+
+        while True:
+            readable, _, _ = select.select([itr], [], [], interval)
+
+            reply = None
+            if readable:
+                try:
+                    reply = itr.recv(50)
+                except BlockingIOError:
+                    reply = None
+
+            if reply:
+                received_first_message = True
+                interval = self.QUIET_INTERVAL
+
+                # Output reports with a subcommand
+                if len(reply) > 11 and reply[1] == 0x01:
+                    self.round_trips.append({
+                        "subcommand": reply[11],
+                        "rtt": perf_counter() - last_sent,
+                    })
+
+                if self.logger_level <= logging.DEBUG and len(reply) > 40:
+                    self.logger.debug(format_msg_switch(reply))
+            elif received_first_message:
+                # The Switch went quiet, back off
+                interval = min(interval * 2, self.MAX_INTERVAL)
+
+            self.protocol.process_commands(reply)
+            msg = self.protocol.get_report()
+
+            if self.logger_level <= logging.DEBUG and reply:
+                self.logger.debug(format_msg_controller(msg))
+
+            self.send(itr, msg)
+            last_sent = perf_counter()
+
+            # Exit pairing loop when player lights have been set and
+            # vibration has been enabled
+            if (reply and len(reply) > 45 and
+                    self.protocol.vibration_enabled and self.protocol.player_number):
+                break
+
+        self.duration = perf_counter() - start
+        self.logger.debug(f"Handshake took {self.duration:.3f}s")
+
+        return self.stats()
+
+    def stats(self):
+        """Gets the statistics of the last handshake.
+
+        :return: A dict with the total duration (in seconds) and the
+        round-trip time of each subcommand, in the order received
+        :rtype: dict
+        """
+
+        return {
+            "duration": self.duration,
+            "round_trips": list(self.round_trips),
+        }
@@ -1,55 +1,86 @@
-from time import perf_counter
-from json import dumps
-
-
-DIRECT_INPUT_IDLE_PACKET = {
-    # Sticks
-    "L_STICK": {
-        "PRESSED": False,
-        "X_VALUE": 0,
-        "Y_VALUE": 0,
-        # Keyboard position calculation values
-        "LS_UP": False,
-        "LS_LEFT": False,
-        "LS_RIGHT": False,
-        "LS_DOWN": False
-    },
-    "R_STICK": {
-        "PRESSED": False,
-        "X_VALUE": 0,
-        "Y_VALUE": 0,
-        # Keyboard position calculation values
-        "RS_UP": False,
-        "RS_LEFT": False,
-        "RS_RIGHT": False,
-        "RS_DOWN": False
-    },
-    # Dpad
-    "DPAD_UP": False,
-    "DPAD_LEFT": False,
-    "DPAD_RIGHT": False,
-    "DPAD_DOWN": False,
-    # Triggers
-    "L": False,
-    "ZL": False,
-    "R": False,
-    "ZR": False,
-    # Joy-Con Specific Buttons
-    "JCL_SR": False,
-    "JCL_SL": False,
-    "JCR_SR": False,
-    "JCR_SL": False,
-    # Meta buttons
-    "PLUS": False,
-    "MINUS": False,
-    "HOME": False,
-    "CAPTURE": False,
-    # Buttons
-    "Y": False,
-    "X": False,
-    "B": False,
-    "A": False
-}
+import heapq
+import struct
+from itertools import count
+from collections import OrderedDict
+from time import perf_counter, monotonic
+
+
+# A compiled macro line: flags, the three button bytes, the left and
+# right stick positions and the line's duration in seconds
+MACRO_FRAME_FORMAT = "<BBBB3s3sd"
+MACRO_FRAME_SIZE = struct.calcsize(MACRO_FRAME_FORMAT)
+# Frame flags
+FRAME_INPUT = 0x01
+FRAME_LEFT_STICK = 0x02
+FRAME_RIGHT_STICK = 0x04
+
+# The track macros are input on unless another is given
+MAIN_TRACK = "main"
+
+
+class MacroTrack():
+    """A queue of compiled macros that are input one after another.
+    A controller's tracks are input at the same time, with each track
+    only setting the buttons and sticks it owns.
+    """
+
+    def __init__(self, name):
+
+        self.name = name
+
+        # Owned inputs, as masks of the three button bytes and stick flags
+        self.buttons = (0xFF, 0xFF, 0xFF)
+        self.sticks = FRAME_LEFT_STICK | FRAME_RIGHT_STICK
+        self.priority = 0
+
+        # Queued macros and their scheduled start times
+        # (or None) by ID, in the order received
+        self.buffer = OrderedDict()
+
+        self.stop()
+
+    def stop(self):
+        """Stops the running macro."""
+
+        # The running macro's remaining frames
+        self.current_macro = None
+        self.current_macro_id = None
+        # The frame being input over a period of time
+        self.current_frame = None
+        self.timer_length = 0
+        self.timer_start = 0
+
+    def busy(self):
+
+        return bool(self.buffer or self.current_macro or self.current_frame)
+
+    def advance(self, now):
+        """Loads the running macro's next frame when the current one
+        is done.
+
+        :param now: The current time, from perf_counter
+        :type now: float
+        :return: The frame to input this tick (or None) and the ID of
+        the macro that finished this tick (or None)
+        :rtype: tuple
+        """
+
+        if not self.current_frame and self.current_macro:
+            self.current_frame = self.current_macro.pop(0)
+            self.timer_length = self.current_frame[6]
+            self.timer_start = now
+
+        frame = self.current_frame
+        finished = None
+        # Check if we're done inputting the current frame
+        if now - self.timer_start > self.timer_length:
+            self.current_frame = None
+            # Check if we're done the current macro
+            if not self.current_macro:
+                finished = self.current_macro_id
+                self.current_macro_id = None
+
+        return frame, finished
 
 
 class InputParser():
@@ -74,57 +105,202 @@ class InputParser():
         "min_y": -1531,
         "max_y": 1510,
     }
+    # Stick offsets, as a fraction of the stick's range, that
+    # still count as centered for direct input
+    STICK_DEADZONE = 0.05
 
-    def __init__(self, protocol):
+    # What to do with a macro buffered while the buffer is full
+    OVERFLOW_POLICIES = ("block", "reject", "drop_oldest")
+
+    def __init__(self, protocol, buffer_limit=None, overflow_policy="block"):
 
         self.protocol = protocol
 
-        # Buffers a list of unparsed macros
-        self.macro_buffer = []
+        # Macro tracks by name, and in the order they're merged
+        self.tracks = {}
+        self.merge_order = []
+        self.add_track(MAIN_TRACK)
+
+        # The IDs of buffered macros and their tracks,
+        # in the order the macros were received
+        self.buffered_macros = OrderedDict()
+        # The most macros buffered at once, None for no limit
+        self.buffer_limit = buffer_limit
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.overflow_policy = overflow_policy
+
+        # The IDs of scheduled macros started since this was
+        # last emptied
+        self.started_macros = []
+
+        # Direct input held until it's replaced, released or its
+        # time.monotonic() expiry (if any) passes
+        self.held_input = None
+        self.held_until = None
+        # Whether the held input is released after a single report
+        self.held_once = False
+        # Direct input frames to hold from a time.monotonic() time,
+        # as a heap of (time, sequence number, frame)
+        self.scheduled_input = []
+        self.schedule_sequence = count()
 
-        # Keeps track of the entire current
-        # list of macro commands.
-        self.current_macro = None
-        self.current_macro_id = None
-        # Keeps track of the macro commands being
-        # input over a period of time.
-        self.current_macro_commands = None
+        # Whether or not input has been entered
+        # that would close the "Change Grip/Order" menu
+        self.exited_grip_order_menu = False
 
-        # The time length of the current macro
-        self.macro_timer_length = 0
+    @property
+    def main_track(self):
+
+        return self.tracks[MAIN_TRACK]
+
+    def add_track(self, name, owns=None, priority=0):
+        """Adds a macro track. Tracks input their macros at the same
+        time as each other.
+
+        :param name: The track's name
+        :type name: str
+        :param owns: The track's input masks (see track_masks),
+        defaults to None (every input)
+        :type owns: tuple, optional
+        :param priority: Sticks set by tracks with a higher priority
+        win, defaults to 0
+        :type priority: int, optional
+        :return: The track
+        :rtype: MacroTrack
+        """
 
-        # The start time for the current macro commands
-        self.macro_timer_start = 0
+        track = self.tracks.get(name)
+        if track is None:
+            track = MacroTrack(name)
+            self.tracks[name] = track
+        if owns is not None:
+            track.buttons = tuple(owns[0:3])
+            track.sticks = owns[3]
+        track.priority = priority
 
-        self.controller_input = None
+        # Stable, so equal priorities merge in the order added
+        self.merge_order = sorted(self.tracks.values(), key=lambda t: t.priority)
 
-        # Whether or not input has been entered
-        # that would close the "Change Grip/Order" menu
-        self.exited_grip_order_menu = False
+        return track
 
-    def buffer_macro(self, macro, macro_id):
+    def remove_track(self, name):
+        """Removes a macro track. The main track can't be removed,
+        but its macros are cleared.
 
-        # Doesn't have any info
-        if len(macro) < 4:
-            return
+        :param name: The track's name
+        :type name: str
+        :return: The IDs of the track's running and queued macros
+        :rtype: list
+        """
+
+        track = self.tracks.get(name)
+        if track is None:
+            return []
+
+        macro_ids = self.clear_macros(name)
+        if name != MAIN_TRACK:
+            del self.tracks[name]
+            self.merge_order.remove(track)
 
-        self.macro_buffer.append([macro, macro_id])
+        return macro_ids
+
+    def track_masks(self, owns):
+        """Gets the input masks of a track owning the given inputs.
+
+        :param owns: Macro button names, "L_STICK" and "R_STICK"
+        :type owns: list
+        :raises ValueError: On an unknown input
+        :return: The upper, shared and lower button masks and the
+        stick flags
+        :rtype: tuple
+        """
+
+        upper = shared = lower = sticks = 0
+        for name in owns:
+            if name == "L_STICK":
+                sticks |= FRAME_LEFT_STICK
+                continue
+            elif name == "R_STICK":
+                sticks |= FRAME_RIGHT_STICK
+                continue
+
+            # The last command of a macro line is its duration
+            mask = self.parse_macro_buttons([name, "0s"])[0:3]
+            if not any(mask):
+                raise ValueError(f"Unknown input: {name}")
+            upper |= mask[0]
+            shared |= mask[1]
+            lower |= mask[2]
+
+        return upper, shared, lower, sticks
+
+    def buffer_space(self):
+        """Gets the number of macros that can be buffered before the
+        buffer limit is reached.
+
+        :return: The free space or None if there's no limit
+        :rtype: int or None
+        """
+
+        if self.buffer_limit is None:
+            return None
+
+        return max(self.buffer_limit - len(self.buffered_macros), 0)
+
+    def buffer_macro(self, macro, macro_id, track=MAIN_TRACK, start_at=None):
+        """Buffers a macro on a track. If the buffer is full, the macro
+        is rejected or the oldest buffered macro is dropped, depending
+        on the overflow policy. With the "block" policy the caller is
+        expected to stop buffering until there's space.
+
+        :param macro: The macro, as text or compiled frames
+        :type macro: str or bytes
+        :param macro_id: The macro's unique ID
+        :type macro_id: str
+        :param track: The track's name. Tracks that don't exist
+        are added, owning every input. Defaults to MAIN_TRACK
+        :type track: str, optional
+        :param start_at: The time.monotonic() time the macro starts
+        at, once it reaches the front of the track. Defaults to None
+        (as soon as it reaches the front of the track)
+        :type start_at: float, optional
+        :return: The IDs of any macros that were rejected or dropped
+        :rtype: list
+        """
+
+        # Doesn't have any info
+        if isinstance(macro, str) and len(macro) < 4:
+            return []
+
+        discarded = []
+        if self.buffer_space() == 0:
+            if self.overflow_policy == "reject":
+                return [macro_id]
+            elif self.overflow_policy == "drop_oldest":
+                dropped_id, dropped_track = self.buffered_macros.popitem(last=False)
+                del dropped_track.buffer[dropped_id]
+                discarded.append(dropped_id)
+
+        if track not in self.tracks:
+            self.add_track(track)
+        track = self.tracks[track]
+        track.buffer[macro_id] = (macro, start_at)
+        self.buffered_macros[macro_id] = track
+
+        return discarded
 
     def stop_macro(self, macro_id, state=None):
 
-        # Check if the macro is being input currently
-        if macro_id == self.current_macro_id:
-            # If so, reset the current macro
-            self.current_macro = None
-            self.current_macro_id = None
-            self.current_macro_commands = None
-            self.macro_timer_length = 0
-            self.macro_timer_start = 0
+        # Remove the macro if it's still in a buffer
+        track = self.buffered_macros.pop(macro_id, None)
+        if track:
+            del track.buffer[macro_id]
         else:
-            # Check if the macro is still in the buffer
-            for i in range(0, len(self.macro_buffer)):
-                if macro_id == self.macro_buffer[i][1]:
-                    del self.macro_buffer[i]
+            # Otherwise, reset the track inputting it
+            for track in self.merge_order:
+                if macro_id == track.current_macro_id:
+                    track.stop()
 
         # Ensure the stopped macro is added to the finished
         # macros so that any blocking parties listening can
@@ -136,26 +312,168 @@ class InputParser():
 
         return
 
-    def clear_macros(self):
+    def clear_macros(self, track=None):
+        """Clears the running and queued macros of one or all tracks.
 
-        self.current_macro = None
-        self.current_macro_id = None
-        self.current_macro_commands = None
-        self.macro_timer_length = 0
-        self.macro_timer_start = 0
-        self.macro_buffer = []
+        :param track: The track's name, defaults to None (all tracks)
+        :type track: str, optional
+        :return: The IDs of the cleared macros
+        :rtype: list
+        """
 
-        return
+        if track is None:
+            tracks = list(self.tracks.values())
+        elif track in self.tracks:
+            tracks = [self.tracks[track]]
+        else:
+            return []
+
+        macro_ids = []
+        for track in tracks:
+            if track.current_macro_id is not None:
+                macro_ids.append(track.current_macro_id)
+            for macro_id in track.buffer:
+                del self.buffered_macros[macro_id]
+                macro_ids.append(macro_id)
+            track.buffer.clear()
+            track.stop()
+
+        return macro_ids
+
+    def hold_input(self, frame, ttl=None, once=False):
+        """Holds a direct input frame until it's replaced or released.
+        Direct input takes priority over macros.
+
+        :param frame: The frame's fields (see compile_controller_input).
+        A neutral frame (see is_neutral), or None, releases the held
+        input.
+        :type frame: tuple
+        :param ttl: Seconds after which the input is released,
+        defaults to None (never)
+        :type ttl: float, optional
+        :param once: Release the input after a single report,
+        defaults to False
+        :type once: bool, optional
+        """
+
+        if frame is None or self.is_neutral(frame):
+            self.held_input = None
+            self.held_until = None
+            self.held_once = False
+            return
+
+        self.held_input = frame
+        self.held_until = monotonic() + ttl if ttl else None
+        self.held_once = once
+
+    def is_neutral(self, frame):
+        """Checks if a frame has no buttons pressed and both sticks
+        within STICK_DEADZONE of their centers, so that drifting
+        sticks don't hold input.
+
+        :param frame: The frame's fields (see MACRO_FRAME_FORMAT)
+        :type frame: tuple
+        :rtype: bool
+        """
+
+        flags, upper, shared, lower, stick_left, stick_right, _ = frame
+        if not flags & FRAME_INPUT:
+            return True
+        if upper or shared or lower:
+            return False
+
+        for flag, stick, cal in (
+                (FRAME_LEFT_STICK, stick_left, self.LEFT_STICK_CALIBRATION),
+                (FRAME_RIGHT_STICK, stick_right, self.RIGHT_STICK_CALIBRATION)):
+            if not flags & flag:
+                continue
+            x = stick[0] | (stick[1] & 0xF) << 8
+            y = stick[1] >> 4 | stick[2] << 4
+            if (abs(x - cal["center_x"]) > self.STICK_DEADZONE * cal["max_x"] or
+                    abs(y - cal["center_y"]) > self.STICK_DEADZONE * cal["max_y"]):
+                return False
+
+        return True
 
-    def set_controller_input(self, controller_input):
+    def schedule_input(self, at, frame):
+        """Schedules a direct input frame to be held from a given time
+        (see hold_input). Frames scheduled for the same time are
+        applied in the order scheduled.
+
+        :param at: The time.monotonic() time to apply the frame at
+        :type at: float
+        :param frame: The frame's fields (see compile_controller_input).
+        A frame without input releases the held input.
+        :type frame: tuple
+        """
+
+        heapq.heappush(self.scheduled_input, (at, next(self.schedule_sequence), frame))
+
+    def clear_scheduled_input(self):
+
+        self.scheduled_input = []
+
+    def apply_scheduled_input(self):
+        """Holds the most recent scheduled frame that's due, dropping
+        any earlier ones that are also due.
+        """
+
+        if not self.scheduled_input:
+            return
+
+        now = monotonic()
+        if self.scheduled_input[0][0] > now:
+            return
+
+        frame = None
+        while self.scheduled_input and self.scheduled_input[0][0] <= now:
+            frame = heapq.heappop(self.scheduled_input)[2]
+        self.hold_input(frame)
+
+    def direct_input_pending(self):
+        """Checks if any direct input is waiting to be input.
+
+        :rtype: bool
+        """
+
+        return self.held_input is not None or bool(self.scheduled_input)
+
+    def next_start(self):
+        """Gets the earliest time scheduled direct input is due or a
+        scheduled macro waiting at the front of an otherwise idle
+        track starts.
+
+        :return: The time.monotonic() time or None
+        :rtype: float or None
+        """
+
+        next_start = None
+        if self.scheduled_input:
+            next_start = self.scheduled_input[0][0]
+        for track in self.merge_order:
+            if track.current_macro or track.current_frame or not track.buffer:
+                continue
+            _, start_at = next(iter(track.buffer.values()))
+            if start_at is not None and (next_start is None or start_at < next_start):
+                next_start = start_at
+
+        return next_start
+
+    def macros_queued(self):
+        """Checks if any track has a macro running or queued.
+
+        :rtype: bool
+        """
+
+        for track in self.merge_order:
+            if track.busy():
+                return True
+
+        return False
 
-        self.controller_input = controller_input
-    
     def commands_queued(self):
-        check = dumps(self.controller_input) != dumps(DIRECT_INPUT_IDLE_PACKET)
-        check = check or self.macro_buffer
-        check = check or self.current_macro
-        check = check or self.current_macro_commands
+        check = self.direct_input_pending()
+        check = check or self.macros_queued()
         return check
 
     def active_input_queued(self):
@@ -165,65 +483,88 @@ class InputParser():
         :return: True (on an active button) or False (no active buttons)
         :rtype: bool
         """
-        if (self.current_macro_commands is not None):
-            if len(self.current_macro_commands) < 2:
-                return False
-            else:
+        for track in self.merge_order:
+            if track.current_frame and track.current_frame[0] & FRAME_INPUT:
                 return True
-        elif dumps(self.controller_input) != dumps(DIRECT_INPUT_IDLE_PACKET):
-            return True
-        else:
-            return False
 
-    def set_protocol_input(self, state=None):
+        return self.direct_input_pending()
 
-        # Act on direct input if we're not getting idle packets
-        if dumps(self.controller_input) != dumps(DIRECT_INPUT_IDLE_PACKET):
-            self.parse_controller_input(self.controller_input)
-            self.controller_input = None
-
-        elif (self.macro_buffer or self.current_macro or
-              self.current_macro_commands):
-            # Check if we can start on a new macro.
-            if not self.current_macro and self.macro_buffer:
-                # Preprocess command lines of current macro
-                macro = self.macro_buffer.pop(0)
-                self.current_macro = self.parse_macro(macro[0])
-                self.current_macro_id = macro[1]
-
-            # Check if we can load the next set of commands
-            if not self.current_macro_commands and self.current_macro:
-                self.current_macro_commands = (
-                    self.current_macro.pop(0).strip(" ").split(" "))
-
-                # Timing metadata extraction
-                timer_length = self.current_macro_commands[-1]
-                timer_length = timer_length[0:len(timer_length)-1]
-                self.macro_timer_length = float(timer_length)
-                self.macro_timer_start = perf_counter()
-
-            self.set_macro_input(self.current_macro_commands)
-
-            # Check if we're done inputting the current command
-            time_delta = perf_counter() - self.macro_timer_start
-            if time_delta > self.macro_timer_length:
-                self.current_macro_commands = None
-                # Check if we're done the current macro
-                if not self.current_macro and state:
-                    finished = state["finished_macros"]
-                    finished.append(self.current_macro_id)
-                    state["finished_macros"] = finished
-
-    def parse_controller_input(self, controller_input):
-
-        # Check for input validity
-        if type(controller_input) != dict:
-            return
+    def set_protocol_input(self, state=None):
 
-        # Check if the Grip/Order menu would be closed
-        if not self.exited_grip_order_menu and (
-                controller_input["A"] or controller_input["B"] or controller_input["HOME"]):
-            self.exited_grip_order_menu = True
+        self.apply_scheduled_input()
+
+        # Direct input takes priority over macros
+        if self.held_input is not None:
+            if self.held_until is None or monotonic() < self.held_until:
+                self.set_macro_input(self.held_input)
+                if self.held_once:
+                    self.hold_input(None)
+                return
+            self.hold_input(None)
+
+        # Merge the current frame of every track. Buttons are ORed
+        # and each stick is taken from the highest priority track
+        # setting it.
+        now = perf_counter()
+        flags = upper = shared = lower = 0
+        stick_left = stick_right = None
+        finished = []
+        for track in self.merge_order:
+            if not track.busy():
+                continue
+
+            # Start the track's next macro once the last one is done.
+            # Text macros are compiled here, others arrive compiled
+            # from the client.
+            if (not track.current_macro and not track.current_frame and
+                    track.buffer):
+                macro_id, (frames, start_at) = next(iter(track.buffer.items()))
+                if start_at is None or start_at <= monotonic():
+                    del track.buffer[macro_id]
+                    del self.buffered_macros[macro_id]
+                    if start_at is not None:
+                        self.started_macros.append(macro_id)
+                    if isinstance(frames, str):
+                        frames = self.compile_macro(frames)
+                    track.current_macro = self.unpack_frames(frames)
+                    track.current_macro_id = macro_id
+
+            frame, macro_id = track.advance(now)
+            if macro_id is not None:
+                finished.append(macro_id)
+            if not frame or not frame[0] & FRAME_INPUT:
+                continue
+
+            flags |= FRAME_INPUT
+            upper |= frame[1] & track.buttons[0]
+            shared |= frame[2] & track.buttons[1]
+            lower |= frame[3] & track.buttons[2]
+            owned = frame[0] & track.sticks
+            if owned & FRAME_LEFT_STICK:
+                flags |= FRAME_LEFT_STICK
+                stick_left = frame[4]
+            if owned & FRAME_RIGHT_STICK:
+                flags |= FRAME_RIGHT_STICK
+                stick_right = frame[5]
+
+        if flags:
+            self.set_macro_input(
+                (flags, upper, shared, lower, stick_left, stick_right, 0))
+
+        if finished and state:
+            finished_macros = state["finished_macros"]
+            finished_macros.extend(finished)
+            state["finished_macros"] = finished_macros
+
+    def compile_controller_input(self, controller_input):
+        """Compiles a direct input packet into a frame. The frame's
+        duration is unused and set to 0.
+
+        :param controller_input: The input packet
+        :type controller_input: dict
+        :return: The frame's fields (see MACRO_FRAME_FORMAT)
+        :rtype: tuple
+        """
 
         # Arrays representing the 3 button bytes in the
         # standard input report as binary.
@@ -297,11 +638,9 @@ class InputParser():
         shared_byte = int("".join(shared), 2)
         lower_byte = int("".join(lower), 2)
 
-        self.protocol.set_button_inputs(upper_byte, shared_byte, lower_byte)
-        self.protocol.set_left_stick_inputs(stick_left)
-        self.protocol.set_right_stick_inputs(stick_right)
-
-        return controller_input
+        return (FRAME_INPUT | FRAME_LEFT_STICK | FRAME_RIGHT_STICK,
+                upper_byte, shared_byte, lower_byte,
+                bytes(stick_left), bytes(stick_right), 0)
 
     def parse_macro(self, macro):
 
@@ -355,17 +694,83 @@ class InputParser():
 
         return parsed
 
-    def set_macro_input(self, macro_input):
+    def compile_macro(self, macro):
+        """Compiles a text macro into packed frames, one per line
+        (after loops are multiplied out), so that the controller
+        doesn't need to parse it.
+
+        :param macro: The macro
+        :type macro: str
+        :raises ValueError: If a line's duration can't be parsed
+        :return: The packed frames
+        :rtype: bytes
+        """
+
+        return b"".join(
+            struct.pack(MACRO_FRAME_FORMAT, *self.compile_line(line))
+            for line in self.parse_macro(macro))
+
+    def compile_line(self, line):
+        """Compiles a single macro line into a frame.
+
+        :param line: The macro line, eg: "A B 0.1s"
+        :type line: str
+        :raises ValueError: If the line's duration can't be parsed
+        :return: The frame's fields (see MACRO_FRAME_FORMAT)
+        :rtype: tuple
+        """
+
+        commands = line.strip(" ").split(" ")
+        duration = float(commands[-1][0:len(commands[-1])-1])
+
+        # Wait lines don't set any input
+        if len(commands) < 2:
+            return (0, 0, 0, 0, bytes(3), bytes(3), duration)
 
-        # Checking if this is a wait macro command
-        if len(macro_input) < 2:
+        upper, shared, lower, stick_left, stick_right = (
+            self.parse_macro_buttons(commands))
+        flags = FRAME_INPUT
+        if stick_left:
+            flags |= FRAME_LEFT_STICK
+        if stick_right:
+            flags |= FRAME_RIGHT_STICK
+
+        return (flags, upper, shared, lower,
+                bytes(stick_left or bytes(3)), bytes(stick_right or bytes(3)),
+                duration)
+
+    def unpack_frames(self, frames):
+        """Unpacks compiled macro frames.
+
+        :param frames: The packed frames
+        :type frames: bytes
+        :return: The frames' fields
+        :rtype: list
+        """
+
+        return list(struct.iter_unpack(MACRO_FRAME_FORMAT, frames))
+
+    def set_macro_input(self, frame):
+
+        # Checking if this is a wait frame
+        if not frame or not frame[0] & FRAME_INPUT:
             return
 
-        # Check if the Grip/Order menu would be closed
+        flags, upper_byte, shared_byte, lower_byte, stick_left, stick_right, _ = frame
+
+        # Check if the Grip/Order menu would be closed (A, B or HOME)
         if not self.exited_grip_order_menu and (
-                'A' in macro_input or 'B' in macro_input or 'HOME' in macro_input):
+                upper_byte & 0x0C or shared_byte & 0x10):
             self.exited_grip_order_menu = True
 
+        self.protocol.set_button_inputs(upper_byte, shared_byte, lower_byte)
+        if flags & FRAME_LEFT_STICK:
+            self.protocol.set_left_stick_inputs(list(stick_left))
+        if flags & FRAME_RIGHT_STICK:
+            self.protocol.set_right_stick_inputs(list(stick_right))
+
+    def parse_macro_buttons(self, macro_input):
+
         # Arrays representing the 3 button bytes in the
         # standard input report as binary.
         upper = ['0'] * 8
@@ -437,11 +842,7 @@ class InputParser():
         shared_byte = int("".join(shared), 2)
         lower_byte = int("".join(lower), 2)
 
-        self.protocol.set_button_inputs(upper_byte, shared_byte, lower_byte)
-        if stick_left:
-            self.protocol.set_left_stick_inputs(stick_left)
-        if stick_right:
-            self.protocol.set_right_stick_inputs(stick_right)
+        return upper_byte, shared_byte, lower_byte, stick_left, stick_right
 
     def parse_macro_stick_position(self, stick_pos):
 
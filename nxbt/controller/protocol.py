@@ -42,6 +42,16 @@ class ControllerProtocol():
     }
     VIBRATOR_BYTES = [0xA0, 0xB0, 0xC0, 0x90]
 
+    # The report ID and input bytes (battery/connection info, buttons,
+    # sticks and vibrator) of an empty report
+    EMPTY_INPUT = {
+        "report_id": 0x00,
+        "status": (0x00, 0x00),
+        "buttons": (0x00, 0x00, 0x00),
+        "left_stick": (0x00, 0x00, 0x00),
+        "right_stick": (0x00, 0x00, 0x00),
+    }
+
     def __init__(self, controller_type, bt_address, report_size=50,
                  colour_body=None, colour_buttons=None):
         """Initializes the protocol for the controller.
@@ -69,10 +79,23 @@ class ControllerProtocol():
         else:
             raise ValueError("Unknown controller type specified")
 
+        # Bumped whenever a report differs from the previous one,
+        # ignoring the timer byte. The report ID and input bytes are
+        # tracked as they're set, so that reports needn't be compared.
+        self.report_version = 0
+        self.report_input = dict(self.EMPTY_INPUT)
+        self.last_input = dict(self.EMPTY_INPUT)
+        # Fields of the report being built that differ from the last
+        self.changed_input = set()
+        self.reply_pending = False
+
         self.report = None
         self.report_size = report_size
         self.set_empty_report()
 
+        # A prebuilt report with no input, sent while idle
+        self.idle_report = None
+
         # Input report mode
         self.mode = None
 
@@ -130,13 +153,45 @@ class ControllerProtocol():
 
     def get_report(self):
 
+        # Subcommand replies are always new. Otherwise, only the
+        # report ID and the input bytes can change between reports.
+        if self.reply_pending or self.changed_input:
+            self.report_version += 1
+            self.last_input.update(self.report_input)
+            self.changed_input.clear()
+            self.reply_pending = False
+
         report = bytes(self.report)
         # Clear report
         self.set_empty_report()
         return report
 
+    def get_idle_report(self):
+        """Gets a full input report with no input. The report is only
+        rebuilt after the Switch sends something, otherwise just its
+        timer byte is updated.
+
+        :return: The idle report
+        :rtype: bytes
+        """
+
+        if self.idle_report is None:
+            self.set_empty_report()
+            self.set_full_input_report()
+            self.idle_report = bytearray(self.report)
+            self.set_empty_report()
+        else:
+            self.set_timer()
+            self.idle_report[2] = self.report[2]
+
+        return bytes(self.idle_report)
+
     def process_commands(self, data):
 
+        # The Switch can change how reports are built
+        if data:
+            self.idle_report = None
+
         # Parsing the Switch's message
         message = SwitchReportParser(data)
 
@@ -205,11 +260,31 @@ class ControllerProtocol():
         empty_report[0] = 0xA1
 
         self.report = empty_report
+        for field, value in self.EMPTY_INPUT.items():
+            self.track_input(field, value)
+
+    def track_input(self, field, value):
+        """Records a report ID or input field of the report being
+        built, noting whether it differs from the last report's.
+
+        :param field: The field's name (see EMPTY_INPUT)
+        :type field: str
+        :param value: The field's value
+        :type value: int or tuple
+        """
+
+        self.report_input[field] = value
+        if value != self.last_input[field]:
+            self.changed_input.add(field)
+        else:
+            self.changed_input.discard(field)
 
     def set_subcommand_reply(self):
 
         # Input Report ID
         self.report[1] = 0x21
+        self.track_input("report_id", 0x21)
+        self.reply_pending = True
 
         # TODO: Find out what the vibrator byte is doing.
         # This is a hack in an attempt to semi-emulate
@@ -252,6 +327,7 @@ class ControllerProtocol():
 
         # Setting Report ID to full standard input report ID
         self.report[1] = 0x30
+        self.track_input("report_id", 0x30)
         self.set_standard_input_report()
         self.set_imu_data()
 
@@ -261,38 +337,33 @@ class ControllerProtocol():
 
         if self.device_info_queried:
             self.report[3] = self.battery_level + self.connection_info
-
-            self.report[4] = self.button_status[0]
-            self.report[5] = self.button_status[1]
-            self.report[6] = self.button_status[2]
-
-            self.report[7] = self.left_stick_centre[0]
-            self.report[8] = self.left_stick_centre[1]
-            self.report[9] = self.left_stick_centre[2]
-
-            self.report[10] = self.right_stick_centre[0]
-            self.report[11] = self.right_stick_centre[1]
-            self.report[12] = self.right_stick_centre[2]
-
             self.report[13] = self.vibrator_report
+            self.track_input("status", (self.report[3], self.report[13]))
+
+            self.set_button_inputs(*self.button_status)
+            self.set_left_stick_inputs(self.left_stick_centre)
+            self.set_right_stick_inputs(self.right_stick_centre)
 
     def set_button_inputs(self, upper, shared, lower):
 
         self.report[4] = upper
         self.report[5] = shared
         self.report[6] = lower
+        self.track_input("buttons", (upper, shared, lower))
 
     def set_left_stick_inputs(self, left):
 
         self.report[7] = left[0]
         self.report[8] = left[1]
         self.report[9] = left[2]
+        self.track_input("left_stick", tuple(left))
 
     def set_right_stick_inputs(self, right):
 
         self.report[10] = right[0]
         self.report[11] = right[1]
         self.report[12] = right[2]
+        self.track_input("right_stick", tuple(right))
 
     def set_device_info(self):
 
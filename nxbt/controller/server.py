@@ -1,26 +1,89 @@
 import socket
+import select
+import errno
 import fcntl
 import os
 import time
+import random
 import queue
 import logging
 import traceback
 import atexit
 from threading import Thread
+from collections import deque
+from contextlib import contextmanager
 import statistics as stat
 
 from .controller import Controller, ControllerTypes
 from ..bluez import BlueZ, find_devices_by_alias
+from ..bluez import get_object_index, DEVICE_INTERFACE
+from ..affinity import SwitchAffinityCache
 from .protocol import ControllerProtocol
-from .input import InputParser
+from .handshake import Handshake
+from .input import InputParser, MAIN_TRACK
 from .utils import format_msg_controller, format_msg_switch
 
 
 class ControllerServer():
 
+    # Seconds to wait on a single address when reconnecting
+    RECONNECT_TIMEOUT = 5
+    # Seconds to wait when reconnecting to several addresses at once
+    RECONNECT_DEADLINE = 10
+
+    # The default policy for recovering a lost connection
+    RECONNECT_POLICY = {
+        # Seconds to wait after the first failed reconnect attempt
+        "backoff_base": 0.5,
+        # The longest wait between reconnect attempts
+        "backoff_max": 8,
+        # Each wait is randomized by up to this fraction
+        "jitter": 0.25,
+        # Seconds spent reconnecting before pairing with any Switch
+        "budget": 30,
+        # Reconnect attempts before pairing with any Switch (None for no limit)
+        "max_attempts": None,
+    }
+
+    # Consecutive ticks without a successful send before the
+    # connection is considered degraded.
+    DEGRADED_TICKS = 132
+
+    # Connection state -> the states it can move to
+    CONNECTION_TRANSITIONS = {
+        None: ("pairing", "reconnecting"),
+        "connected": ("degraded", "reconnecting"),
+        "degraded": ("connected", "reconnecting"),
+        "reconnecting": ("connected", "pairing"),
+        "pairing": ("connected",),
+    }
+    # Connection state -> the controller state reported for it
+    CONNECTION_STATES = {
+        "connected": "connected",
+        "degraded": "connected",
+        "reconnecting": "reconnecting",
+        "pairing": "connecting",
+    }
+
+    # The number of recoveries kept in the controller state
+    RECOVERY_HISTORY = 20
+
+    # The most Switch packets read in a single tick
+    MAX_DRAIN = 16
+
+    # The fewest ticks between macro queue gauge updates
+    QUEUE_GAUGE_TICKS = 30
+    # Start times of scheduled macros kept in the state
+    MACRO_START_HISTORY = 32
+
+    # The input report ID of subcommand replies
+    SUBCOMMAND_REPLY_ID = 0x21
+
     def __init__(self, controller_type, adapter_path="/org/bluez/hci0",
                  state=None, task_queue=None, lock=None, colour_body=None,
-                 colour_buttons=None):
+                 colour_buttons=None, reconnect_policy=None, status=None,
+                 bluetooth=None, prepared=False, commands=None,
+                 macro_queue_limit=None, macro_queue_policy="block"):
 
         self.logger = logging.getLogger('nxbt')
         # Cache logging level to increase performance on checks
@@ -34,74 +97,116 @@ class ControllerServer():
             self.state = {
                 "state": "",
                 "finished_macros": [],
+                "macro_starts": {},
                 "errors": None,
-                "direct_input": None
             }
 
         self.task_queue = task_queue
+        # Commands sent straight from the client
+        self.commands = commands
+
+        # The controller's slot in the shared memory status table
+        self.status = status
 
         self.controller_type = controller_type
         self.colour_body = colour_body
         self.colour_buttons = colour_buttons
 
-        if lock:
-            self.lock = lock
-
-        self.reconnect_counter = 0
-
-        # Intializing Bluetooth
-        self.bt = BlueZ(adapter_path=adapter_path)
+        self.lock = lock
+
+        self.reconnect_policy = dict(self.RECONNECT_POLICY)
+        if reconnect_policy:
+            self.reconnect_policy.update(reconnect_policy)
+        self.connection_state = None
+        self.failed_sends = 0
+
+        # Only the newest input report waiting on a full send buffer
+        # is kept. Subcommand replies waiting on it are all sent, in
+        # order, ahead of it.
+        self.pending_report = None
+        self.pending_replies = deque()
+        self.reports_superseded = 0
+        self.reports_dropped = 0
+
+        # Reused for every packet read from the Switch
+        self.recv_buffer = bytearray(50)
+        self.max_backlog = 0
+        self.affinity = SwitchAffinityCache()
+
+        # Intializing Bluetooth.
+        # Warm controller workers pass in their already prepared adapter.
+        if bluetooth:
+            self.bt = bluetooth
+        else:
+            self.bt = BlueZ(adapter_path=adapter_path)
 
-        self.controller = Controller(self.bt, self.controller_type)
+        self.controller = Controller(self.bt, self.controller_type, prepared=prepared)
         self.protocol = ControllerProtocol(
             self.controller_type,
             self.bt.address,
             colour_body=self.colour_body,
             colour_buttons=self.colour_buttons)
 
-        self.input = InputParser(self.protocol)
+        self.input = InputParser(self.protocol,
+                                 buffer_limit=macro_queue_limit,
+                                 overflow_policy=macro_queue_policy)
+        # Macro queue gauges
+        self.macro_queue_peak = 0
+        self.macros_rejected = 0
+        self.macros_dropped = 0
+        self.published_queue_depth = 0
+        self.queue_gauge_tick = 0
 
         # Debug timekeeping storage array
         self.times = []
 
         # Initial reconnection overload protection
         self.tick = 1
-        self.cached_msg = ''
-
-    def run(self, reconnect_address=None):
+        # The version of the last report sent and its buttons/sticks
+        self.sent_version = None
+        self.sent_input = None
+        self.reports_sent = 0
+        self.reports_suppressed = 0
+        self.ticks = 0
+
+    def run(self, reconnect_address=None, restarted=False):
         """Runs the mainloop of the controller server.
 
         :param reconnect_address: The Bluetooth MAC address of a
         previously connected to Nintendo Switch, defaults to None
         :type reconnect_address: string or list, optional
+        :param restarted: Whether the server is a restart of a crashed
+        controller, whose channel holds the commands sent to it since
+        the crash, defaults to False
+        :type restarted: bool, optional
         """
 
         self.state["state"] = "initializing"
+        self.update_status(state="initializing")
+
+        # Commands meant for an earlier controller in this channel
+        if self.commands and not restarted:
+            self.commands.discard()
+        connection_start = time.perf_counter()
 
         try:
-            # If we have a lock, prevent other controllers
-            # from initializing at the same time and saturating the DBus,
-            # potentially causing a kernel panic.
-            if self.lock:
-                self.lock.acquire()
-            try:
+            with self.bluetooth_lock():
                 self.controller.setup()
 
-                if reconnect_address:
-                    try:
-                        itr, ctrl = self.reconnect(reconnect_address)
-                    except OSError:
-                        itr, ctrl = self.connect()
-                else:
+            # Only the adapter configuration is serialized, so other
+            # controllers can listen and pair at the same time.
+            if reconnect_address:
+                try:
+                    itr, ctrl = self.reconnect(reconnect_address)
+                except OSError:
                     itr, ctrl = self.connect()
-            finally:
-                if self.lock:
-                    self.lock.release()
+            else:
+                itr, ctrl = self.connect()
 
-            self.switch_address = itr.getpeername()[0]
-            self.state["last_connection"] = self.switch_address
+            self.record_connection(itr)
+            self.state["connection_time"] = time.perf_counter() - connection_start
 
-            self.state["state"] = "connected"
+            self.set_connection_state("connected")
 
             self.mainloop(itr, ctrl)
 
@@ -109,13 +214,33 @@ class ControllerServer():
             pass
         except Exception:
             try:
+                # Macros that won't be input are finished so that
+                # blocking callers continue.
+                self.finish_macros(list(self.input.buffered_macros))
                 self.state["state"] = "crashed"
                 self.state["errors"] = traceback.format_exc()
+                self.update_status(state="crashed", error=True)
                 return self.state
             except Exception as e:
                 self.logger.debug("Error during graceful shutdown:")
                 self.logger.debug(traceback.format_exc())
 
+    @contextmanager
+    def bluetooth_lock(self):
+        """Holds the shared Bluetooth lock (if one was given) so that
+        D-Bus sensitive adapter configuration isn't run by several
+        controllers at the same time, saturating the DBus and
+        potentially causing a kernel panic.
+        """
+
+        if self.lock:
+            self.lock.acquire()
+        try:
+            yield
+        finally:
+            if self.lock:
+                self.lock.release()
+
     def mainloop(self, itr, ctrl):
 
         duration_start = time.perf_counter()
@@ -123,33 +248,48 @@ class ControllerServer():
             # Start timing command processing
             timer_start = time.perf_counter()
 
-            # Attempt to get output from Switch
+            # Get all output the Switch sent since the last tick.
+            # Earlier subcommands are answered right away, in order,
+            # and the last is answered with this tick's input.
+            packets = self.drain_switch(itr)
+            reply = packets.pop() if packets else None
             try:
-                reply = itr.recv(50)
-                if len(reply) > 40:
-                    self.logger.debug(format_msg_switch(reply))
-            except BlockingIOError:
+                for packet in packets:
+                    self.answer_subcommand(itr, packet)
+            except OSError as e:
+                itr, ctrl = self.save_connection(e)
                 reply = None
 
-            # Getting any inputs from the task queue
-            if self.task_queue:
-                try:
-                    while True:
-                        msg = self.task_queue.get_nowait()
-                        if msg and msg["type"] == "macro":
-                            self.input.buffer_macro(
-                                msg["macro"], msg["macro_id"])
-                        elif msg and msg["type"] == "stop":
-                            self.input.stop_macro(
-                                msg["macro_id"], state=self.state)
-                        elif msg and msg["type"] == "clear":
-                            self.input.clear_macros()
-                except queue.Empty:
-                    pass
-
-            # Set Direct Input
-            if self.state["direct_input"]:
-                self.input.set_controller_input(self.state["direct_input"])
+            # Getting any inputs from the task queue and command channel
+            for msg in self.receive_tasks():
+                if msg and msg["type"] == "macro":
+                    discarded = self.input.buffer_macro(
+                        msg["macro"], msg["macro_id"],
+                        msg.get("track") or MAIN_TRACK, msg.get("start_at"))
+                    if discarded:
+                        self.discard_macros(discarded)
+                elif msg and msg["type"] == "stop":
+                    self.input.stop_macro(
+                        msg["macro_id"], state=self.state)
+                elif msg and msg["type"] == "clear":
+                    self.input.clear_macros(msg.get("track"))
+                elif msg and msg["type"] == "track":
+                    self.input.add_track(
+                        msg["name"], msg["owns"], msg["priority"])
+                elif msg and msg["type"] == "remove_track":
+                    self.finish_macros(self.input.remove_track(msg["name"]))
+                elif msg and msg["type"] == "input":
+                    frames = self.input.unpack_frames(msg["frame"])
+                    self.input.hold_input(
+                        frames[0] if frames else None, msg["ttl"], once=not msg["hold"])
+                elif msg and msg["type"] == "schedule_input":
+                    if msg["replace"]:
+                        self.input.clear_scheduled_input()
+                    for at, frame in msg["inputs"]:
+                        frames = self.input.unpack_frames(frame)
+                        self.input.schedule_input(at, frames[0] if frames else None)
+            self.macro_queue_peak = max(
+                self.macro_queue_peak, len(self.input.buffered_macros))
 
             self.protocol.process_commands(reply)
             self.input.set_protocol_input(state=self.state)
@@ -160,31 +300,73 @@ class ControllerServer():
                 self.logger.debug(format_msg_controller(msg))
 
             try:
-                # Cache the last packet to prevent overloading the switch
+                # Only send changed reports to prevent overloading the switch
                 # with packets on the "Change Grip/Order" menu.
-                if msg[3:] != self.cached_msg:
-                    itr.sendall(msg)
-                    self.cached_msg = msg[3:]
+                if self.protocol.report_version != self.sent_version:
+                    if msg[1] == self.SUBCOMMAND_REPLY_ID:
+                        self.queue_reply(msg)
+                    else:
+                        self.queue_report(msg)
+                    self.sent_version = self.protocol.report_version
+                    self.sent_input = msg[4:13]
+                    self.reports_sent += 1
                 # Send a blank packet every so often to keep the Switch
                 # from disconnecting from the controller.
                 elif self.tick >= 132:
-                    itr.sendall(msg)
+                    self.queue_report(msg)
                     self.tick = 0
-            except BlockingIOError:
-                continue
+                    self.reports_sent += 1
+                    self.publish_report_counts()
+                else:
+                    self.reports_suppressed += 1
+                self.flush_report(itr)
             except OSError as e:
                 # Attempt to reconnect to the Switch
                 itr, ctrl = self.save_connection(e)
 
+            if not self.reports_pending():
+                self.failed_sends = 0
+                if self.connection_state == "degraded":
+                    self.set_connection_state("connected")
+            else:
+                # The send buffer is full
+                self.failed_sends += 1
+                if (self.failed_sends >= self.DEGRADED_TICKS and
+                        self.connection_state == "connected"):
+                    self.set_connection_state("degraded")
+
+            # Park the controller until there's something to do
+            if (reply is None and not self.reports_pending() and
+                    self.connection_state == "connected" and
+                    not self.input_pending()):
+                try:
+                    self.idle(itr)
+                except OSError as e:
+                    itr, ctrl = self.save_connection(e)
+                duration_start = time.perf_counter()
+                continue
+
             # Figure out how long it took to process commands
             duration_end = time.perf_counter()
             duration_elapsed = duration_end - duration_start
             duration_start = duration_end
             
             sleep_time = 1/132 - duration_elapsed
+            # Wake in time for the next scheduled macro or input
+            start_at = self.input.next_start()
+            if start_at is not None:
+                sleep_time = min(sleep_time, start_at - time.monotonic())
             if sleep_time >= 0:
-                time.sleep(sleep_time)
+                try:
+                    self.wait_for_tick(itr, sleep_time)
+                except OSError as e:
+                    itr, ctrl = self.save_connection(e)
             self.tick += 1
+            self.ticks += 1
+
+            if (self.ticks - self.queue_gauge_tick >= self.QUEUE_GAUGE_TICKS and
+                    len(self.input.buffered_macros) != self.published_queue_depth):
+                self.publish_queue_gauges()
 
             if self.logger_level <= logging.DEBUG:
                 self.times.append(duration_elapsed)
@@ -196,11 +378,352 @@ class ControllerServer():
                     f"Tick: {self.tick}, Mean Time: {str(1/mean_time)}")
 
 
+    def receive_tasks(self):
+        """Gets the tasks waiting in the task queue and the
+        command channel. With the "block" macro queue policy, only as
+        many macros as there's space for in the macro buffer are
+        taken, so that clients block once the channel fills. Stops,
+        clears and other commands in the channel are always taken,
+        ahead of the macros the channel holds back.
+
+        :return: The tasks
+        :rtype: list
+        """
+
+        limit = None
+        if self.input.overflow_policy == "block":
+            limit = self.input.buffer_space()
+
+        msgs = []
+        macros = 0
+        if self.task_queue:
+            try:
+                while limit is None or macros < limit:
+                    msg = self.task_queue.get_nowait()
+                    msgs.append(msg)
+                    macros += bool(msg) and msg["type"] == "macro"
+            except queue.Empty:
+                pass
+        if self.commands:
+            msgs.extend(self.commands.receive(
+                None if limit is None else max(limit - macros, 0)))
+
+        return msgs
+
+    def record_macro_starts(self, started_at):
+        """Copies the start time of newly started scheduled macros
+        to the controller state.
+
+        :param started_at: The time.monotonic() time the first report
+        with their input was sent
+        :type started_at: float
+        """
+
+        starts = self.state["macro_starts"]
+        for macro_id in self.input.started_macros:
+            starts[macro_id] = started_at
+        self.input.started_macros = []
+
+        # Dicts keep insertion order, so the oldest are first
+        for macro_id in list(starts)[:-self.MACRO_START_HISTORY]:
+            del starts[macro_id]
+        self.state["macro_starts"] = starts
+
+    def discard_macros(self, macro_ids):
+        """Finishes macros that were rejected or dropped because the
+        macro buffer was full, so that blocking callers continue.
+
+        :param macro_ids: The IDs of the discarded macros
+        :type macro_ids: list
+        """
+
+        if self.input.overflow_policy == "reject":
+            self.macros_rejected += len(macro_ids)
+        else:
+            self.macros_dropped += len(macro_ids)
+
+        self.finish_macros(macro_ids)
+        self.publish_queue_gauges()
+
+    def finish_macros(self, macro_ids):
+        """Adds macros to the finished macros without inputting them.
+
+        :param macro_ids: The IDs of the macros
+        :type macro_ids: list
+        """
+
+        if not macro_ids:
+            return
+
+        finished = self.state["finished_macros"]
+        finished.extend(macro_ids)
+        self.state["finished_macros"] = finished
+
+    def publish_queue_gauges(self):
+        """Copies the macro queue's depth, peak depth and overflow
+        counts to the controller state.
+        """
+
+        depth = len(self.input.buffered_macros)
+        self.macro_queue_peak = max(self.macro_queue_peak, depth)
+        self.state["macro_queue"] = {
+            "depth": depth,
+            "peak": self.macro_queue_peak,
+            "limit": self.input.buffer_limit,
+            "policy": self.input.overflow_policy,
+            "rejected": self.macros_rejected,
+            "dropped": self.macros_dropped,
+        }
+        self.published_queue_depth = depth
+        self.queue_gauge_tick = self.ticks
+
+    def input_pending(self):
+        """Checks if the controller has any input to act on.
+
+        :return: Whether a macro or direct input is queued or held
+        :rtype: bool
+        """
+
+        return self.input.macros_queued() or self.input.direct_input_pending()
+
+    def idle(self, itr):
+        """Blocks while the controller has no input to send. Only
+        Switch traffic, new tasks (including direct input) and the
+        keepalive deadline wake the controller. Keepalives are sent
+        from a prebuilt idle report.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        :raises OSError: If the connection has been lost
+        """
+
+        wake = [itr]
+        # The task queue's pipe is readable once a task is put on it
+        reader = getattr(self.task_queue, "_reader", None)
+        if reader is not None:
+            wake.append(reader)
+        if self.commands:
+            wake.append(self.commands)
+
+        self.publish_report_counts()
+        if self.published_queue_depth:
+            self.publish_queue_gauges()
+
+        last_keepalive = time.perf_counter() - self.tick / 132
+        while True:
+            now = time.perf_counter()
+            if now - last_keepalive >= 1:
+                self.queue_report(self.protocol.get_idle_report())
+                self.flush_report(itr)
+                last_keepalive = now
+
+            timeout = last_keepalive + 1 - now
+            readable, _, _ = select.select(wake, [], [], max(timeout, 0))
+            if readable or self.reports_pending():
+                break
+
+        self.tick = int((time.perf_counter() - last_keepalive) * 132)
+
+    def publish_report_counts(self):
+        """Copies the sent and suppressed report counts to the
+        controller state. This is only done occasionally to keep
+        shared state writes out of every tick.
+        """
+
+        self.state["reports_sent"] = self.reports_sent
+        self.state["reports_suppressed"] = self.reports_suppressed
+        self.update_status(ticks=self.ticks,
+                           reports_sent=self.reports_sent,
+                           reports_suppressed=self.reports_suppressed)
+
+    def update_status(self, **fields):
+        """Updates the controller's shared memory status, if it has one."""
+
+        if self.status:
+            self.status.update(**fields)
+
+    def drain_switch(self, itr):
+        """Reads every packet waiting on the interrupt socket into the
+        reusable receive buffer. Rumble-only output reports are skipped
+        since there's nothing to reply to.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        :return: The remaining packets, in the order received
+        :rtype: list
+        """
+
+        packets = []
+        depth = 0
+        while depth < self.MAX_DRAIN:
+            try:
+                length = itr.recv_into(self.recv_buffer)
+            except BlockingIOError:
+                break
+            if not length:
+                break
+            depth += 1
+
+            # Rumble-only output report
+            if length > 1 and self.recv_buffer[1] == 0x10:
+                continue
+
+            packet = bytes(self.recv_buffer[:length])
+            if self.logger_level <= logging.DEBUG and length > 40:
+                self.logger.debug(format_msg_switch(packet))
+            packets.append(packet)
+
+        if depth > self.max_backlog:
+            self.max_backlog = depth
+            self.state["max_switch_backlog"] = depth
+        if depth > 1:
+            self.logger.debug(f"Switch backlog: {depth} packets")
+
+        return packets
+
+    def answer_subcommand(self, itr, packet):
+        """Replies to a Switch packet outside of the tick. The reply
+        carries the last input sent so that it doesn't interrupt
+        held buttons or sticks.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        :param packet: The packet from the Switch
+        :type packet: bytes
+        :raises OSError: If the connection has been lost
+        """
+
+        self.protocol.process_commands(packet)
+        msg = bytearray(self.protocol.get_report())
+        if self.sent_input:
+            msg[4:13] = self.sent_input
+
+        self.queue_reply(bytes(msg))
+        self.flush_report(itr)
+
+    def queue_reply(self, msg):
+        """Queues a subcommand reply. Unlike input reports, replies
+        are never superseded, since the Switch waits on each of them.
+
+        :param msg: The reply to send
+        :type msg: bytes
+        """
+
+        self.pending_replies.append(msg)
+
+    def queue_report(self, msg):
+        """Places a report in the send slot. A report still waiting
+        in the slot is superseded, since only the newest input matters.
+
+        :param msg: The report to send
+        :type msg: bytes
+        """
+
+        if self.pending_report is not None:
+            self.reports_superseded += 1
+            self.state["reports_superseded"] = self.reports_superseded
+        self.pending_report = msg
+
+    def flush_report(self, itr):
+        """Sends the queued subcommand replies, in order, and then the
+        report in the send slot, for as long as the socket can take
+        them. Once everything is sent, newly started scheduled macros
+        are recorded as started.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        :raises OSError: If the connection has been lost
+        :return: Whether everything was sent
+        :rtype: bool
+        """
+
+        try:
+            while self.pending_replies:
+                itr.sendall(self.pending_replies[0])
+                self.pending_replies.popleft()
+
+            if self.pending_report is not None:
+                itr.sendall(self.pending_report)
+                self.pending_report = None
+        except BlockingIOError:
+            return False
+
+        # Scheduled macros start once the Switch is sent their input
+        if self.input.started_macros:
+            self.record_macro_starts(time.monotonic())
+
+        return True
+
+    def reports_pending(self):
+        """Checks if any reply or report is waiting on the send buffer.
+
+        :rtype: bool
+        """
+
+        return self.pending_report is not None or bool(self.pending_replies)
+
+    def wait_for_tick(self, itr, timeout):
+        """Waits out the rest of a tick. If a reply or report is waiting
+        to be sent, it is sent as soon as the socket becomes writable
+        instead of spinning on the full send buffer.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        :param timeout: The time left in the tick (in seconds)
+        :type timeout: float
+        :raises OSError: If the connection has been lost
+        """
+
+        deadline = time.perf_counter() + timeout
+        while self.reports_pending():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            _, writable, _ = select.select([], [itr], [], remaining)
+            # Give up on the tick if the socket still can't take the report
+            if not writable or not self.flush_report(itr):
+                break
+
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
     def save_connection(self, error, state=None):
+        """Recovers a lost connection. The last connected Switch is
+        reconnected to with jittered exponential backoff until the
+        reconnect policy's budget runs out, after which any Switch
+        is paired with.
+
+        :param error: The error that caused the connection loss
+        :type error: Exception
+        :return: The new interrupt and control sockets
+        :rtype: tuple
+        """
 
-        while self.reconnect_counter < 2:
+        recovery_start = time.perf_counter()
+        cause = f"{type(error).__name__}: {error}"
+        self.logger.debug(f"Connection lost: {cause}")
+
+        self.state["reconnects"] = self.state.get("reconnects", 0) + 1
+        self.update_status(reconnects=self.state["reconnects"])
+        self.set_connection_state("reconnecting")
+
+        # Reports for the lost connection are stale
+        if self.reports_pending():
+            self.reports_dropped += (
+                len(self.pending_replies) + (self.pending_report is not None))
+            self.state["reports_dropped"] = self.reports_dropped
+            self.pending_report = None
+            self.pending_replies.clear()
+        self.failed_sends = 0
+
+        policy = self.reconnect_policy
+        attempts = 0
+        while (policy["max_attempts"] is None or
+                attempts < policy["max_attempts"]):
+            attempts += 1
             try:
-                self.logger.debug("Attempting to reconnect")
+                self.logger.debug(f"Attempting to reconnect ({attempts})")
                 # Reinitialize the protocol
                 self.protocol = ControllerProtocol(
                     self.controller_type,
@@ -208,62 +731,26 @@ class ControllerServer():
                     colour_body=self.colour_body,
                     colour_buttons=self.colour_buttons)
                 self.input.reassign_protocol(self.protocol)
-                if self.lock:
-                    self.lock.acquire()
-                try:
-                    itr, ctrl = self.reconnect(self.switch_address)
-
-                    received_first_message = False
-                    while True:
-                        # Attempt to get output from Switch
-                        try:
-                            reply = itr.recv(50)
-                            if self.logger_level <= logging.DEBUG and len(reply) > 40:
-                                self.logger.debug(format_msg_switch(reply))
-                        except BlockingIOError:
-                            reply = None
-
-                        if reply:
-                            received_first_message = True
+                self.sent_version = None
+                itr, ctrl = self.reconnect(self.switch_address)
 
-                        self.protocol.process_commands(reply)
-                        msg = self.protocol.get_report()
+                self.handshake(itr)
 
-                        if self.logger_level <= logging.DEBUG and reply:
-                            self.logger.debug(format_msg_controller(msg))
-
-                        try:
-                            itr.sendall(msg)
-                        except BlockingIOError:
-                            continue
+                self.record_connection(itr)
+                self.record_recovery(cause, recovery_start, attempts, "reconnected")
+                self.set_connection_state("connected")
+                return itr, ctrl
+            except OSError as e:
+                self.logger.debug(e)
 
-                        # Exit pairing loop when player lights have been set and
-                        # vibration has been enabled
-                        if (reply and len(reply) > 45 and
-                                self.protocol.vibration_enabled and self.protocol.player_number):
-                            break
-
-                        # Switch responds to packets slower during pairing
-                        # Pairing cycle responds optimally on a 15Hz loop
-                        if not received_first_message:
-                            time.sleep(1)
-                        else:
-                            time.sleep(1/15)
-
-                    self.state["state"] = "connected"
-                    return itr, ctrl
-                finally:
-                    if self.lock:
-                        self.lock.release()
-            except OSError:
-                self.reconnect_counter += 1
-                self.logger.debug(error)
-                time.sleep(0.5)
+            remaining = policy["budget"] - (time.perf_counter() - recovery_start)
+            if remaining <= 0:
+                break
+            time.sleep(min(self.backoff_delay(attempts), remaining))
 
         # If we can't reconnect, transition to attempting
         # to connect to any Switch.
         self.logger.debug("Connecting to any Switch")
-        self.reconnect_counter = 0
 
         # Reinitialize initial communication overload protections
         self.tick = 1
@@ -275,62 +762,195 @@ class ControllerServer():
             colour_body=self.colour_body,
             colour_buttons=self.colour_buttons)
         self.input.reassign_protocol(self.protocol)
+        self.sent_version = None
 
         # Since we were forced to attempt a reconnection
         # we need to press the L/SL and R/SR buttons before
         # we can proceed with any input.
         if self.controller_type == ControllerTypes.PRO_CONTROLLER:
-            self.input.current_macro_commands = "L R 0.0s".strip(" ").split(" ")
+            self.input.main_track.current_frame = self.input.compile_line("L R 0.0s")
         elif self.controller_type == ControllerTypes.JOYCON_L:
-            self.input.current_macro_commands = "JCL_SL JCL_SR 0.0s".strip(" ").split(" ")
+            self.input.main_track.current_frame = self.input.compile_line("JCL_SL JCL_SR 0.0s")
         elif self.controller_type == ControllerTypes.JOYCON_R:
-            self.input.current_macro_commands = "JCR_SL JCR_SR 0.0s".strip(" ").split(" ")
+            self.input.main_track.current_frame = self.input.compile_line("JCR_SL JCR_SR 0.0s")
 
-        if self.lock:
-            self.lock.acquire()
+        itr, ctrl = self.connect()
+
+        self.record_connection(itr)
+        self.record_recovery(cause, recovery_start, attempts, "paired")
+        self.set_connection_state("connected")
+
+        return itr, ctrl
+
+    def backoff_delay(self, attempt):
+        """Calculates the jittered wait after a failed reconnect attempt.
+
+        :param attempt: The number of attempts made so far
+        :type attempt: int
+        :return: The time to wait in seconds
+        :rtype: float
+        """
+
+        policy = self.reconnect_policy
+        delay = min(policy["backoff_base"] * 2 ** (attempt - 1),
+                    policy["backoff_max"])
+
+        return delay * random.uniform(1 - policy["jitter"], 1 + policy["jitter"])
+
+    def set_connection_state(self, connection_state):
+        """Moves the connection state machine to a new state and
+        updates the controller state to match.
+
+        :param connection_state: "connected", "degraded",
+        "reconnecting" or "pairing"
+        :type connection_state: str
+        :raises ValueError: If the state can't be moved to from
+        the current state
+        """
+
+        if connection_state != self.connection_state:
+            allowed = self.CONNECTION_TRANSITIONS[self.connection_state]
+            if connection_state not in allowed:
+                raise ValueError(
+                    f"Invalid connection state transition: "
+                    f"{self.connection_state} -> {connection_state}")
+            self.logger.debug(
+                f"Connection state: {self.connection_state} -> {connection_state}")
+            self.connection_state = connection_state
+
+        self.state["connection_state"] = connection_state
+        self.state["state"] = self.CONNECTION_STATES[connection_state]
+        self.update_status(state=self.CONNECTION_STATES[connection_state],
+                           connection_state=connection_state)
+
+    def record_recovery(self, cause, start, attempts, outcome):
+        """Records a recovered connection in the controller state.
+
+        :param cause: A description of the error that lost the connection
+        :type cause: str
+        :param start: The perf_counter time the connection was lost at
+        :type start: float
+        :param attempts: The number of reconnect attempts made
+        :type attempts: int
+        :param outcome: "reconnected" or "paired"
+        :type outcome: str
+        """
+
+        recoveries = self.state.get("recoveries", [])
+        recoveries.append({
+            "cause": cause,
+            "timestamp": time.time(),
+            "duration": time.perf_counter() - start,
+            "attempts": attempts,
+            "outcome": outcome,
+        })
+        # Reassigned so the shared state dict sees the change
+        self.state["recoveries"] = recoveries[-self.RECOVERY_HISTORY:]
+
+    def handshake(self, itr):
+        """Runs the pairing exchange with the Switch and stores its
+        statistics under "handshake" in the controller's state.
+
+        :param itr: The non-blocking interrupt socket
+        :type itr: socket.socket
+        """
+
+        handshake = Handshake(self.protocol)
         try:
-            itr, ctrl = self.connect()
+            handshake.run(itr)
         finally:
-            if self.lock:
-                self.lock.release()
+            self.state["handshake"] = handshake.stats()
+
+    def record_connection(self, itr):
+        """Records the Switch connected on the given interrupt socket
+        as the last connection and as this adapter's affine Switch.
 
-        self.state["state"] = "connected"
+        :param itr: The connected interrupt socket
+        :type itr: socket.socket
+        """
 
-        self.switch_address = itr.getsockname()[0]
+        self.switch_address = itr.getpeername()[0]
+        self.state["last_connection"] = self.switch_address
+        self.update_status(last_connection=self.switch_address,
+                           player_number=self.protocol.player_number)
+        self.affinity.record(self.bt.address, self.switch_address)
 
-        return itr, ctrl
+    def start_connection_reset_watchdog(self):
+        """Starts watching for Switches that repeatedly connect and
+        disconnect while the controller is waiting for a connection.
+
+        The watchdog reacts to Device1.Connected property changes
+        from the BlueZ object index. If the index can't receive
+        signals, the watchdog falls back to polling in a thread.
+        """
+
+        self._crw_connected = set()
+        self._crw_disconnect_counts = {}
+        self._crw_running = True
+
+        self._crw_index = get_object_index()
+        if self._crw_index.subscribed:
+            self._crw_index.add_listener(self._on_device_properties_changed)
+            # Switches that connected before the watchdog started
+            # are tracked too, as the polling watchdog's first poll does.
+            for path, props in self._crw_index.find_devices(
+                    alias="Nintendo Switch", connected=True):
+                self._crw_connected.add(path)
+        else:
+            crw = Thread(target=self.connection_reset_watchdog, daemon=True)
+            crw.start()
+
+    def stop_connection_reset_watchdog(self):
+
+        self._crw_running = False
+        self._crw_index.remove_listener(self._on_device_properties_changed)
+
+    def _on_device_properties_changed(self, path, interface, changed):
+
+        if interface != DEVICE_INTERFACE or "Connected" not in changed:
+            return
+
+        props = self._crw_index.get_properties(path, DEVICE_INTERFACE)
+        if not props or str(props.get("Alias", "")).upper() != "NINTENDO SWITCH":
+            return
+
+        self._record_switch_connection(path, bool(changed["Connected"]))
+
+    def _record_switch_connection(self, path, connected):
+
+        # Keep track of Switches that connect
+        if connected:
+            self._crw_connected.add(path)
+            return
+
+        # Increment a counter if a Switch connected and disconnected
+        if path not in self._crw_connected:
+            return
+        self._crw_connected.discard(path)
+        count = self._crw_disconnect_counts.get(path, 0) + 1
+        self._crw_disconnect_counts[path] = count
+
+        # Delete Switches that connect/disconnect twice.
+        # This behaviour is characteristic of connection issues and is corrected
+        # by removing the Switch's connection to the system.
+        if count >= 2:
+            self.logger.debug(
+                "A Nintendo Switch disconnected. Resetting Connection...")
+            self.logger.debug(f"Removing {str(path)}")
+            self.bt.remove_device(path)
+            self._crw_disconnect_counts[path] = 0
 
     def connection_reset_watchdog(self):
+        """Polling fallback for the connection reset watchdog,
+        used when BlueZ signals are unavailable.
+        """
 
-        connected_devices = []
-        connected_devices_count = {}
         while self._crw_running:
-            paths = self.bt.find_connected_devices(alias_filter="Nintendo Switch")
-            # Keep track of Switches that connect
-            if len(paths) > 0:
-                connected_devices = list(set(connected_devices + paths))
-            
-            # Increment a counter if a Switch connected and disconnected
-            disconnected = list(set(connected_devices) - set(paths))
-            if len(disconnected) > 0:
-                for path in disconnected:
-                    if path not in connected_devices_count.keys():
-                        connected_devices_count[path] = 1
-                    else:
-                        connected_devices_count[path] += 1
-                connected_devices = list(set(connected_devices) - set(disconnected))
-            
-            # Delete Switches that connect/disconnect twice.
-            # This behaviour is characteristic of connection issues and is corrected
-            # by removing the Switch's connection to the system.
-            if len(connected_devices_count.keys()) > 0:
-                for key in connected_devices_count.keys():
-                    if connected_devices_count[key] >= 2:
-                        self.logger.debug(
-                            "A Nintendo Switch disconnected. Resetting Connection...")
-                        self.logger.debug(f"Removing {str(key)}")
-                        self.bt.remove_device(key)
-                        connected_devices_count[key] = 0
+            paths = set(self.bt.find_connected_devices(alias_filter="Nintendo Switch"))
+            for path in paths - self._crw_connected:
+                self._record_switch_connection(path, True)
+            for path in self._crw_connected - paths:
+                self._record_switch_connection(path, False)
 
             time.sleep(0.1)
 
@@ -345,7 +965,7 @@ class ControllerServer():
         # disconnect during a connection.
         while True:
             try:
-                self.state["state"] = "connecting"
+                self.set_connection_state("pairing")
 
                 # Creating control and interrupt sockets
                 s_ctrl = socket.socket(
@@ -368,22 +988,21 @@ class ControllerServer():
                 s_itr.listen(1)
                 s_ctrl.listen(1)
 
-                self.bt.set_discoverable(True)
+                with self.bluetooth_lock():
+                    self.bt.set_discoverable(True)
 
-                # WARNING:
-                # A device's class must be set **AFTER** discoverability
-                # is set. If it is set before or in a similar timeframe,
-                # the class will be reset to the default value.
-                self.bt.set_class("0x02508")
+                    # WARNING:
+                    # A device's class must be set **AFTER** discoverability
+                    # is set. If it is set before or in a similar timeframe,
+                    # the class will be reset to the default value.
+                    self.bt.set_class("0x02508")
 
-                self._crw_running = True
-                crw = Thread(target = self.connection_reset_watchdog)
-                crw.start()
-
-                itr, itr_address = s_itr.accept()
-                ctrl, ctrl_address = s_ctrl.accept()
-
-                self._crw_running = False
+                self.start_connection_reset_watchdog()
+                try:
+                    itr, itr_address = s_itr.accept()
+                    ctrl, ctrl_address = s_ctrl.accept()
+                finally:
+                    self.stop_connection_reset_watchdog()
 
                 # Send an empty input report to the Switch to prompt a reply
                 self.protocol.process_commands(None)
@@ -395,44 +1014,8 @@ class ControllerServer():
                 # for sending and receiving, instead of blocking.
                 fcntl.fcntl(itr, fcntl.F_SETFL, os.O_NONBLOCK)
 
-                # Mainloop
-                received_first_message = False
-                while True:
-                    # Attempt to get output from Switch
-                    try:
-                        reply = itr.recv(50)
-                        if self.logger_level <= logging.DEBUG and len(reply) > 40:
-                            self.logger.debug(format_msg_switch(reply))
-                    except BlockingIOError:
-                        reply = None
-
-                    if reply:
-                        received_first_message = True
-
-                    self.protocol.process_commands(reply)
-                    msg = self.protocol.get_report()
-
-                    if self.logger_level <= logging.DEBUG and reply:
-                        self.logger.debug(format_msg_controller(msg))
-
-                    try:
-                        itr.sendall(msg)
-                    except BlockingIOError:
-                        continue
-
-                    # Exit pairing loop when player lights have been set and
-                    # vibration has been enabled
-                    if (reply and len(reply) > 45 and
-                            self.protocol.vibration_enabled and self.protocol.player_number):
-                        break
+                self.handshake(itr)
 
-                    # Switch responds to packets slower during pairing
-                    # Pairing cycle responds optimally on a 15Hz loop
-                    if not received_first_message:
-                        time.sleep(1)
-                    else:
-                        time.sleep(1/15)
-                
                 break
             except OSError as e:
                 self.logger.debug(e)
@@ -441,53 +1024,50 @@ class ControllerServer():
 
         return itr, ctrl
 
-    def reconnect(self, reconnect_address):
+    def reconnect(self, reconnect_address, timeout=None, deadline=None):
         """Attempts to reconnect with a Switch at the given address.
+        If a list of addresses is given, the Switch this adapter last
+        connected to is tried first. If that fails, the other addresses
+        are all tried at once and the first to connect is used.
 
         :param reconnect_address: The Bluetooth MAC address of the Switch
         :type reconnect_address: string or list
+        :param timeout: The time (in seconds) to wait on a single
+        address, defaults to RECONNECT_TIMEOUT
+        :type timeout: float, optional
+        :param deadline: The time (in seconds) to wait on the other
+        addresses of a list, defaults to RECONNECT_DEADLINE
+        :type deadline: float, optional
+        :raises OSError: If none of the addresses can be connected to
         """
 
-        def recreate_sockets():
-            # Creating control and interrupt sockets
-            ctrl = socket.socket(
-                family=socket.AF_BLUETOOTH,
-                type=socket.SOCK_SEQPACKET,
-                proto=socket.BTPROTO_L2CAP)
-            itr = socket.socket(
-                family=socket.AF_BLUETOOTH,
-                type=socket.SOCK_SEQPACKET,
-                proto=socket.BTPROTO_L2CAP)
+        if timeout is None:
+            timeout = self.RECONNECT_TIMEOUT
+        if deadline is None:
+            deadline = self.RECONNECT_DEADLINE
 
-            return itr, ctrl
+        self.set_connection_state("reconnecting")
 
-        self.state["state"] = "reconnecting"
-
-        itr = None
-        ctrl = None
         if type(reconnect_address) == list:
-            for address in reconnect_address:
-                test_itr, test_ctrl = recreate_sockets()
-                try:
-                    # Setting up HID interrupt/control sockets
-                    test_ctrl.connect((address, 17))
-                    test_itr.connect((address, 19))
-
-                    itr = test_itr
-                    ctrl = test_ctrl
-                except OSError:
-                    test_itr.close()
-                    test_ctrl.close()
-                    pass
+            affine = self.affinity.get(self.bt.address)
+            first = [a for a in reconnect_address if affine and a.upper() == affine]
+            rest = [a for a in reconnect_address if a not in first]
+            rounds = [(first, timeout), (rest, deadline)]
         elif type(reconnect_address) == str:
-            test_itr, test_ctrl = recreate_sockets()
-
-            # Setting up HID interrupt/control sockets
-            test_ctrl.connect((reconnect_address, 17))
-            test_itr.connect((reconnect_address, 19))
+            rounds = [([reconnect_address], timeout)]
+        else:
+            rounds = []
 
-            itr = test_itr
-            ctrl = test_ctrl
+        itr = None
+        ctrl = None
+        for addresses, round_timeout in rounds:
+            if not addresses:
+                continue
+            try:
+                itr, ctrl = self.connect_candidates(addresses, round_timeout)
+                break
+            except OSError as e:
+                self.logger.debug(e)
 
         if not itr and not ctrl:
             raise OSError("Unable to reconnect to sockets at the given address(es)",
@@ -507,5 +1087,109 @@ class ControllerServer():
 
         return itr, ctrl
 
+    def connect_candidates(self, addresses, timeout):
+        """Starts non-blocking connections to every given address at
+        once. The first address whose control and interrupt channels
+        both connect is used and all other connections are closed.
+        The outcome and latency of each address are recorded under
+        "reconnect_attempts" in the controller's state.
+
+        :param addresses: A list of Switch Bluetooth MAC addresses
+        :type addresses: list
+        :param timeout: The overall time (in seconds) to wait
+        :type timeout: float
+        :raises OSError: If no address connects before the timeout
+        :return: The connected interrupt and control sockets
+        :rtype: tuple
+        """
+
+        def start_connection(address, psm):
+            sock = socket.socket(
+                family=socket.AF_BLUETOOTH,
+                type=socket.SOCK_SEQPACKET,
+                proto=socket.BTPROTO_L2CAP)
+            sock.setblocking(False)
+            err = sock.connect_ex((address, psm))
+            if err not in (0, errno.EINPROGRESS, errno.EAGAIN):
+                sock.close()
+                raise OSError(err, os.strerror(err))
+            return sock
+
+        start = time.perf_counter()
+        end = start + timeout
+
+        # Address -> control/interrupt sockets
+        connections = {}
+        # Socket -> address, for connections in progress
+        pending = {}
+        results = {address: {"connected": False, "latency": None}
+                   for address in addresses}
+
+        def fail(address, reason):
+            self.logger.debug(f"Unable to reconnect to {address}: {reason}")
+            results[address]["latency"] = time.perf_counter() - start
+            for sock in connections.pop(address, {}).values():
+                pending.pop(sock, None)
+                sock.close()
+
+        # The control channel needs to be connected first
+        for address in addresses:
+            try:
+                ctrl = start_connection(address, 17)
+            except OSError as e:
+                fail(address, e)
+                continue
+            connections[address] = {"ctrl": ctrl}
+            pending[ctrl] = address
+
+        winner = None
+        try:
+            while pending and winner is None:
+                remaining = end - time.perf_counter()
+                if remaining <= 0:
+                    break
+
+                _, writable, _ = select.select([], list(pending), [], remaining)
+                for sock in writable:
+                    address = pending.pop(sock)
+                    err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if err != 0:
+                        fail(address, os.strerror(err))
+                        continue
+
+                    if "itr" not in connections[address]:
+                        try:
+                            itr = start_connection(address, 19)
+                        except OSError as e:
+                            fail(address, e)
+                            continue
+                        connections[address]["itr"] = itr
+                        pending[itr] = address
+                    else:
+                        results[address]["connected"] = True
+                        results[address]["latency"] = time.perf_counter() - start
+                        winner = address
+                        break
+        finally:
+            for address in list(connections.keys()):
+                if address != winner:
+                    for sock in connections.pop(address).values():
+                        sock.close()
+
+            self.state["reconnect_attempts"] = results
+            for address, result in results.items():
+                self.logger.debug(f"Reconnect to {address}: {result}")
+
+        if winner is None:
+            raise OSError("Unable to reconnect to any of the given address(es)",
+                          addresses)
+
+        itr = connections[winner]["itr"]
+        ctrl = connections[winner]["ctrl"]
+        itr.setblocking(True)
+        ctrl.setblocking(True)
+
+        return itr, ctrl
+
     def _on_exit(self):
         self.bt.reset_address()
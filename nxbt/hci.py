@@ -0,0 +1,230 @@
+import socket
+import struct
+import fcntl
+import errno
+import time
+import logging
+
+
+# HCI packet types
+HCI_COMMAND_PKT = 0x01
+HCI_EVENT_PKT = 0x04
+
+# HCI events
+EVT_CMD_COMPLETE = 0x0E
+EVT_CMD_STATUS = 0x0F
+
+# Opcode groups/commands
+OGF_HOST_CTL = 0x03
+OCF_READ_CLASS_OF_DEV = 0x0023
+OCF_WRITE_CLASS_OF_DEV = 0x0024
+OGF_VENDOR_CMD = 0x3F
+OCF_WRITE_BD_ADDR = 0x001
+
+# Device ioctls: _IOW('H', 201/202, int)
+HCIDEVUP = 0x400448C9
+HCIDEVDOWN = 0x400448CA
+
+
+class HCICommandError(OSError):
+    """Raised when a device replies to an HCI command with a
+    non-zero status.
+    """
+
+    def __init__(self, message, status):
+
+        super().__init__(message)
+        self.status = status
+
+
+def device_id_from_path(adapter_path):
+    """Gets the HCI device number from a BlueZ adapter path
+    or device ID (Eg: "/org/bluez/hci0" or "hci0" returns 0).
+
+    :param adapter_path: A BlueZ adapter path or device ID
+    :type adapter_path: str
+    :return: The HCI device number
+    :rtype: int
+    """
+
+    return int(adapter_path.split("/")[-1].replace("hci", ""))
+
+
+def open_hci_socket(dev_id):
+    """Opens a raw HCI socket bound to a device that receives
+    command complete/status events.
+
+    :param dev_id: The HCI device number
+    :type dev_id: int
+    :return: The HCI socket
+    :rtype: socket.socket
+    """
+
+    sock = socket.socket(
+        family=socket.AF_BLUETOOTH,
+        type=socket.SOCK_RAW,
+        proto=socket.BTPROTO_HCI)
+    try:
+        sock.bind((dev_id,))
+
+        # struct hci_ufilter: type mask, event mask and opcode
+        event_mask = (1 << EVT_CMD_COMPLETE) | (1 << EVT_CMD_STATUS)
+        hci_filter = struct.pack(
+            "<IIIH2x", 1 << HCI_EVENT_PKT, event_mask, 0, 0)
+        sock.setsockopt(socket.SOL_HCI, socket.HCI_FILTER, hci_filter)
+    except OSError:
+        sock.close()
+        raise
+
+    return sock
+
+
+def send_command(dev_id, ogf, ocf, params=b"", timeout=2.0):
+    """Sends an HCI command to a device and waits for its
+    command complete (or command status) event.
+
+    :param dev_id: The HCI device number
+    :type dev_id: int
+    :param ogf: The opcode group field
+    :type ogf: int
+    :param ocf: The opcode command field
+    :type ocf: int
+    :param params: The command parameters, defaults to b""
+    :type params: bytes, optional
+    :param timeout: How long to wait for a reply in seconds,
+    defaults to 2.0
+    :type timeout: float, optional
+    :raises TimeoutError: If the device doesn't reply in time
+    :raises HCICommandError: If the command fails
+    :raises OSError: If the device can't be opened
+    :return: The return parameters of the command (excluding status)
+    :rtype: bytes
+    """
+
+    opcode = (ogf << 10) | ocf
+    packet = struct.pack("<BHB", HCI_COMMAND_PKT, opcode, len(params)) + params
+
+    sock = open_hci_socket(dev_id)
+    try:
+        deadline = time.monotonic() + timeout
+        sock.send(packet)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"HCI command 0x{opcode:04X} timed out on hci{dev_id}")
+            sock.settimeout(remaining)
+            try:
+                reply = sock.recv(260)
+            except socket.timeout:
+                continue
+
+            if len(reply) < 3 or reply[0] != HCI_EVENT_PKT:
+                continue
+
+            event = reply[1]
+            data = reply[3:]
+            if event == EVT_CMD_COMPLETE and len(data) >= 4:
+                if struct.unpack("<H", data[1:3])[0] != opcode:
+                    continue
+                status = data[3]
+                result = data[4:]
+            elif event == EVT_CMD_STATUS and len(data) >= 4:
+                if struct.unpack("<H", data[2:4])[0] != opcode:
+                    continue
+                status = data[0]
+                result = b""
+            else:
+                continue
+
+            if status != 0:
+                raise HCICommandError(
+                    f"HCI command 0x{opcode:04X} failed on hci{dev_id} "
+                    f"with status 0x{status:02X}", status)
+            return result
+    finally:
+        sock.close()
+
+
+def write_bd_address(dev_id, mac):
+    """Writes a new Bluetooth MAC address to a device with the vendor
+    Write_BD_ADDR command. The device must be reset for the new
+    address to apply.
+
+    Not every adapter supports the command. As with "hcitool cmd",
+    a rejected or unanswered command is logged and otherwise
+    ignored, leaving the adapter's address unchanged.
+
+    :param dev_id: The HCI device number
+    :type dev_id: int
+    :param mac: A Bluetooth MAC address in the form of "XX:XX:XX:XX:XX:XX"
+    :type mac: str
+    :raises OSError: If the device can't be opened
+    :return: Whether the device accepted the address
+    :rtype: bool
+    """
+
+    # Addresses are sent in little endian order
+    address = bytes(int(b, 16) for b in reversed(mac.split(":")))
+    try:
+        send_command(dev_id, OGF_VENDOR_CMD, OCF_WRITE_BD_ADDR, address)
+    except (HCICommandError, TimeoutError) as e:
+        logging.getLogger('nxbt').warning(
+            f"Unable to set the address of hci{dev_id}: {e}")
+        return False
+
+    return True
+
+
+def write_class_of_device(dev_id, device_class):
+    """Writes the class of device.
+
+    :param dev_id: The HCI device number
+    :type dev_id: int
+    :param device_class: The class as a hexadecimal string (Eg: "0x002508")
+    or an int
+    :type device_class: str or int
+    """
+
+    if isinstance(device_class, str):
+        device_class = int(device_class, 16)
+    params = struct.pack("<I", device_class)[:3]
+    send_command(dev_id, OGF_HOST_CTL, OCF_WRITE_CLASS_OF_DEV, params)
+
+
+def read_class_of_device(dev_id):
+    """Reads the class of device.
+
+    :param dev_id: The HCI device number
+    :type dev_id: int
+    :return: The class as a hexadecimal string (Eg: "0x002508")
+    :rtype: str
+    """
+
+    result = send_command(dev_id, OGF_HOST_CTL, OCF_READ_CLASS_OF_DEV)
+    device_class = struct.unpack("<I", result[:3] + b"\x00")[0]
+
+    return f"0x{device_class:06x}"
+
+
+def reset_device(dev_id):
+    """Resets a device by bringing it down and back up
+    (the equivalent of "hciconfig hciX reset").
+
+    :param dev_id: The HCI device number
+    :type dev_id: int
+    """
+
+    sock = socket.socket(
+        family=socket.AF_BLUETOOTH,
+        type=socket.SOCK_RAW,
+        proto=socket.BTPROTO_HCI)
+    try:
+        fcntl.ioctl(sock.fileno(), HCIDEVDOWN, dev_id)
+        try:
+            fcntl.ioctl(sock.fileno(), HCIDEVUP, dev_id)
+        except OSError as e:
+            if e.errno != errno.EALREADY:
+                raise
+    finally:
+        sock.close()
@@ -0,0 +1,43 @@
+import sys
+from importlib import import_module
+
+
+def lazy_attributes(package, attributes):
+    """Creates the module level __getattr__ and __dir__ functions
+    (PEP 562) for a package whose public attributes are imported
+    from its submodules on first access.
+
+    :param package: The __name__ of the package
+    :type package: str
+    :param attributes: Maps each attribute name to the relative
+    name of the submodule that defines it
+    :type attributes: dict
+    :return: The package's __getattr__ and __dir__ functions
+    :rtype: tuple
+    """
+
+    def __getattr__(name):
+        """Imports the submodule defining a public attribute on first
+        access and caches the attribute on the package.
+
+        :param name: The name of the attribute being accessed
+        :type name: str
+        :raises AttributeError: If the attribute isn't part of the package
+        :return: The requested attribute
+        :rtype: any
+        """
+
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        module = import_module(attributes[name], package)
+        value = getattr(module, name)
+        setattr(sys.modules[package], name, value)
+
+        return value
+
+    def __dir__():
+
+        return sorted(set(vars(sys.modules[package]).keys()) | set(attributes.keys()))
+
+    return __getattr__, __dir__
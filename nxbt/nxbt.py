@@ -1,4 +1,4 @@
-from multiprocessing import Process, Lock, Queue, Manager
+from multiprocessing import Process, Lock, Queue, Manager, Pipe
 import queue
 from enum import Enum
 import atexit
@@ -7,15 +7,20 @@ import os
 import sys
 import time
 import json
-
-import dbus
+import struct
 
 from .controller import ControllerServer
 from .controller import ControllerTypes
-from .bluez import BlueZ, find_objects, toggle_clean_bluez
+from .controller import Controller
+from .controller.input import InputParser, MAIN_TRACK, MACRO_FRAME_FORMAT
+from .bluez import BlueZ, toggle_clean_bluez
 from .bluez import replace_mac_addresses
 from .bluez import find_devices_by_alias
-from .bluez import SERVICE_NAME, ADAPTER_INTERFACE
+from .bluez import BlueZObjectIndex, ADAPTER_INTERFACE
+from .adapters import AdapterPool
+from .status import StatusTable, ControllerStatus, StatusSubscriber
+from .slots import SlotAllocator
+from .channels import CommandChannels
 from .logging import create_logger
 
 
@@ -74,6 +79,25 @@ DIRECT_INPUT_PACKET = {
 }
 
 
+def process_running(pid):
+    """Checks if a process is running. Processes that have exited,
+    but haven't been reaped by their parent yet, aren't.
+
+    :param pid: The process ID
+    :type pid: int
+    :rtype: bool
+    """
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return False
+
+    # The process state follows its parenthesized name
+    return stat.rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+
+
 class Buttons():
     """The button object containing the button string constants.
     """
@@ -132,12 +156,29 @@ class Nxbt():
     are passed into a queue which is consumed and acted upon by the
     _command_manager.
 
-    All function calls that interact or control the emulated controllers
-    are simply message constructors that submit to the central task_queue.
-    This allows for thread-safe control of emulated controllers.
+    Controller lifecycle calls are message constructors that submit to
+    the central task_queue. Macro calls are written straight to each
+    controller's command channel, without a hop through the
+    _command_manager. Both allow for thread-safe control of emulated
+    controllers. Calls that write to a command channel raise
+    BrokenPipeError if the channel is full and its controller has
+    crashed or been removed, rather than waiting forever.
     """
 
-    def __init__(self, debug=False, log_to_file=False, disable_logging=False):
+    # The most lifecycle messages waiting for the command manager
+    # before callers block
+    TASK_QUEUE_SIZE = 64
+
+    # Reports per second sent by a controller with changing input
+    INPUT_TICK_RATE = 132
+    # Seconds between scheduling tick-indexed input and its first tick
+    SCHEDULE_LEAD_TIME = 0.05
+    # Seconds a created controller has to set up its adapter
+    CREATE_TIMEOUT = 30
+
+    def __init__(self, debug=False, log_to_file=False, disable_logging=False,
+                 supervise_controllers=False, warm_controllers=0,
+                 macro_queue_limit=None, macro_queue_policy="block"):
         """Initializes the necessary multiprocessing resources and starts
         the multiprocessing processes.
 
@@ -149,14 +190,40 @@ class Nxbt():
         :type log_to_file: bool, optional
         :param disable_logging: Routes all logging calls to a null log handler.
         :type disable_logging: bool, optional, defaults to False.
+        :param supervise_controllers: Restarts crashed controllers on
+        their adapter with exponential backoff, defaults to False
+        :type supervise_controllers: bool, optional
+        :param warm_controllers: The number of controller processes to
+        keep prepared on each adapter, ahead of create_controller
+        calls. An adapter only fits one controller, so at most one is
+        kept, defaults to 0
+        :type warm_controllers: int, optional
+        :param macro_queue_limit: The most macros queued on each
+        controller, defaults to None (no limit)
+        :type macro_queue_limit: int, optional
+        :param macro_queue_policy: What happens to a macro submitted
+        while its controller's queue is full. "block" blocks the
+        submitting call until there's space, "reject" finishes the
+        new macro without inputting it and "drop_oldest" finishes
+        the oldest queued macro without inputting it, defaults
+        to "block"
+        :type macro_queue_policy: str, optional
+        :raises ValueError: On an unknown macro_queue_policy
         """
 
+        if macro_queue_policy not in InputParser.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown macro queue policy: {macro_queue_policy}")
+
         self.debug = debug
+        self.supervise_controllers = supervise_controllers
+        self.warm_controllers = warm_controllers
+        self.macro_queue_limit = macro_queue_limit
+        self.macro_queue_policy = macro_queue_policy
         self.logger = create_logger(
             debug=self.debug, log_to_file=log_to_file, disable_logging=disable_logging)
 
         # Main queue for nbxt tasks
-        self.task_queue = Queue()
+        self.task_queue = Queue(maxsize=self.TASK_QUEUE_SIZE)
 
         # Sychronizes bluetooth actions
         self._bluetooth_lock = Lock()
@@ -168,13 +235,25 @@ class Nxbt():
         # the main nxbt multiprocessing process.
         self.manager_state = self.resource_manager.dict()
         self.manager_state_lock = Lock()
+        # Each live controller's slot in the shared structures below
+        self._slots = SlotAllocator()
+        # Shared memory controller statuses, readable without
+        # going through the Manager process.
+        self._status = StatusTable(slots=self._slots)
+        self._status_subscriber = StatusSubscriber(self._status)
+        # Per-controller pipes for macro commands
+        self._channels = CommandChannels(
+            slots=self._slots, alive=self._controller_running)
+        # Compiles macros before they're sent to the controllers
+        self._macro_compiler = InputParser(None)
 
         # Shared, controller management properties.
         # The controller lock is used to sychronize use.
         self._controller_lock = Lock()
         self._controller_counter = 0
-        self._adapters_in_use = {}
-        self._controller_adapter_lookup = {}
+        # Created on first use so that the BlueZ object index
+        # isn't started before the worker processes are forked.
+        self._adapter_pool = None
 
         # Disable the BlueZ input plugin so we can use the
         # HID control/interrupt Bluetooth ports
@@ -224,7 +303,12 @@ class Nxbt():
         :type state: multiprocessing.Manager().dict
         """
 
-        cm = _ControllerManager(state, self._bluetooth_lock)
+        cm = _ControllerManager(state, self._bluetooth_lock, self._status,
+                                channels=self._channels,
+                                supervised=self.supervise_controllers,
+                                warm_pool_size=self.warm_controllers,
+                                macro_queue_limit=self.macro_queue_limit,
+                                macro_queue_policy=self.macro_queue_policy)
         # Ensure a SystemExit exception is raised on SIGTERM
         # so that we can gracefully shutdown.
         signal.signal(signal.SIGTERM, lambda sigterm_handler: sys.exit(0))
@@ -232,10 +316,12 @@ class Nxbt():
         try:
             while True:
                 try:
-                    msg = task_queue.get(timeout=5)
+                    msg = task_queue.get(timeout=1)
                 except queue.Empty:
                     msg = None
 
+                cm.supervise()
+
                 if msg:
                     if msg["command"] == NxbtCommands.CREATE_CONTROLLER:
                         cm.create_controller(
@@ -244,32 +330,20 @@ class Nxbt():
                             msg["arguments"]["adapter_path"],
                             msg["arguments"]["colour_body"],
                             msg["arguments"]["colour_buttons"],
-                            msg["arguments"]["reconnect_address"])
-                    elif msg["command"] == NxbtCommands.INPUT_MACRO:
-                        cm.input_macro(
-                            msg["arguments"]["controller_index"],
-                            msg["arguments"]["macro"],
-                            msg["arguments"]["macro_id"])
-                    elif msg["command"] == NxbtCommands.STOP_MACRO:
-                        cm.stop_macro(
-                            msg["arguments"]["controller_index"],
-                            msg["arguments"]["macro_id"])
-                    elif msg["command"] == NxbtCommands.CLEAR_MACROS:
-                        cm.clear_macros(
-                            msg["arguments"]["controller_index"])
+                            msg["arguments"]["reconnect_address"],
+                            msg["arguments"]["reconnect_policy"])
                     elif msg["command"] == NxbtCommands.REMOVE_CONTROLLER:
-                        index = msg["arguments"]["controller_index"]
-                        cm.clear_macros(index)
-                        cm.remove_controller(index)
+                        cm.remove_controller(
+                            msg["arguments"]["controller_index"])
 
         finally:
             cm.shutdown()
             sys.exit(0)
 
-    def macro(self, controller_index, macro, block=True):
+    def macro(self, controller_index, macro, block=True, track=MAIN_TRACK):
         """Used to input a given macro on a specified controller.
-        This is done by creating and passing an INPUT_MACRO
-        message into the task queue with the given macro.
+        This is done by compiling the macro and writing it as a
+        macro command to the controller's command channel.
 
         If block is set to True, this function waits until the
         macro_id (generated on the submission of the macro)
@@ -284,38 +358,211 @@ class Nxbt():
         :param block: A boolean variable indicating whether or not
         to block until the macro completes, defaults to True
         :type block: bool, optional
+        :param track: The macro track to input the macro on (see
+        add_macro_track), defaults to "main"
+        :type track: str, optional
         :raises ValueError: If the controller_index does not exist
+        or the macro can't be compiled
         :return: The generated ID of the passed macro. This ID
         will show up under the "finished_macros" list communicated
         in the controllers shared state.
         :rtype: str
         """
 
-        if controller_index not in self.manager_state.keys():
-            raise ValueError("Specified controller does not exist")
+        return self.macro_many(controller_index, [macro], block=block, track=track)[0]
 
-        # Get a unique ID to identify the macro
-        # so we can check when the controller is done inputting it
-        macro_id = os.urandom(24).hex()
-        self.task_queue.put({
-            "command": NxbtCommands.INPUT_MACRO,
-            "arguments": {
-                "controller_index": controller_index,
-                "macro": macro,
-                "macro_id": macro_id,
-            }
-        })
+    def macro_many(self, controller_index, macros, block=True, track=MAIN_TRACK):
+        """Used to input several macros on a specified controller.
+        The macros are sent in a single write to the controller's
+        command channel and are input in the order given.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param macros: The macros to input
+        :type macros: list
+        :param block: A boolean variable indicating whether or not
+        to block until all macros complete, defaults to True
+        :type block: bool, optional
+        :param track: The macro track to input the macros on (see
+        add_macro_track), defaults to "main"
+        :type track: str, optional
+        :raises ValueError: If the controller_index does not exist
+        or a macro can't be compiled
+        :return: The generated IDs of the passed macros, in order
+        :rtype: list
+        """
+
+        macro_ids = self.submit(
+            [{"controller_index": controller_index, "type": "macro",
+              "macro": macro, "track": track}
+             for macro in macros])
 
         if block:
-            while True:
-                finished = (self.manager_state
-                            [controller_index]["finished_macros"])
-                if macro_id in finished:
-                    break
+            self._wait_for_macros(controller_index, macro_ids)
+
+        return macro_ids
+
+    def submit(self, operations):
+        """Submits a batch of macro operations across one or more
+        controllers. The operations for each controller are sent in
+        a single write to its command channel, in the order given.
+
+        Each operation is a dict with a "controller_index" and a
+        "type" of:
+
+        - "macro", with the "macro" to input and, optionally, the
+          "track" to input it on and the time.monotonic() time to
+          "start_at" once it reaches the front of its track
+        - "stop", with the "macro_id" of a macro to stop
+        - "clear", to clear all running and queued macros or only
+          those of an optional "track"
+
+        This function doesn't block.
+
+        :param operations: The operations
+        :type operations: list
+        :raises ValueError: If a controller_index does not exist,
+        an operation's type is unknown or a macro can't be compiled.
+        Nothing is sent in this case.
+        :return: The generated macro ID of each "macro" operation and
+        None for the other operations, in order
+        :rtype: list
+        """
 
-                time.sleep(1/120)  # Wait one Pro Controller cycle
+        controllers = self.manager_state.keys()
+
+        macro_ids = []
+        batches = {}
+        for operation in operations:
+            controller_index = operation["controller_index"]
+            if controller_index not in controllers:
+                raise ValueError("Specified controller does not exist")
+
+            macro_id = None
+            if operation["type"] == "macro":
+                # Get a unique ID to identify the macro
+                # so we can check when the controller is done inputting it
+                macro_id = os.urandom(24).hex()
+                msg = {
+                    "type": "macro",
+                    "macro": self._macro_compiler.compile_macro(operation["macro"]),
+                    "macro_id": macro_id,
+                    "track": operation.get("track", MAIN_TRACK),
+                    "start_at": operation.get("start_at"),
+                }
+            elif operation["type"] == "stop":
+                msg = {"type": "stop", "macro_id": operation["macro_id"]}
+            elif operation["type"] == "clear":
+                msg = {"type": "clear", "track": operation.get("track")}
+            else:
+                raise ValueError(f"Unknown operation type: {operation['type']}")
+
+            batches.setdefault(controller_index, []).append(msg)
+            macro_ids.append(macro_id)
+
+        for controller_index, msgs in batches.items():
+            self._channels.send_many(controller_index, msgs)
+
+        return macro_ids
+
+    def macro_sync(self, macros, lead_time=0.1, block=True, track=MAIN_TRACK):
+        """Inputs macros on several controllers, starting them all at
+        the same time. Every macro is scheduled to start at a shared
+        time.monotonic() deadline, lead_time seconds from now, so
+        that the time taken to deliver it to each controller doesn't
+        skew the start. A macro queued behind other macros on its
+        track starts once it reaches the front of the track, if that's
+        later than the deadline.
+
+        :param macros: The macro to input on each controller, keyed
+        by controller index
+        :type macros: dict
+        :param lead_time: Seconds until the deadline. This should
+        leave enough time to deliver every macro, defaults to 0.1
+        :type lead_time: float, optional
+        :param block: A boolean variable indicating whether or not
+        to block until all macros complete, defaults to True
+        :type block: bool, optional
+        :param track: The macro track to input the macros on,
+        defaults to "main"
+        :type track: str, optional
+        :raises ValueError: If a controller_index does not exist
+        or a macro can't be compiled
+        :return: A dict with the "start_at" deadline, the "macro_ids"
+        keyed by controller index and, if blocking, the start "skew"
+        of each controller (see macro_start_skew)
+        :rtype: dict
+        """
 
-        return macro_id
+        start_at = time.monotonic() + lead_time
+        indexes = list(macros.keys())
+        macro_ids = self.submit(
+            [{"controller_index": index, "type": "macro", "macro": macros[index],
+              "track": track, "start_at": start_at}
+             for index in indexes])
+
+        sync = {
+            "start_at": start_at,
+            "macro_ids": dict(zip(indexes, macro_ids)),
+        }
+
+        if block:
+            for index, macro_id in sync["macro_ids"].items():
+                self._wait_for_macros(index, [macro_id])
+            sync["skew"] = self.macro_start_skew(sync)
+
+        return sync
+
+    def macro_start_skew(self, sync):
+        """Measures how far from their deadline the macros of a
+        macro_sync call started on each controller.
+
+        :param sync: The dict returned by macro_sync
+        :type sync: dict
+        :return: The seconds each controller started its macro after
+        the deadline, keyed by controller index. None if the macro
+        hasn't started (or the controller has been removed).
+        :rtype: dict
+        """
+
+        skew = {}
+        for index, macro_id in sync["macro_ids"].items():
+            try:
+                started_at = self.manager_state[index]["macro_starts"].get(macro_id)
+            except KeyError:
+                started_at = None
+            skew[index] = None if started_at is None else started_at - sync["start_at"]
+
+        return skew
+
+    def _controller_running(self, controller_index):
+
+        try:
+            state = self.manager_state[controller_index]
+            pid = state["pid"]
+            restarts = state["restarts"]
+        except KeyError:
+            return False
+
+        # Not started yet
+        if pid is None:
+            return True
+        if process_running(pid):
+            return True
+
+        # Supervised controllers come back until they run out of restarts
+        return (self.supervise_controllers and
+                restarts < _ControllerManager.MAX_RESTARTS)
+
+    def _wait_for_macros(self, controller_index, macro_ids):
+
+        while True:
+            finished = (self.manager_state
+                        [controller_index]["finished_macros"])
+            if all(macro_id in finished for macro_id in macro_ids):
+                break
+
+            time.sleep(1/120)  # Wait one Pro Controller cycle
 
     def press_buttons(self, controller_index, buttons, down=0.1, up=0.1, block=True):
         """Used to press a given set of buttons on the controller for a
@@ -417,24 +664,16 @@ class Nxbt():
         if controller_index not in self.manager_state.keys():
             raise ValueError("Specified controller does not exist")
 
-        self.task_queue.put({
-            "command": NxbtCommands.STOP_MACRO,
-            "arguments": {
-                "controller_index": controller_index,
-                "macro_id": macro_id,
-            }
-        })
+        self.submit([{
+            "controller_index": controller_index,
+            "type": "stop",
+            "macro_id": macro_id,
+        }])
 
         if block:
-            while True:
-                finished = (self.manager_state
-                            [controller_index]["finished_macros"])
-                if macro_id in finished:
-                    break
-
-                time.sleep(1/120)
+            self._wait_for_macros(controller_index, [macro_id])
 
-    def clear_macros(self, controller_index):
+    def clear_macros(self, controller_index, track=None):
         """Clears all running and queued macros on a specified
         controller.
 
@@ -443,17 +682,82 @@ class Nxbt():
 
         :param controller_index: The index of a given controller
         :type controller_index: int
+        :param track: Only clear the macros of this macro track,
+        defaults to None (all tracks)
+        :type track: str, optional
         :raises ValueError: If the controller_index does not exist
         """
 
         if controller_index not in self.manager_state.keys():
             raise ValueError("Specified controller does not exist")
 
-        self.task_queue.put({
-            "command": NxbtCommands.CLEAR_MACROS,
-            "arguments": {
-                "controller_index": controller_index,
-            }
+        self.submit([{
+            "controller_index": controller_index,
+            "type": "clear",
+            "track": track,
+        }])
+
+    def add_macro_track(self, controller_index, name, owns=None, priority=0):
+        """Adds a macro track to a controller, or updates an existing
+        one. Each track inputs its own macros, one after another, at
+        the same time as the controller's other tracks. For example, a
+        stick can be held on one track while buttons are tapped on
+        another.
+
+        Every tick, the current input of each track is merged. Buttons
+        are combined and each stick is taken from the highest priority
+        track tilting it. A track only sets the inputs it owns.
+
+        Macros are input on the "main" track, which owns every input,
+        unless another track is given. Tracks that haven't been added
+        are added when a macro is input on them, owning every input.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param name: The track's name
+        :type name: str
+        :param owns: The button names (as used in macros), "L_STICK"
+        and "R_STICK" the track sets, defaults to None (every input)
+        :type owns: list, optional
+        :param priority: The track's stick priority, defaults to 0.
+        Tracks with equal priorities are merged in the order added.
+        :type priority: int, optional
+        :raises ValueError: If the controller_index does not exist
+        or an owned input is unknown
+        """
+
+        if controller_index not in self.manager_state.keys():
+            raise ValueError("Specified controller does not exist")
+
+        masks = (0xFF, 0xFF, 0xFF, 0xFF)
+        if owns is not None:
+            masks = self._macro_compiler.track_masks(owns)
+
+        self._channels.send(controller_index, {
+            "type": "track",
+            "name": name,
+            "owns": masks,
+            "priority": priority,
+        })
+
+    def remove_macro_track(self, controller_index, name):
+        """Removes a macro track from a controller. The track's running
+        and queued macros are stopped and show up as finished macros.
+        The main track can't be removed, but its macros are stopped.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param name: The track's name
+        :type name: str
+        :raises ValueError: If the controller_index does not exist
+        """
+
+        if controller_index not in self.manager_state.keys():
+            raise ValueError("Specified controller does not exist")
+
+        self._channels.send(controller_index, {
+            "type": "remove_track",
+            "name": name,
         })
 
     def clear_all_macros(self):
@@ -464,7 +768,8 @@ class Nxbt():
         for controller in self.manager_state.keys():
             self.clear_macros(controller)
 
-    def set_controller_input(self, controller_index, input_packet):
+    def set_controller_input(self, controller_index, input_packet,
+                             hold=False, ttl=None):
         """Sets the controllers buttons and analog sticks for 1 cycle.
         This means that exactly 1 packet will be sent to the Switch with
         input specified with this method. To keep a continuous input
@@ -472,18 +777,115 @@ class Nxbt():
         roughly matches the set controller. Eg: An emulated Pro Controller's
         input must be set at roughly 120Hz and a Joy-Con's at 60Hz.
 
+        With hold, the input is instead held until it's replaced by
+        another call, so packets only need to be set when the desired
+        input changes. A packet without buttons and with centered
+        sticks releases the held input.
+
         :param controller_index: The index of the emulated controller
         :type controller_index: int
         :param input_packet: The input packet with the desired input. This
         *must* be an instance of the create_input_packet method.
         :type input_packet: dict
+        :param hold: Whether to hold the input until it's replaced,
+        defaults to False
+        :type hold: bool, optional
+        :param ttl: Seconds after which held input is released if it
+        hasn't been replaced, defaults to None (held until replaced).
+        This guards against a client that stops sending input while
+        a button is held.
+        :type ttl: float, optional
         :raises ValueError: On bad controller index
         """
 
         if controller_index not in self.manager_state.keys():
             raise ValueError("Specified controller does not exist")
 
-        self.manager_state[controller_index]["direct_input"] = input_packet
+        self._channels.send(controller_index, {
+            "type": "input",
+            "frame": self._compile_input_packet(input_packet),
+            "hold": hold,
+            "ttl": ttl if hold else None,
+        })
+
+    def schedule_input(self, controller_index, inputs, start_at=None,
+                       in_ticks=True, replace=False):
+        """Schedules direct input to be set on exact report ticks, for
+        frame-accurate playback. Each input is held from its time until
+        the next one (see set_controller_input with hold), and inputs
+        without buttons and with centered sticks release the held
+        input. The controller wakes at each input's time, rather than
+        on its next regular tick.
+
+        If the controller falls behind, only the latest of the inputs
+        that are due is set.
+
+        :param controller_index: The index of the emulated controller
+        :type controller_index: int
+        :param inputs: (time, input packet) pairs, in any order. Input
+        packets *must* be instances of the create_input_packet method.
+        :type inputs: list
+        :param start_at: The time.monotonic() time of tick 0, defaults
+        to None (SCHEDULE_LEAD_TIME seconds from now). Only used
+        with in_ticks.
+        :type start_at: float, optional
+        :param in_ticks: Whether each time is a tick offset from
+        start_at (ticks are 1/INPUT_TICK_RATE seconds long) or a
+        time.monotonic() time, defaults to True
+        :type in_ticks: bool, optional
+        :param replace: Whether to drop the inputs already scheduled
+        on the controller, defaults to False
+        :type replace: bool, optional
+        :raises ValueError: On bad controller index
+        :return: The time.monotonic() time of tick 0, or None if
+        in_ticks is False
+        :rtype: float or None
+        """
+
+        if controller_index not in self.manager_state.keys():
+            raise ValueError("Specified controller does not exist")
+
+        if in_ticks:
+            if start_at is None:
+                start_at = time.monotonic() + self.SCHEDULE_LEAD_TIME
+            scheduled = [(start_at + tick / self.INPUT_TICK_RATE, packet)
+                         for tick, packet in inputs]
+        else:
+            start_at = None
+            scheduled = inputs
+
+        self._channels.send(controller_index, {
+            "type": "schedule_input",
+            "inputs": [(at, self._compile_input_packet(packet))
+                       for at, packet in scheduled],
+            "replace": replace,
+        })
+
+        return start_at
+
+    def clear_scheduled_input(self, controller_index):
+        """Drops the direct input scheduled on a controller that
+        hasn't been set yet. Input that's already held stays held.
+
+        :param controller_index: The index of the emulated controller
+        :type controller_index: int
+        :raises ValueError: On bad controller index
+        """
+
+        if controller_index not in self.manager_state.keys():
+            raise ValueError("Specified controller does not exist")
+
+        self._channels.send(controller_index, {
+            "type": "schedule_input",
+            "inputs": [],
+            "replace": True,
+        })
+
+    def _compile_input_packet(self, input_packet):
+
+        return struct.pack(
+            MACRO_FRAME_FORMAT,
+            *self._macro_compiler.compile_controller_input(input_packet))
 
     def create_input_packet(self):
         """Creates an input packet that is used to specify the input
@@ -499,7 +901,7 @@ class Nxbt():
 
     def create_controller(self, controller_type, adapter_path=None,
                           colour_body=None, colour_buttons=None,
-                          reconnect_address=None):
+                          reconnect_address=None, reconnect_policy=None):
         """Used to create a Nintendo Switch controller of a
         given type and colour on an (optionally) specified
         bluetooth adapter.
@@ -529,30 +931,35 @@ class Nxbt():
         :param reconnect_address: A previously connected to
         Switch's Bluetooth MAC address, defaults to None
         :type reconnect_address: str or list, optional
+        :param reconnect_policy: Overrides for how a lost connection
+        is recovered (see ControllerServer.RECONNECT_POLICY), with
+        the keys "backoff_base", "backoff_max", "jitter", "budget"
+        and "max_attempts", defaults to None
+        :type reconnect_policy: dict, optional
         :raises ValueError: If specified adapter is unavailable
         :raises ValueError: If specified adapter is in use
+        :raises ValueError: If no adapters are available
+        :raises ValueError: If the most controllers are already running
+        :raises TimeoutError: If the controller doesn't set up its
+        adapter within CREATE_TIMEOUT seconds. The controller is removed.
         :return: The index of the created controller
         :rtype: int
         """
-        if adapter_path:
-            if adapter_path not in self.get_available_adapters():
-                raise ValueError("Specified adapter is unavailable")
-
-            if adapter_path in self._adapters_in_use.keys():
-                raise ValueError("Specified adapter in use")
-        else:
-            # Get all adapters we can use
-            usable_adapters = list(
-                set(self.get_available_adapters()) - set(self._adapters_in_use))
-            if len(usable_adapters) > 0:
-                # Use the first available adapter
-                adapter_path = usable_adapters[0]
-            else:
-                raise ValueError("No adapters available")
 
         controller_index = None
+        timed_out = False
         try:
             self._controller_lock.acquire()
+            self._slots.allocate(self._controller_counter)
+            self._update_adapter_pool()
+            # If no adapter is specified, the healthiest free adapter is used
+            try:
+                adapter_path = self.adapter_pool.acquire(
+                    self._controller_counter, adapter_path)
+            except Exception:
+                self._slots.release(self._controller_counter)
+                raise
+
             self.task_queue.put({
                 "command": NxbtCommands.CREATE_CONTROLLER,
                 "arguments": {
@@ -562,29 +969,33 @@ class Nxbt():
                     "colour_body": colour_body,
                     "colour_buttons": colour_buttons,
                     "reconnect_address": reconnect_address,
+                    "reconnect_policy": reconnect_policy,
                 }
             })
             controller_index = self._controller_counter
             self._controller_counter += 1
-            self._adapters_in_use[adapter_path] = controller_index
-            self._controller_adapter_lookup[controller_index] = adapter_path
 
             # Block until the controller is ready
             # This needs to be done to prevent race conditions
             # on Bluetooth resources.
-            if type(controller_index) == int:
-                while True:
-                    if controller_index in self.manager_state.keys():
-                        state = self.manager_state[controller_index]
-                        if (state["state"] == "connecting" or
-                                state["state"] == "reconnecting" or
-                                state["state"] == "crashed"):
-                            break
-
-                    time.sleep(1/30)
+            try:
+                self.wait_for_state(
+                    controller_index,
+                    ["connecting", "reconnecting", "connected", "crashed"],
+                    timeout=self.CREATE_TIMEOUT)
+            except TimeoutError:
+                timed_out = True
         finally:
             self._controller_lock.release()
 
+        if timed_out:
+            # Queued after the create, so the manager removes the
+            # controller even if it hasn't created it yet
+            self._remove_controller(controller_index)
+            raise TimeoutError(
+                f"Controller {controller_index} didn't start within "
+                f"{self.CREATE_TIMEOUT} seconds")
+
         return controller_index
 
     def remove_controller(self, controller_index):
@@ -596,19 +1007,18 @@ class Nxbt():
         """
 
         if controller_index not in self.manager_state.keys():
-            if controller_index in self._controller_adapter_lookup.keys():
-                # Attempt to free any adapters claimed by a crashed controller
-                try:
-                    adapter_path = self._controller_adapter_lookup.pop(controller_index, None)
-                    self._adapters_in_use.pop(adapter_path, None)
-                except Exception:
-                    pass
+            # Attempt to free any adapters claimed by a crashed controller
+            self.adapter_pool.release(controller_index)
             raise ValueError("Specified controller does not exist")
 
+        self._remove_controller(controller_index)
+
+    def _remove_controller(self, controller_index):
+
         self._controller_lock.acquire()
         try:
-            adapter_path = self._controller_adapter_lookup.pop(controller_index, None)
-            self._adapters_in_use.pop(adapter_path, None)
+            self._update_adapter_pool()
+            self.adapter_pool.release(controller_index)
         finally:
             self._controller_lock.release()
 
@@ -619,33 +1029,174 @@ class Nxbt():
             }
         })
 
-    def wait_for_connection(self, controller_index):
+    def wait_for_connection(self, controller_index, timeout=None):
         """Blocks until a given controller is connected
         to a Nintendo Switch.
 
         :param controller_index: The index of a given controller
         :type controller_index: int
+        :param timeout: The time to wait in seconds, defaults to None
+        :type timeout: float, optional
+        :raises OSError: If the controller crashes
+        :raises TimeoutError: If the timeout is reached
+        """
+
+        status = self.wait_for_state(
+            controller_index, ["connected", "crashed"], timeout=timeout)
+        if status["state"] == "crashed":
+            raise OSError("The watched controller has crashe with error",
+                          self.state[controller_index]["errors"])
+
+    def wait_for_state(self, controller_index, states, timeout=None):
+        """Blocks until a given controller is in one of the given
+        states. The controller processes publish their state changes,
+        so this waits on an event instead of polling.
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :param states: The states to wait for (see the state property)
+        :type states: list
+        :param timeout: The time to wait in seconds, defaults to None
+        :type timeout: float, optional
+        :raises TimeoutError: If the timeout is reached
+        :return: The controller's status (see get_status)
+        :rtype: dict
+        """
+
+        return self._status_subscriber.wait_for_state(
+            controller_index, states, timeout=timeout)
+
+    def state_events(self, controller_index=None, timeout=None):
+        """Yields controller state changes as they happen. Each event
+        is a dict with the "controller_index", "state" and
+        "connection_state" keys.
+
+        :param controller_index: Only yield events for this
+        controller, defaults to None (all controllers)
+        :type controller_index: int, optional
+        :param timeout: Stop after this many seconds without an
+        event, defaults to None (never stop)
+        :type timeout: float, optional
+        :return: A generator of state change events
+        :rtype: generator
+        """
+
+        return self._status_subscriber.events(controller_index, timeout=timeout)
+
+    def subscribe(self, callback):
+        """Calls a function with every controller state change. The
+        function is given the same events as state_events and is
+        called from a background thread.
+
+        :param callback: The function to call
+        :type callback: function
+        """
+
+        self._status_subscriber.subscribe(callback)
+
+    def unsubscribe(self, callback):
+        """Stops calling a function subscribed with subscribe.
+
+        :param callback: The subscribed function
+        :type callback: function
+        """
+
+        self._status_subscriber.unsubscribe(callback)
+
+    def get_status(self, controller_index):
+        """Gets a snapshot of a controller's status from shared memory.
+        Unlike the state property, this doesn't go through the
+        Manager process, so it's cheap enough to poll.
+
+        The status dict's structure follows:
+
+        {
+            "controller_index": The index of the controller
+            "state": As in the state property
+            "connection_state": As in the state property
+            "error": True if the controller has crashed. The
+                error itself is available in the state property.
+            "player_number": The player number set by the Switch
+            "last_connection": The last connected Switch's address
+            "reconnects": The number of lost connections
+            "ticks": The number of mainloop ticks run
+            "reports_sent": As in the state property
+            "reports_suppressed": As in the state property
+        }
+
+        :param controller_index: The index of a given controller
+        :type controller_index: int
+        :return: The status or None if the controller hasn't
+        started yet or was stopped partway through writing it. The
+        state property can be used as a fallback.
+        :rtype: dict or None
+        """
+
+        return self._status.read(controller_index)
+
+    @property
+    def adapter_pool(self):
+        """The pool tracking the health and use of the Bluetooth adapters.
+
+        :return: The adapter pool
+        :rtype: AdapterPool
+        """
+
+        if self._adapter_pool is None:
+            self._adapter_pool = AdapterPool()
+
+        return self._adapter_pool
+
+    def _update_adapter_pool(self):
+        """Records the connection outcomes of the controllers
+        in the adapter pool.
         """
 
-        while not self.state[controller_index]["state"] == "connected":
-            if self.state[controller_index]["state"] == "crashed":
-                raise OSError("The watched controller has crashe with error",
-                              self.state[controller_index]["errors"])
-            pass
+        for controller_index in list(self.manager_state.keys()):
+            try:
+                state = self.manager_state[controller_index].copy()
+            except KeyError:
+                continue
+            self.adapter_pool.observe(controller_index, state)
 
     def get_available_adapters(self):
         """Gets the DBus paths of all available Bluetooth
-        adapters.
+        adapters, ordered from healthiest to least healthy.
 
         :return: A list of available adapter paths
         :rtype: list
         """
 
-        bus = dbus.SystemBus()
-        adapters = find_objects(bus, SERVICE_NAME, ADAPTER_INTERFACE)
-        bus.close()
+        return self.adapter_pool.adapters
+
+    def get_adapter_stats(self):
+        """Gets the health statistics of every Bluetooth adapter
+        seen by nxbt. The statistics of an adapter follow:
+
+        {
+            "present": Whether the adapter is plugged in
+            "controller_index": The index of the controller using
+                the adapter or None
+            "attempts": The number of controllers assigned to the adapter
+            "successes": The number of those controllers that connected
+            "failures": The number of those controllers that crashed
+            "success_rate": successes / attempts or None
+            "reconnects": The number of reconnections by its controllers
+            "mean_connection_time": The mean time (in seconds) taken
+                to connect or None
+            "hotplug_adds"/"hotplug_removes": The number of times the
+                adapter was plugged in/removed
+            "last_hotplug": The UNIX timestamp of the last hot-plug event
+            "score": The adapter's health score. Higher is better.
+        }
+
+        :return: A dict of adapter paths to their statistics
+        :rtype: dict
+        """
 
-        return adapters
+        with self._controller_lock:
+            self._update_adapter_pool()
+            return self.adapter_pool.stats()
 
     def get_switch_addresses(self):
         """Gets the Bluetooth MAC addresses of all
@@ -676,9 +1227,67 @@ class Nxbt():
                         A list of UUIDs
                     "errors":
                         A string with the crash error
-                    "direct_input":
-                        A dictionary that represents all inputs
-                        being directly input into the controller.
+                    "last_connection":
+                        The Bluetooth MAC address of the last
+                        connected Switch
+                    "connection_time":
+                        The time (in seconds) the controller took
+                        to initialize and connect to a Switch
+                    "reconnects":
+                        The number of times the controller had
+                        to recover its connection
+                    "reconnect_attempts":
+                        The outcome ("connected") and latency
+                        (in seconds) of each address tried on
+                        the last reconnect
+                    "handshake":
+                        The total duration of the last pairing
+                        exchange and the round-trip time of each
+                        subcommand (in seconds)
+                    "connection_state":
+                        "pairing" or
+                        "reconnecting" or
+                        "connected" or
+                        "degraded" (connected, but reports
+                        can't be sent)
+                    "recoveries":
+                        The most recent lost connections, each
+                        with its "cause", "timestamp", "duration"
+                        (in seconds), "attempts" and "outcome"
+                        ("reconnected" or "paired")
+                    "reports_superseded":
+                        The number of reports replaced by a newer
+                        one while the send buffer was full
+                    "reports_dropped":
+                        The number of unsent reports discarded
+                        when the connection was lost
+                    "max_switch_backlog":
+                        The most packets from the Switch waiting
+                        to be read at the start of a tick
+                    "reports_sent":
+                        The number of reports sent from the
+                        mainloop (updated about once a second)
+                    "reports_suppressed":
+                        The number of unchanged reports that
+                        weren't sent
+                    "restarts":
+                        The number of times the controller was
+                        restarted after crashing (only when
+                        supervise_controllers is enabled)
+                    "last_crash":
+                        The "reason" and "timestamp" of the last
+                        crash of a supervised controller
+                    "pid":
+                        The process ID of the controller
+                    "macro_starts":
+                        The time.monotonic() times the first
+                        reports of the most recent scheduled macros
+                        were sent (see macro_sync), keyed by macro ID
+                    "macro_queue":
+                        The macro queue's "depth", "peak" depth,
+                        "limit", overflow "policy" and the number
+                        of macros "rejected" or "dropped" because
+                        it was full (updated a few times a second)
                 }
         }
 
@@ -694,24 +1303,160 @@ class _ControllerManager():
     a daemon multiprocessing Process that the ControllerManager
     object creates and manages.
 
-    The ControllerManager object submits messages to the respective
-    queues of each controller process for tasks such as macro submission
-    or macro clearing/stopping.
+    Macro commands don't pass through the ControllerManager. Each
+    controller process reads them from its own command channel.
     """
 
-    def __init__(self, state, lock):
+    # Seconds before the first restart of a crashed controller
+    RESTART_BACKOFF_BASE = 1
+    # The longest wait before restarting a crashed controller
+    RESTART_BACKOFF_MAX = 60
+    # Restarts of a controller before it's left crashed
+    MAX_RESTARTS = 10
+    # Warm workers kept per adapter. Each registers the SDP profile
+    # and only one controller fits on an adapter.
+    MAX_WARM_WORKERS = 1
+
+    def __init__(self, state, lock, status=None, channels=None,
+                 supervised=False, warm_pool_size=0, macro_queue_limit=None,
+                 macro_queue_policy="block"):
 
         self.state = state
         self.lock = lock
+        self.status = status
+        self.channels = channels
+        self.supervised = supervised
+        # Controller index -> the arguments it was created with
+        self._controller_args = {}
+        # Controller index -> the time of its next restart
+        self._restarts = {}
         self.controller_resources = Manager()
-        self._controller_queues = {}
         self._children = {}
 
+        # Adapter path -> prepared controller workers
+        self.warm_pool_size = min(warm_pool_size, self.MAX_WARM_WORKERS)
+        self.macro_queue_limit = macro_queue_limit
+        self.macro_queue_policy = macro_queue_policy
+        self._warm_workers = {}
+        if self.warm_pool_size:
+            # Every controller is forked from this process, so the
+            # adapters are listed without starting the signal thread.
+            index = BlueZObjectIndex(subscribe=False)
+            try:
+                adapter_paths = index.find_objects(ADAPTER_INTERFACE)
+            finally:
+                index.close()
+            for adapter_path in adapter_paths:
+                self._warm(adapter_path)
+
+    def _warm(self, adapter_path):
+        """Tops up an adapter's warm controller workers.
+
+        :param adapter_path: The DBus path of the adapter
+        :type adapter_path: str
+        """
+
+        workers = self._warm_workers.setdefault(adapter_path, [])
+        workers[:] = [w for w in workers if w["process"].is_alive()]
+        while len(workers) < self.warm_pool_size:
+            receiver, sender = Pipe(duplex=False)
+            process = Process(target=self._warm_worker,
+                              args=(adapter_path, receiver))
+            process.daemon = True
+            process.start()
+            workers.append({
+                "process": process,
+                "sender": sender,
+            })
+
+    def _warm_worker(self, adapter_path, receiver):
+        """Runs in a warm controller process. The adapter is prepared
+        and the D-Bus proxies are created before a controller is
+        assigned, then the controller is run as usual.
+
+        :param adapter_path: The DBus path of the adapter
+        :type adapter_path: str
+        :param receiver: The end of the pipe the controller's
+        arguments are received on
+        :type receiver: multiprocessing.Connection
+        """
+
+        bt = BlueZ(adapter_path=adapter_path)
+        with self.lock:
+            # The controller type doesn't affect preparation
+            Controller(bt, ControllerTypes.PRO_CONTROLLER).prepare()
+
+        try:
+            args = receiver.recv()
+        except EOFError:
+            return
+
+        args["adapter_path"] = adapter_path
+        self._run_controller(args["index"], args, args["state"],
+                             args["reconnect_address"], bluetooth=bt)
+
+    def _run_controller(self, index, args, state, reconnect_address,
+                        bluetooth=None, restarted=False):
+        """Runs in a controller process. The controller server is
+        created here, rather than in the command manager, so that
+        its D-Bus connection and BlueZ object index belong to the
+        controller process alone.
+
+        :param index: The index of the controller
+        :type index: int
+        :param args: The arguments the controller was created with
+        :type args: dict
+        :param state: The controller's shared state dict
+        :type state: multiprocessing.Manager().dict
+        :param reconnect_address: The address of a Nintendo Switch
+        to reconnect to
+        :type reconnect_address: str or list
+        :param bluetooth: An already prepared adapter, defaults to None
+        :type bluetooth: BlueZ, optional
+        :param restarted: Whether the controller is being restarted
+        after a crash, defaults to False
+        :type restarted: bool, optional
+        """
+
+        server = ControllerServer(args["controller_type"],
+                                  adapter_path=args["adapter_path"],
+                                  lock=self.lock,
+                                  state=state,
+                                  colour_body=args["colour_body"],
+                                  colour_buttons=args["colour_buttons"],
+                                  reconnect_policy=args["reconnect_policy"],
+                                  status=(ControllerStatus(self.status, index)
+                                          if self.status else None),
+                                  bluetooth=bluetooth,
+                                  prepared=bluetooth is not None,
+                                  commands=(self.channels.reader(index)
+                                            if self.channels else None),
+                                  macro_queue_limit=self.macro_queue_limit,
+                                  macro_queue_policy=self.macro_queue_policy)
+        server.run(reconnect_address, restarted=restarted)
+
+    def _take_warm_worker(self, adapter_path):
+        """Takes a live warm worker for an adapter, if there is one.
+
+        :param adapter_path: The DBus path of the adapter
+        :type adapter_path: str
+        :return: The worker or None
+        :rtype: dict or None
+        """
+
+        workers = self._warm_workers.get(adapter_path, [])
+        while workers:
+            worker = workers.pop(0)
+            if worker["process"].is_alive():
+                return worker
+
+        return None
+
     def create_controller(self, index, controller_type, adapter_path,
                           colour_body=None, colour_buttons=None,
-                          reconnect_address=None):
+                          reconnect_address=None, reconnect_policy=None):
         """Instantiates a given controller as a multiprocessing
-        Process with a shared state dict and a task queue.
+        Process with a shared state dict and a command channel.
 
         Configuration options are available in the form of
         controller colours.
@@ -731,68 +1476,166 @@ class _ControllerManager():
         :param reconnect_address: The address of a Nintendo Switch
         to reconnect to, defaults to None
         :type reconnect_address: str, optional
+        :param reconnect_policy: Overrides for the controller's
+        reconnect policy, defaults to None
+        :type reconnect_policy: dict, optional
         """
 
-        controller_queue = Queue()
+        worker = self._take_warm_worker(adapter_path)
 
         controller_state = self.controller_resources.dict()
         controller_state["state"] = "initializing"
         controller_state["finished_macros"] = []
         controller_state["errors"] = False
-        controller_state["direct_input"] = json.loads(json.dumps(DIRECT_INPUT_PACKET))
         controller_state["colour_body"] = colour_body
         controller_state["colour_buttons"] = colour_buttons
         controller_state["type"] = str(controller_type)
         controller_state["adapter_path"] = adapter_path
         controller_state["last_connection"] = None
+        controller_state["connection_time"] = None
+        controller_state["reconnects"] = 0
+        controller_state["reconnect_attempts"] = {}
+        controller_state["handshake"] = None
+        controller_state["connection_state"] = None
+        controller_state["recoveries"] = []
+        controller_state["reports_superseded"] = 0
+        controller_state["reports_dropped"] = 0
+        controller_state["max_switch_backlog"] = 0
+        controller_state["reports_sent"] = 0
+        controller_state["reports_suppressed"] = 0
+
+        controller_state["macro_starts"] = {}
+        controller_state["macro_queue"] = {
+            "depth": 0,
+            "peak": 0,
+            "limit": self.macro_queue_limit,
+            "policy": self.macro_queue_policy,
+            "rejected": 0,
+            "dropped": 0,
+        }
 
-        self._controller_queues[index] = controller_queue
+        controller_state["restarts"] = 0
+        controller_state["last_crash"] = None
+        controller_state["pid"] = None
+
+        self._controller_args[index] = {
+            "controller_type": controller_type,
+            "adapter_path": adapter_path,
+            "colour_body": colour_body,
+            "colour_buttons": colour_buttons,
+            "reconnect_address": reconnect_address,
+            "reconnect_policy": reconnect_policy,
+        }
 
         self.state[index] = controller_state
 
-        server = ControllerServer(controller_type,
-                                  adapter_path=adapter_path,
-                                  lock=self.lock,
-                                  state=controller_state,
-                                  task_queue=controller_queue,
-                                  colour_body=colour_body,
-                                  colour_buttons=colour_buttons)
-        controller = Process(target=server.run, args=(reconnect_address,))
-        controller.daemon = True
-        self._children[index] = controller
-        controller.start()
+        if worker:
+            worker["sender"].send({
+                "index": index,
+                "controller_type": controller_type,
+                "state": controller_state,
+                "colour_body": colour_body,
+                "colour_buttons": colour_buttons,
+                "reconnect_address": reconnect_address,
+                "reconnect_policy": reconnect_policy,
+            })
+            self._children[index] = worker["process"]
+            controller_state["pid"] = worker["process"].pid
+        else:
+            self._start_controller(index, reconnect_address)
 
-    def input_macro(self, index, macro, macro_id):
+    def _start_controller(self, index, reconnect_address, restarted=False):
+        """Starts the process of a created controller.
 
-        self._controller_queues[index].put({
-            "type": "macro",
-            "macro": macro,
-            "macro_id": macro_id
-        })
-
-    def stop_macro(self, index, macro_id):
+        :param index: The index of the controller
+        :type index: int
+        :param reconnect_address: The address of a Nintendo Switch
+        to reconnect to
+        :type reconnect_address: str or list
+        :param restarted: Whether the controller crashed and is being
+        restarted. Restarted controllers keep the commands sent to
+        them while they were down, defaults to False
+        :type restarted: bool, optional
+        """
 
-        self._controller_queues[index].put({
-            "type": "stop",
-            "macro_id": macro_id,
-        })
+        controller = Process(
+            target=self._run_controller,
+            args=(index, self._controller_args[index], self.state[index],
+                  reconnect_address),
+            kwargs={"restarted": restarted})
+        controller.daemon = True
+        self._children[index] = controller
+        controller.start()
+        self.state[index]["pid"] = controller.pid
 
-    def clear_macros(self, index):
+    def supervise(self):
+        """Restarts crashed controllers on their adapter with
+        exponential backoff. A restarted controller reconnects to
+        the Switch it was last connected to, if any.
+        """
 
-        self._controller_queues[index].put({
-            "type": "clear",
-        })
+        if not self.supervised:
+            return
+
+        now = time.perf_counter()
+        for index, child in list(self._children.items()):
+            if child.is_alive() or index not in self.state:
+                continue
+
+            restart = self._restarts.get(index)
+            if restart is None:
+                state = self.state[index]
+                restarts = state["restarts"]
+                if restarts >= self.MAX_RESTARTS:
+                    continue
+
+                reason = f"Exited with code {child.exitcode}"
+                if state["state"] == "crashed" and state["errors"]:
+                    # The last line of the traceback has the exception
+                    reason = state["errors"].strip().splitlines()[-1]
+                state["last_crash"] = {"reason": reason, "timestamp": time.time()}
+
+                delay = min(self.RESTART_BACKOFF_BASE * 2 ** restarts,
+                            self.RESTART_BACKOFF_MAX)
+                self._restarts[index] = now + delay
+            elif now >= restart:
+                del self._restarts[index]
+                state = self.state[index]
+                state["restarts"] = state["restarts"] + 1
+                state["errors"] = False
+
+                args = self._controller_args[index]
+                reconnect_address = (state["last_connection"] or
+                                     args["reconnect_address"])
+                child.join()
+                self._start_controller(index, reconnect_address, restarted=True)
 
     def remove_controller(self, index):
-        
-        self._children[index].terminate()
+
+        # The controller may already be gone
+        child = self._children.pop(index, None)
+        if child:
+            child.terminate()
+            # The slot is only reused once the process can't write to it
+            child.join()
+        if self.status:
+            self.status.slots.release(index)
+        args = self._controller_args.pop(index, None)
+        self._restarts.pop(index, None)
         self.state.pop(index, None)
 
+        # Prepare the freed adapter for the next controller
+        if args and self.warm_pool_size:
+            self._warm(args["adapter_path"])
+
     def shutdown(self):
 
         # Loop over children and kill all
         for index in self._children.keys():
             child = self._children[index]
             child.terminate()
+        for workers in self._warm_workers.values():
+            for worker in workers:
+                worker["process"].terminate()
 
         self.controller_resources.shutdown()
@@ -0,0 +1,90 @@
+from multiprocessing import Lock
+from multiprocessing.sharedctypes import RawArray
+
+
+# Marks a slot without a controller
+FREE_SLOT = -1
+
+
+class SlotAllocator():
+    """Assigns each live controller its own slot in the fixed-size
+    structures that are shared with the controller processes
+    (the StatusTable and the CommandChannels).
+
+    Slot owners are kept in shared memory, so every process can look
+    up a controller's slot. A slot is taken when a controller is
+    created and freed once its process has been stopped.
+    """
+
+    def __init__(self, capacity=64):
+        """Allocates the slots. This must happen before the controller
+        processes are started so that they share the memory.
+
+        :param capacity: The number of slots, defaults to 64
+        :type capacity: int, optional
+        """
+
+        self.capacity = capacity
+        self._owners = RawArray("i", [FREE_SLOT] * capacity)
+        self._lock = Lock()
+        # Process-local cache of controller index -> slot
+        self._cache = {}
+
+    def allocate(self, controller_index):
+        """Takes a free slot for a controller.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :raises ValueError: If every slot is taken
+        :return: The controller's slot
+        :rtype: int
+        """
+
+        with self._lock:
+            slot = self.slot(controller_index)
+            if slot is not None:
+                return slot
+
+            for slot in range(self.capacity):
+                if self._owners[slot] == FREE_SLOT:
+                    self._owners[slot] = controller_index
+                    self._cache[controller_index] = slot
+                    return slot
+
+        raise ValueError(
+            f"All {self.capacity} controller slots are in use")
+
+    def release(self, controller_index):
+        """Frees a controller's slot, if it has one. The controller's
+        process must no longer be running.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        """
+
+        with self._lock:
+            slot = self.slot(controller_index)
+            if slot is not None:
+                self._owners[slot] = FREE_SLOT
+            self._cache.pop(controller_index, None)
+
+    def slot(self, controller_index):
+        """Gets a controller's slot.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :return: The slot or None if the controller doesn't have one
+        :rtype: int or None
+        """
+
+        slot = self._cache.get(controller_index)
+        if slot is not None and self._owners[slot] == controller_index:
+            return slot
+
+        for slot in range(self.capacity):
+            if self._owners[slot] == controller_index:
+                self._cache[controller_index] = slot
+                return slot
+
+        self._cache.pop(controller_index, None)
+        return None
@@ -0,0 +1,417 @@
+import os
+import time
+import fcntl
+import logging
+import queue
+import select
+import struct
+from threading import Thread, Condition, Lock
+from multiprocessing.sharedctypes import RawArray
+
+from .slots import SlotAllocator
+
+
+# Values of the "state" field, stored as their index
+STATES = ["", "initializing", "connecting", "reconnecting", "connected", "crashed"]
+# Values of the "connection_state" field, stored as their index
+CONNECTION_STATES = ["", "pairing", "reconnecting", "connected", "degraded"]
+
+# Sequence number, controller index, state, connection state, error flag,
+# player number, last connection, reconnects, ticks, reports sent
+# and reports suppressed
+SLOT_FORMAT = "<Ii4B6s2xIQQQ"
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+SEQUENCE_FORMAT = "<I"
+
+# Controller index, state and connection state
+EVENT_FORMAT = "<iBB"
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+
+FIELDS = ["controller_index", "state", "connection_state", "error",
+          "player_number", "last_connection", "reconnects", "ticks",
+          "reports_sent", "reports_suppressed"]
+
+# Taken and released around seqlock accesses for its memory barriers
+_fence = Lock()
+
+
+def memory_barrier():
+    """Orders the shared memory accesses before and after the call.
+    Python can't issue a barrier instruction, but taking and releasing
+    a lock is made of atomic instructions that do, which keeps weakly
+    ordered CPUs (such as the Raspberry Pi's ARM cores) from moving
+    a slot's reads or writes past its sequence number.
+    """
+
+    with _fence:
+        pass
+
+
+class StatusTable():
+    """A fixed-layout table of controller statuses in shared memory.
+
+    Each controller process writes its own slot and any process can
+    read every slot without a lock or a round trip through the
+    Manager process. Controllers are given their slot by a
+    SlotAllocator, so each slot has a single writer.
+
+    Writes are guarded with a seqlock: the slot's sequence number is
+    odd while a write is in progress, so readers retry if the number
+    is odd or has changed during their read. The sequence number is
+    separated from the slot's fields by memory barriers.
+
+    Large fields, such as crash tracebacks, stay in the Manager
+    state dict.
+
+    State transitions are also published as small records on a pipe,
+    so that readers can block on its file descriptor until a
+    controller's state changes (see StatusSubscriber).
+    """
+
+    # Reads attempted before a slot is considered abandoned mid-write
+    READ_RETRIES = 1000
+
+    def __init__(self, capacity=64, slots=None):
+        """Allocates the table. This must happen before the controller
+        processes are started so that they share the memory.
+
+        :param capacity: The number of slots, defaults to 64
+        :type capacity: int, optional
+        :param slots: The allocator assigning controllers their slot,
+        defaults to None (a new allocator with the table's capacity)
+        :type slots: SlotAllocator, optional
+        """
+
+        self.capacity = capacity
+        self.slots = slots if slots is not None else SlotAllocator(capacity)
+        self.buffer = RawArray("B", SLOT_SIZE * capacity)
+
+        # Controllers must never block on a full event pipe.
+        # The table stays the source of truth if events are lost.
+        self.event_fd, self._event_write_fd = os.pipe()
+        flags = fcntl.fcntl(self._event_write_fd, fcntl.F_GETFL)
+        fcntl.fcntl(self._event_write_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        # Writer side copies of each slot's fields
+        self._values = {}
+
+    def _slot(self, controller_index):
+
+        slot = self.slots.slot(controller_index)
+        if slot is None:
+            raise ValueError(f"Controller {controller_index} doesn't have a status slot")
+
+        return slot
+
+    def reset(self, controller_index):
+        """Clears a controller's slot for a new controller.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :raises ValueError: If the controller doesn't have a slot
+        """
+
+        self._values[controller_index] = {
+            "controller_index": controller_index,
+            "state": "initializing",
+            "connection_state": "",
+            "error": False,
+            "player_number": 0,
+            "last_connection": None,
+            "reconnects": 0,
+            "ticks": 0,
+            "reports_sent": 0,
+            "reports_suppressed": 0,
+        }
+        self._write(controller_index)
+        self._publish(controller_index)
+
+    def update(self, controller_index, **fields):
+        """Updates fields in a controller's slot. Only the controller
+        owning the slot should write to it.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :raises ValueError: On an unknown field or if the controller
+        doesn't have a slot
+        """
+
+        if controller_index not in self._values:
+            self.reset(controller_index)
+
+        values = self._values[controller_index]
+        changed = False
+        for name, value in fields.items():
+            if name not in values:
+                raise ValueError(f"Unknown status field: {name}")
+            if name in ("state", "connection_state") and values[name] != value:
+                changed = True
+            values[name] = value
+        self._write(controller_index)
+
+        if changed:
+            self._publish(controller_index)
+
+    def _publish(self, controller_index):
+
+        values = self._values[controller_index]
+        event = struct.pack(
+            EVENT_FORMAT, controller_index,
+            STATES.index(values["state"]),
+            CONNECTION_STATES.index(values["connection_state"] or ""))
+        try:
+            # Writes this small are atomic
+            os.write(self._event_write_fd, event)
+        except BlockingIOError:
+            pass
+
+    def _write(self, controller_index):
+        """Writes a controller's fields to its slot.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        """
+
+        values = self._values[controller_index]
+        offset = self._slot(controller_index) * SLOT_SIZE
+
+        address = values["last_connection"]
+        address = bytes.fromhex(address.replace(":", "")) if address else bytes(6)
+
+        # A controller terminated mid-write leaves its slot's
+        # sequence number odd, in which case it's reused.
+        sequence = struct.unpack_from(SEQUENCE_FORMAT, self.buffer, offset)[0]
+        sequence = sequence if sequence & 1 else (sequence + 1) & 0xFFFFFFFF
+        struct.pack_into(SEQUENCE_FORMAT, self.buffer, offset, sequence)
+        memory_barrier()
+        struct.pack_into(
+            SLOT_FORMAT, self.buffer, offset,
+            sequence,
+            controller_index,
+            STATES.index(values["state"]),
+            CONNECTION_STATES.index(values["connection_state"] or ""),
+            int(bool(values["error"])),
+            values["player_number"] or 0,
+            address,
+            values["reconnects"],
+            values["ticks"],
+            values["reports_sent"],
+            values["reports_suppressed"])
+        memory_barrier()
+        # Skips 0 on wrapping, since it marks unwritten slots
+        struct.pack_into(SEQUENCE_FORMAT, self.buffer, offset,
+                         (sequence + 1) & 0xFFFFFFFF or 2)
+
+    def read(self, controller_index):
+        """Reads a controller's status without locking.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :return: The controller's status or None if the controller
+        doesn't have a slot, hasn't written it yet or was stopped
+        partway through a write
+        :rtype: dict or None
+        """
+
+        slot = self.slots.slot(controller_index)
+        if slot is None:
+            return None
+
+        offset = slot * SLOT_SIZE
+        for _ in range(self.READ_RETRIES):
+            sequence = struct.unpack_from(SEQUENCE_FORMAT, self.buffer, offset)[0]
+            if sequence & 1:
+                continue
+            memory_barrier()
+            values = struct.unpack_from(SLOT_FORMAT, self.buffer, offset)
+            memory_barrier()
+            if struct.unpack_from(SEQUENCE_FORMAT, self.buffer, offset)[0] == sequence:
+                break
+        else:
+            # The writer stopped partway through a write
+            return None
+
+        # Never written
+        if sequence == 0:
+            return None
+
+        status = dict(zip(FIELDS, values[1:]))
+        if status["controller_index"] != controller_index:
+            return None
+
+        status["state"] = STATES[status["state"]]
+        status["connection_state"] = CONNECTION_STATES[status["connection_state"]] or None
+        status["error"] = bool(status["error"])
+        status["player_number"] = status["player_number"] or None
+        address = status["last_connection"]
+        status["last_connection"] = (
+            ":".join(f"{b:02X}" for b in address) if any(address) else None)
+
+        return status
+
+
+class ControllerStatus():
+    """A controller's writer handle on its slot in a StatusTable."""
+
+    def __init__(self, table, controller_index):
+
+        self.table = table
+        self.controller_index = controller_index
+        self.table.reset(controller_index)
+
+    def update(self, **fields):
+        """Updates fields in the controller's slot.
+
+        :raises ValueError: On an unknown field
+        """
+
+        self.table.update(self.controller_index, **fields)
+
+
+class StatusSubscriber():
+    """Delivers controller state transitions from a StatusTable's
+    event pipe to waiting threads, generators and callbacks.
+
+    A single daemon thread blocks on the pipe and fans each event
+    out, so no reader polls the table. The thread is started on
+    first use so that it isn't running when processes are forked.
+
+    Events are dropped if the pipe is full, so waiting threads also
+    re-read the table every RECHECK_INTERVAL seconds.
+    """
+
+    # Seconds between re-reads of the table while waiting on a state
+    RECHECK_INTERVAL = 0.5
+
+    def __init__(self, table):
+
+        self.logger = logging.getLogger('nxbt')
+        self.table = table
+        self._condition = Condition()
+        self._callbacks = []
+        self._queues = []
+        self._thread = None
+
+    def _start(self):
+
+        with self._condition:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+
+        pending = b""
+        while True:
+            select.select([self.table.event_fd], [], [])
+            pending += os.read(self.table.event_fd, EVENT_SIZE * 64)
+
+            events = []
+            while len(pending) >= EVENT_SIZE:
+                index, state, connection_state = struct.unpack_from(EVENT_FORMAT, pending)
+                pending = pending[EVENT_SIZE:]
+                events.append({
+                    "controller_index": index,
+                    "state": STATES[state],
+                    "connection_state": CONNECTION_STATES[connection_state] or None,
+                })
+
+            with self._condition:
+                callbacks = list(self._callbacks)
+                for event_queue in self._queues:
+                    for event in events:
+                        event_queue.put(event)
+                self._condition.notify_all()
+
+            for event in events:
+                for callback in callbacks:
+                    # A failing callback mustn't stop the events
+                    # that every other waiter depends on.
+                    try:
+                        callback(event)
+                    except Exception:
+                        self.logger.exception(
+                            "Error in a controller state callback")
+
+    def wait_for_state(self, controller_index, states, timeout=None):
+        """Blocks until a controller is in one of the given states.
+
+        :param controller_index: The index of the controller
+        :type controller_index: int
+        :param states: The states to wait for
+        :type states: list
+        :param timeout: The time to wait in seconds, defaults to None
+        :type timeout: float, optional
+        :raises TimeoutError: If the timeout is reached
+        :return: The controller's status
+        :rtype: dict
+        """
+
+        self._start()
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._condition:
+            while True:
+                status = self.table.read(controller_index)
+                if status and status["state"] in states:
+                    return status
+
+                wait = self.RECHECK_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"Controller {controller_index} didn't reach {states}")
+                    wait = min(wait, remaining)
+                self._condition.wait(wait)
+
+    def subscribe(self, callback):
+        """Calls a function with every state transition event. The
+        function is called from the subscriber's thread. Exceptions
+        raised by the function are logged.
+
+        :param callback: A function taking an event dict with the
+        "controller_index", "state" and "connection_state" keys
+        :type callback: function
+        """
+
+        self._start()
+        with self._condition:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+
+        with self._condition:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def events(self, controller_index=None, timeout=None):
+        """Yields state transition events as they happen.
+
+        :param controller_index: Only yield events for this
+        controller, defaults to None (all controllers)
+        :type controller_index: int, optional
+        :param timeout: Stop after this many seconds without an
+        event, defaults to None (never stop)
+        :type timeout: float, optional
+        :yield: Event dicts with the "controller_index", "state"
+        and "connection_state" keys
+        :rtype: dict
+        """
+
+        event_queue = queue.Queue()
+        self._start()
+        with self._condition:
+            self._queues.append(event_queue)
+
+        try:
+            while True:
+                try:
+                    event = event_queue.get(timeout=timeout)
+                except queue.Empty:
+                    return
+                if (controller_index is None or
+                        event["controller_index"] == controller_index):
+                    yield event
+        finally:
+            with self._condition:
+                self._queues.remove(event_queue)
@@ -348,7 +348,7 @@ class InputTUI():
                 while inp != chr(113):  # Checking for q press
                     # Check key at 15hz
                     inp = term.inkey(timeout=1/30)
-                    new_state = self.nx.state[self.controller_index]["state"]
+                    new_state = self.get_state()
 
                     if new_state != state:
                         state = new_state
@@ -519,6 +519,7 @@ class InputTUI():
 
         def input_worker(nxbt, controller_index, input_packet):
 
+            last_packet = None
             while True:
                 packet = input_packet["packet"]
 
@@ -550,7 +551,11 @@ class InputTUI():
                 packet["R_STICK"]["X_VALUE"] = rs_x_value
                 packet["R_STICK"]["Y_VALUE"] = rs_y_value
 
-                nxbt.set_controller_input(controller_index, packet)
+                # The controller holds the last input it was sent,
+                # so only send changes.
+                if packet != last_packet:
+                    nxbt.set_controller_input(controller_index, packet, hold=True)
+                    last_packet = packet
                 time.sleep(1/120)
 
         input_process = multiprocessing.Process(
@@ -613,9 +618,23 @@ class InputTUI():
         print(term.move_y(term.height))
         print(term.center(term.bold_black_on_white(" <Press q to quit> ")))
 
+    def get_state(self):
+        """Gets the controller's state from its shared memory status,
+        falling back to the Manager state if the status can't be read.
+
+        :return: The controller's state
+        :rtype: str
+        """
+
+        status = self.nx.get_status(self.controller_index)
+        if status is None:
+            return self.nx.state[self.controller_index]["state"]
+
+        return status["state"]
+
     def check_for_disconnect(self, term):
 
-        state = self.nx.state[self.controller_index]["state"]
+        state = self.get_state()
         if state != 'connected':
             print(term.home + term.move_y((term.height // 2) - 4))
             print(term.bold_black_on_red(term.center("")))
@@ -632,7 +651,7 @@ class InputTUI():
                 inp = term.inkey(1/30)
                 if inp == chr(113):
                     exit(1)
-                elif self.nx.state[self.controller_index]["state"] == 'connected':
+                elif self.get_state() == 'connected':
                     break
 
 
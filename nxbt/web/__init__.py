@@ -1 +1,12 @@
-from .app import start_web_app
+from ..lazy import lazy_attributes
+
+
+# The webapp creates an Nxbt instance and loads Flask/eventlet
+# on import, so it's only loaded once it's actually requested.
+_LAZY_ATTRIBUTES = {
+    "start_web_app": ".app",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES.keys())
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
@@ -95,7 +95,8 @@ def handle_input(message):
     message = json.loads(message)
     index = message[0]
     input_packet = message[1]
-    nxbt.set_controller_input(index, input_packet)
+    # The client only sends input when it changes
+    nxbt.set_controller_input(index, input_packet, hold=True)
 
 
 @sio.on('macro')
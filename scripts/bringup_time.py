@@ -0,0 +1,60 @@
+"""
+Measures how long it takes to connect one controller per
+available Bluetooth adapter.
+
+A Pro Controller is created on every adapter at once, then the script
+waits for all of them to connect. The total time to connect all
+controllers is reported along with each controller's own
+connection time and how long create_controller took to return
+(the time until the controller is accepting connections).
+
+Pass --warm to prepare a controller process on each adapter
+before creating the controllers.
+
+DIRECTIONS FOR USE
+1.) Turn on your Switch(es) and open the "Change Grip/Order" menu.
+2.) Run this script as root: sudo python3 scripts/bringup_time.py [--warm]
+"""
+
+import sys
+import time
+
+from nxbt import Nxbt, PRO_CONTROLLER
+
+
+if __name__ == "__main__":
+
+    warm = "--warm" in sys.argv
+    nx = Nxbt(warm_controllers=1 if warm else 0)
+    adapters = nx.get_available_adapters()
+    if len(adapters) < 1:
+        raise OSError("Unable to detect any Bluetooth adapters.")
+
+    if warm:
+        # Give the warm workers time to prepare their adapters
+        time.sleep(5)
+
+    print(f"Creating {len(adapters)} controller(s)...")
+    start = time.perf_counter()
+    indexes = []
+    create_times = {}
+    for adapter in adapters:
+        create_start = time.perf_counter()
+        index = nx.create_controller(PRO_CONTROLLER, adapter)
+        create_times[index] = time.perf_counter() - create_start
+        indexes.append(index)
+
+    for index in indexes:
+        nx.wait_for_connection(index)
+    total = time.perf_counter() - start
+
+    print("---------------------------------------------------")
+    print("| Index | Adapter         | Create    | Connect   |")
+    print("---------------------------------------------------")
+    for index in indexes:
+        state = nx.state[index]
+        adapter = state["adapter_path"].split("/")[-1]
+        print(f"| {index:<5} | {adapter:<15} | {create_times[index]:7.2f}s "
+              f"| {state['connection_time']:7.2f}s |")
+    print("---------------------------------------------------")
+    print(f"Connected {len(indexes)} controller(s) in {total:.2f}s")
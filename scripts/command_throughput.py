@@ -0,0 +1,155 @@
+"""
+Benchmarks the delivery of macro commands to a controller process.
+
+The previous path, where each command is put on the central task
+queue, relayed by the command manager process and put on the
+controller's own queue, is compared against the direct per-controller
+command channels, sending compiled macros one at a time and in
+batches (as with Nxbt.macro_many). The controller is emulated by a
+process that drains its commands once per Pro Controller tick
+(120Hz), as the controller server does.
+
+No Bluetooth hardware is needed.
+
+Usage (from the root of the repository):
+    python scripts/command_throughput.py [--macros N] [--batch N] [--runs N]
+"""
+
+import argparse
+import os
+import queue
+import select
+import statistics
+import sys
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nxbt.channels import CommandChannels  # noqa: E402
+from nxbt.controller.input import InputParser  # noqa: E402
+
+
+MACRO = "A 0.1s\n0.1s"
+TICK = 1/120
+
+
+def relay(task_queue, controller_queue):
+    """The previous command manager loop."""
+
+    while True:
+        msg = task_queue.get()
+        if msg is None:
+            controller_queue.put(None)
+            return
+        controller_queue.put({
+            "type": "macro",
+            "macro": msg["arguments"]["macro"],
+            "macro_id": msg["arguments"]["macro_id"],
+        })
+
+
+def queue_controller(controller_queue, count, done):
+
+    received = 0
+    while received < count:
+        # Wake on the queue or the next tick, whichever comes first
+        select.select([controller_queue._reader], [], [], TICK)
+        try:
+            while True:
+                if controller_queue.get_nowait() is not None:
+                    received += 1
+        except queue.Empty:
+            pass
+    done.put(time.perf_counter())
+
+
+def channel_controller(reader, count, done):
+
+    received = 0
+    while received < count:
+        select.select([reader], [], [], TICK)
+        received += len(reader.receive())
+    done.put(time.perf_counter())
+
+
+def run_relay(count):
+
+    task_queue = Queue()
+    controller_queue = Queue()
+    done = Queue()
+    relay_process = Process(target=relay, args=(task_queue, controller_queue))
+    controller = Process(target=queue_controller,
+                         args=(controller_queue, count, done))
+    # A failed run mustn't leave the script waiting on its workers
+    relay_process.daemon = True
+    controller.daemon = True
+    relay_process.start()
+    controller.start()
+
+    start = time.perf_counter()
+    for _ in range(count):
+        task_queue.put({
+            "command": 1,
+            "arguments": {
+                "controller_index": 0,
+                "macro": MACRO,
+                "macro_id": os.urandom(24).hex(),
+            }
+        })
+    end = done.get()
+
+    task_queue.put(None)
+    relay_process.join()
+    controller.join()
+
+    return count / (end - start)
+
+
+def run_channel(count, batch=1):
+
+    compiler = InputParser(None)
+    channels = CommandChannels(capacity=1)
+    channels.slots.allocate(0)
+    done = Queue()
+    controller = Process(target=channel_controller,
+                         args=(channels.reader(0), count, done))
+    controller.daemon = True
+    controller.start()
+
+    start = time.perf_counter()
+    for sent in range(0, count, batch):
+        channels.send_many(0, [{
+            "type": "macro",
+            "macro": compiler.compile_macro(MACRO),
+            "macro_id": os.urandom(24).hex(),
+        } for _ in range(min(batch, count - sent))])
+    end = done.get()
+
+    controller.join()
+
+    return count / (end - start)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--macros", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    results["Relayed"] = [run_relay(args.macros) for _ in range(args.runs)]
+    results["Direct"] = [run_channel(args.macros) for _ in range(args.runs)]
+    results["Batched"] = [run_channel(args.macros, args.batch)
+                          for _ in range(args.runs)]
+
+    print(f"Macros per run: {args.macros}")
+    print("-" * 40)
+    print("| Path     | Mean macros/s | Min        |")
+    print("-" * 40)
+    for name, rates in results.items():
+        print(f"| {name:<8} | {statistics.mean(rates):13.0f} "
+              f"| {min(rates):10.0f} |")
+    print("-" * 40)
@@ -0,0 +1,139 @@
+"""
+Benchmarks the pairing handshake against an emulated Switch.
+
+The emulated Switch sends the same subcommand sequence as
+scripts/switch_emu.py over a local socket pair, waiting for each
+subcommand reply before sending the next one. The adaptive handshake
+is compared against the previous fixed pacing (1s until the first
+message, then a 15Hz loop).
+
+No Bluetooth hardware is needed.
+
+Usage (from the root of the repository):
+    python scripts/handshake_bench.py [--latency MS] [--runs N]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import time
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from switch_emu import COMMANDS, SET_PLAYER_LIGHTS  # noqa: E402
+from nxbt.controller.controller import ControllerTypes  # noqa: E402
+from nxbt.controller.protocol import ControllerProtocol  # noqa: E402
+from nxbt.controller.handshake import Handshake  # noqa: E402
+
+
+def emulate_switch(sock, latency):
+    """Sends the pairing subcommands, waiting on each reply.
+
+    :param sock: The Switch's end of the socket pair
+    :type sock: socket.socket
+    :param latency: Seconds the Switch takes to process a reply
+    :type latency: float
+    """
+
+    try:
+        # Initial empty report from the controller
+        sock.recv(350)
+
+        for command in COMMANDS + [SET_PLAYER_LIGHTS]:
+            time.sleep(latency)
+            sock.sendall(command)
+            while sock.recv(350)[1] != 0x21:
+                pass
+    except OSError:
+        pass
+
+
+def legacy_handshake(itr, protocol):
+    """The fixed pacing used before the adaptive handshake."""
+
+    received_first_message = False
+    while True:
+        try:
+            reply = itr.recv(50)
+        except BlockingIOError:
+            reply = None
+
+        if reply:
+            received_first_message = True
+
+        protocol.process_commands(reply)
+        itr.sendall(protocol.get_report())
+
+        if (reply and len(reply) > 45 and
+                protocol.vibration_enabled and protocol.player_number):
+            break
+
+        if not received_first_message:
+            time.sleep(1)
+        else:
+            time.sleep(1/15)
+
+
+def run_once(adaptive, latency):
+
+    itr, switch = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    protocol = ControllerProtocol(
+        ControllerTypes.PRO_CONTROLLER, "00:00:00:00:00:00")
+
+    emulator = Thread(target=emulate_switch, args=(switch, latency), daemon=True)
+    emulator.start()
+
+    # Send an empty input report to the Switch to prompt a reply
+    protocol.process_commands(None)
+    itr.sendall(protocol.get_report())
+    itr.setblocking(False)
+
+    round_trips = []
+    start = time.perf_counter()
+    if adaptive:
+        handshake = Handshake(protocol)
+        round_trips = handshake.run(itr)["round_trips"]
+    else:
+        legacy_handshake(itr, protocol)
+    duration = time.perf_counter() - start
+
+    itr.close()
+    switch.close()
+    emulator.join()
+
+    return duration, round_trips
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=5,
+                        help="Emulated Switch processing time per subcommand in ms")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    latency = args.latency / 1000
+
+    results = {}
+    for name, adaptive in (("Fixed 15Hz", False), ("Adaptive", True)):
+        durations = []
+        for _ in range(args.runs):
+            duration, round_trips = run_once(adaptive, latency)
+            durations.append(duration)
+        results[name] = durations
+
+    print(f"Subcommands: {len(COMMANDS) + 1}, Switch latency: {args.latency}ms")
+    print("-" * 38)
+    print("| Pacing     | Mean      | Max       |")
+    print("-" * 38)
+    for name, durations in results.items():
+        print(f"| {name:<10} | {statistics.mean(durations):8.3f}s "
+              f"| {max(durations):8.3f}s |")
+    print("-" * 38)
+
+    print("Adaptive round-trip times (last run):")
+    for round_trip in round_trips:
+        print(f"    0x{round_trip['subcommand']:02X}: {round_trip['rtt'] * 1000:.2f}ms")
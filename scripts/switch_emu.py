@@ -11,9 +11,6 @@ import sys
 import os
 import time
 
-from nxbt import toggle_clean_bluez
-from nxbt import BlueZ
-
 REQUEST_INFO = b'\xA2\x01\x02\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 SET_SHIPMENT = b'\xA2\x01\x07\x00\x00\x00\x00\x00\x00\x00\x00\x08\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 SERIAL_NUMBER = b'\xA2\x01\x08\x00\x00\x00\x00\x00\x00\x00\x00\x10\x00\x60\x00\x00\x10\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
@@ -114,6 +111,11 @@ def wait_for_reply(itr):
 
 if __name__ == "__main__":
 
+    # Imported here so that the command sequence can be
+    # reused by other scripts without D-Bus
+    from nxbt import toggle_clean_bluez
+    from nxbt import BlueZ
+
     # Switch Controller Bluetooth MAC Address goes here
     jc_MAC = "98:B6:E9:B0:05:E7"
     port_ctrl = 17
@@ -0,0 +1,106 @@
+"""
+Tests scoring and assigning adapters in the AdapterPool, with a fake
+BlueZ object index in place of DBus.
+"""
+
+import pytest
+
+pytest.importorskip("dbus")
+
+from nxbt import adapters  # noqa: E402
+from nxbt.adapters import AdapterPool  # noqa: E402
+from nxbt.bluez import ADAPTER_INTERFACE  # noqa: E402
+
+
+class FakeIndex():
+
+    subscribed = True
+
+    def __init__(self, paths):
+
+        self.paths = paths
+        self.listeners = []
+
+    def find_objects(self, interface):
+
+        return list(self.paths) if interface == ADAPTER_INTERFACE else []
+
+    def add_object_listener(self, listener):
+
+        self.listeners.append(listener)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+
+    index = FakeIndex(["/org/bluez/hci0", "/org/bluez/hci1"])
+    monkeypatch.setattr(adapters, "get_object_index", lambda: index)
+
+    return AdapterPool()
+
+
+def connect(pool, controller_index, **state):
+
+    pool.observe(controller_index, dict({"state": "connected"}, **state))
+
+
+def test_unused_adapters(pool):
+
+    assert pool.score("/org/bluez/hci0") == 0.5
+    # Ties are broken by path
+    assert pool.adapters == ["/org/bluez/hci0", "/org/bluez/hci1"]
+
+
+def test_success_rate(pool):
+
+    pool.acquire(0, "/org/bluez/hci0")
+    pool.observe(0, {"state": "crashed"})
+    pool.release(0)
+
+    assert pool.score("/org/bluez/hci0") == pytest.approx(1 / 3)
+    assert pool.acquire(1) == "/org/bluez/hci1"
+
+    connect(pool, 1)
+    assert pool.score("/org/bluez/hci1") == pytest.approx(2 / 3)
+    assert pool.adapters == ["/org/bluez/hci1", "/org/bluez/hci0"]
+
+
+def test_penalties(pool):
+
+    pool.acquire(0, "/org/bluez/hci0")
+    connect(pool, 0, connection_time=12)
+    pool.acquire(1, "/org/bluez/hci1")
+    connect(pool, 1, connection_time=12, reconnects=2)
+
+    assert pool.score("/org/bluez/hci0") == pytest.approx(2 / 3 - 0.1)
+    assert pool.score("/org/bluez/hci1") == pytest.approx(2 / 3 - 0.1 - 0.1)
+
+    # Penalties are capped
+    connect(pool, 1, connection_time=12, reconnects=100)
+    assert pool.score("/org/bluez/hci1") == pytest.approx(2 / 3 - 0.1 - 0.25)
+
+
+def test_acquire(pool):
+
+    assert pool.acquire(0) == "/org/bluez/hci0"
+    with pytest.raises(ValueError):
+        pool.acquire(1, "/org/bluez/hci0")
+    with pytest.raises(ValueError):
+        pool.acquire(1, "/org/bluez/hci9")
+
+    assert pool.acquire(1) == "/org/bluez/hci1"
+    with pytest.raises(ValueError):
+        pool.acquire(2)
+
+    assert pool.release(0) == "/org/bluez/hci0"
+    assert pool.free_adapters == ["/org/bluez/hci0"]
+
+
+def test_hotplug(pool):
+
+    listener = pool.index.listeners[0]
+    listener("/org/bluez/hci1", [ADAPTER_INTERFACE], False)
+    listener("/org/bluez/hci2", [ADAPTER_INTERFACE], True)
+
+    assert pool.adapters == ["/org/bluez/hci0", "/org/bluez/hci2"]
+    assert pool.stats()["/org/bluez/hci1"]["hotplug_removes"] == 1
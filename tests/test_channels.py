@@ -0,0 +1,174 @@
+"""
+Tests the encoding and delivery of commands over the per-controller
+command channels.
+"""
+
+import time
+from threading import Thread
+
+import pytest
+
+from nxbt.channels import CommandChannels, READ_BUFFER_SIZE
+from nxbt.slots import SlotAllocator
+
+
+MACRO_ID = "ab" * 24
+
+
+def make_channels(capacity=2, **kwargs):
+
+    channels = CommandChannels(capacity=capacity, **kwargs)
+    channels.slots.allocate(0)
+
+    return channels
+
+
+def macro(macro_id=MACRO_ID, **fields):
+
+    msg = {"type": "macro", "macro": b"\x01" * 18, "macro_id": macro_id,
+           "track": None, "start_at": None}
+    msg.update(fields)
+
+    return msg
+
+
+@pytest.mark.parametrize("msg", [
+    macro(),
+    macro(track="buttons"),
+    macro(start_at=123.5),
+    {"type": "stop", "macro_id": MACRO_ID},
+    {"type": "clear", "track": None},
+    {"type": "clear", "track": "sticks"},
+    {"type": "track", "name": "sticks", "owns": (0, 0, 0, 6), "priority": 2},
+    {"type": "remove_track", "name": "sticks"},
+    {"type": "input", "frame": b"\x01" * 18, "hold": False, "ttl": None},
+    {"type": "input", "frame": b"", "hold": True, "ttl": 2.5},
+    {"type": "schedule_input", "inputs": [(1.0, b"\x01" * 18), (2.0, b"")],
+     "replace": True},
+])
+def test_round_trip(msg):
+
+    channels = make_channels()
+    channels.send(0, msg)
+
+    assert channels.reader(0).receive() == [msg]
+
+
+def test_macro_without_track():
+
+    channels = make_channels()
+    channels.send(0, {"type": "macro", "macro": b"", "macro_id": MACRO_ID})
+
+    assert channels.reader(0).receive()[0]["track"] is None
+
+
+def test_unknown_type():
+
+    with pytest.raises(ValueError):
+        make_channels().encode({"type": "unknown"})
+
+
+def test_receive_limit_counts_macros():
+
+    channels = make_channels()
+    macros = [macro(macro_id=f"{i:048x}") for i in range(4)]
+    channels.send_many(0, macros[:2] + [{"type": "input", "frame": b"", "hold": False,
+                                          "ttl": None}] + macros[2:])
+    reader = channels.reader(0)
+
+    # Other commands aren't held back behind the macros
+    msgs = reader.receive(limit=1)
+    assert [msg["type"] for msg in msgs] == ["macro", "input"]
+    assert msgs[0] == macros[0]
+    assert reader.receive(limit=0) == []
+    assert reader.receive(limit=2) == macros[1:3]
+    assert reader.receive() == [macros[3]]
+
+
+def test_commands_apply_to_held_macros():
+
+    channels = make_channels()
+    macros = [macro(macro_id=f"{i:048x}", track=track)
+              for i, track in enumerate([None, "main", "buttons", "sticks", "sticks"])]
+    channels.send_many(0, macros + [
+        {"type": "stop", "macro_id": macros[0]["macro_id"]},
+        {"type": "clear", "track": "main"},
+        {"type": "remove_track", "name": "sticks"},
+    ])
+    reader = channels.reader(0)
+
+    assert reader.receive(limit=0) == [
+        {"type": "stop", "macro_id": macros[0]["macro_id"]},
+        {"type": "clear", "track": "main"},
+        # Held macros of a removed track are stopped
+        {"type": "stop", "macro_id": macros[3]["macro_id"]},
+        {"type": "stop", "macro_id": macros[4]["macro_id"]},
+        {"type": "remove_track", "name": "sticks"},
+    ]
+    assert reader.receive(limit=1) == [macros[2]]
+
+    channels.send_many(0, macros[:2] + [{"type": "clear", "track": None}])
+    assert reader.receive(limit=0) == [{"type": "clear", "track": None}]
+    assert reader.receive() == []
+
+
+def test_held_macros_block_client():
+
+    channels = make_channels()
+    reader = channels.reader(0)
+    big = macro(macro=b"\x01" * 18 * 1024)
+    sender = Thread(target=channels.send_many, args=(0, [big] * 10))
+    sender.start()
+
+    for _ in range(20):
+        assert reader.receive(limit=0) == []
+        time.sleep(0.01)
+
+    # Held macros stop the reader once its buffer fills
+    assert sender.is_alive()
+    assert reader._held_size < 2 * READ_BUFFER_SIZE
+
+    msgs = []
+    while len(msgs) < 10:
+        msgs.extend(reader.receive())
+    sender.join()
+    assert msgs == [big] * 10
+
+
+def test_channels_are_not_shared():
+
+    channels = CommandChannels(capacity=2, slots=SlotAllocator(2))
+    channels.slots.allocate(0)
+    channels.slots.allocate(64)
+    channels.send(0, {"type": "clear", "track": None})
+
+    assert channels.reader(64).receive() == []
+    assert len(channels.reader(0).receive()) == 1
+    with pytest.raises(ValueError):
+        channels.send(1, {"type": "clear", "track": None})
+
+
+def test_full_channel_of_stopped_controller():
+
+    channels = make_channels(alive=lambda index: False)
+    channels.WRITE_TIMEOUT = 0.01
+    reader = channels.reader(0)
+    # Larger than the pipe
+    big = macro(macro=b"\x01" * 18 * 8192)
+
+    with pytest.raises(BrokenPipeError):
+        channels.send(0, big)
+
+    # The rest of the macro is written ahead of the next send
+    msgs = []
+    clear = {"type": "clear", "track": None}
+    while True:
+        try:
+            channels.send(0, clear)
+            break
+        except BrokenPipeError:
+            msgs += reader.receive()
+    msgs += reader.receive()
+
+    assert msgs[0] == big
+    assert msgs[-1] == clear
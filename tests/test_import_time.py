@@ -0,0 +1,76 @@
+"""
+Checks the import time of each NXBT entry point against a budget.
+
+Each entry point is imported in a fresh interpreter with
+"python -X importtime" and the cumulative import time reported
+for the entry point's module is compared against its budget.
+Heavy dependencies that an entry point shouldn't load eagerly
+are also checked for.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point module: (import time budget in ms, forbidden modules)
+HEAVY_MODULES = ["dbus", "flask", "flask_socketio", "eventlet",
+                 "blessed", "pynput", "psutil"]
+ENTRY_POINTS = {
+    "nxbt": (25, HEAVY_MODULES),
+    "nxbt.controller": (25, HEAVY_MODULES),
+    "nxbt.controller.protocol": (50, HEAVY_MODULES),
+    "nxbt.controller.input": (50, HEAVY_MODULES),
+    "nxbt.web": (25, HEAVY_MODULES),
+    "nxbt.nxbt": (400, ["flask", "flask_socketio", "eventlet",
+                        "blessed", "pynput", "psutil"]),
+}
+
+
+def measure_import(module):
+    """Imports a module in a fresh interpreter and parses the
+    output of "-X importtime".
+
+    :param module: The module to import
+    :type module: str
+    :return: A tuple of the cumulative import time in milliseconds
+    for the module and the set of all modules imported
+    :rtype: tuple
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=ROOT)
+    if result.returncode != 0:
+        pytest.skip(result.stderr.decode("utf-8").strip().split("\n")[-1])
+
+    cumulative = None
+    imported = set()
+    # Lines are formatted as:
+    # "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.decode("utf-8").split("\n"):
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        name = fields[2].strip()
+        imported.add(name)
+        if name == module:
+            cumulative = int(fields[1]) / 1000
+
+    return cumulative, imported
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS.keys())
+def test_import_time(module):
+
+    budget, forbidden = ENTRY_POINTS[module]
+    elapsed, imported = measure_import(module)
+
+    assert [name for name in forbidden if name in imported] == []
+    assert elapsed <= budget
@@ -0,0 +1,261 @@
+"""
+Tests merging macro tracks, the macro buffer's overflow policies,
+starting scheduled macros and holding and scheduling direct input in
+the InputParser.
+"""
+
+import time
+
+import pytest
+
+from nxbt.controller.input import InputParser, FRAME_INPUT
+
+
+class RecordingProtocol():
+    """Records the input set by the InputParser."""
+
+    def __init__(self):
+
+        self.buttons = None
+        self.left_stick = None
+        self.right_stick = None
+
+    def set_button_inputs(self, upper, shared, lower):
+
+        self.buttons = (upper, shared, lower)
+
+    def set_left_stick_inputs(self, position):
+
+        self.left_stick = position
+
+    def set_right_stick_inputs(self, position):
+
+        self.right_stick = position
+
+
+def make_parser(**kwargs):
+
+    return InputParser(RecordingProtocol(), **kwargs)
+
+
+def buttons(parser, line):
+
+    return parser.compile_line(f"{line} 0.1s")[1:4]
+
+
+def stick(parser, line):
+
+    return list(parser.compile_line(f"{line} 0.1s")[4])
+
+
+def test_tracks_merge():
+
+    parser = make_parser()
+    parser.add_track("sticks", owns=parser.track_masks(["L_STICK"]), priority=1)
+    parser.buffer_macro("A L_STICK@-100+000 0.1s", "main")
+    parser.buffer_macro("B L_STICK@+100+000 0.1s", "sticks", track="sticks")
+
+    parser.set_protocol_input()
+
+    # The sticks track doesn't own B, but wins the left stick
+    assert parser.protocol.buttons == buttons(parser, "A")
+    assert parser.protocol.left_stick == stick(parser, "L_STICK@+100+000")
+
+
+def test_tracks_merge_buttons():
+
+    parser = make_parser()
+    parser.add_track("buttons", owns=parser.track_masks(["B"]))
+    parser.buffer_macro("A 0.1s", "main")
+    parser.buffer_macro("B 0.1s", "buttons", track="buttons")
+
+    parser.set_protocol_input()
+
+    assert parser.protocol.buttons == buttons(parser, "A B")
+
+
+def test_remove_track():
+
+    parser = make_parser()
+    parser.buffer_macro("B 0.1s", "buttons", track="buttons")
+
+    assert parser.remove_track("buttons") == ["buttons"]
+    assert "buttons" not in parser.tracks
+    assert not parser.buffered_macros
+
+    # The main track is only cleared
+    parser.buffer_macro("A 0.1s", "main")
+    assert parser.remove_track("main") == ["main"]
+    assert "main" in parser.tracks
+
+
+def test_unknown_track_input():
+
+    with pytest.raises(ValueError):
+        make_parser().track_masks(["UNKNOWN"])
+
+
+def test_overflow_block():
+
+    parser = make_parser(buffer_limit=2)
+
+    assert parser.buffer_space() == 2
+    parser.buffer_macro("A 0.1s", "first")
+    parser.buffer_macro("A 0.1s", "second")
+    assert parser.buffer_space() == 0
+
+    # The caller is expected to stop buffering
+    assert parser.buffer_macro("A 0.1s", "third") == []
+    assert list(parser.buffered_macros) == ["first", "second", "third"]
+
+
+def test_overflow_reject():
+
+    parser = make_parser(buffer_limit=2, overflow_policy="reject")
+    parser.buffer_macro("A 0.1s", "first")
+    parser.buffer_macro("A 0.1s", "second")
+
+    assert parser.buffer_macro("A 0.1s", "third") == ["third"]
+    assert list(parser.buffered_macros) == ["first", "second"]
+
+
+def test_overflow_drop_oldest():
+
+    parser = make_parser(buffer_limit=2, overflow_policy="drop_oldest")
+    parser.buffer_macro("A 0.1s", "first")
+    parser.buffer_macro("A 0.1s", "second", track="other")
+
+    assert parser.buffer_macro("A 0.1s", "third") == ["first"]
+    assert list(parser.buffered_macros) == ["second", "third"]
+    assert list(parser.main_track.buffer) == ["third"]
+
+
+def test_unknown_overflow_policy():
+
+    with pytest.raises(ValueError):
+        make_parser(overflow_policy="unknown")
+
+
+def test_scheduled_macro_start():
+
+    parser = make_parser()
+    start_at = time.monotonic() + 0.02
+    parser.buffer_macro("A 0.1s", "scheduled", start_at=start_at)
+    parser.buffer_macro("B 0.1s", "other", track="other", start_at=start_at + 1)
+
+    # Scheduled macros wait for their start time
+    assert parser.next_start() == start_at
+    parser.set_protocol_input()
+    assert parser.protocol.buttons is None
+    assert parser.started_macros == []
+
+    time.sleep(0.03)
+    parser.set_protocol_input()
+    assert parser.protocol.buttons == buttons(parser, "A")
+    assert parser.started_macros == ["scheduled"]
+    assert parser.next_start() == start_at + 1
+
+
+def test_queued_scheduled_macro():
+
+    parser = make_parser()
+    parser.buffer_macro("A 0.1s", "first")
+    parser.buffer_macro("B 0.1s", "scheduled", start_at=time.monotonic())
+
+    # A scheduled macro behind a running macro waits for the track
+    parser.set_protocol_input()
+    assert parser.next_start() is None
+    assert parser.started_macros == []
+
+
+def test_hold_input():
+
+    parser = make_parser()
+    parser.hold_input(parser.compile_line("A 0s"))
+    parser.set_protocol_input()
+    parser.protocol.buttons = None
+
+    # Held input is set every report and takes priority over macros
+    parser.buffer_macro("B 0.1s", "main")
+    parser.set_protocol_input()
+    assert parser.protocol.buttons == buttons(parser, "A")
+    assert parser.direct_input_pending()
+
+
+def test_hold_input_once():
+
+    parser = make_parser()
+    parser.hold_input(parser.compile_line("A 0s"), once=True)
+
+    parser.set_protocol_input()
+
+    assert parser.protocol.buttons == buttons(parser, "A")
+    assert not parser.direct_input_pending()
+
+
+def test_hold_input_ttl():
+
+    parser = make_parser()
+    parser.hold_input(parser.compile_line("A 0s"), ttl=0.01)
+    time.sleep(0.02)
+
+    parser.set_protocol_input()
+
+    assert parser.protocol.buttons is None
+    assert not parser.direct_input_pending()
+
+
+def test_neutral_input_releases():
+
+    parser = make_parser()
+    parser.hold_input(parser.compile_line("A 0s"))
+
+    # Slightly drifting sticks count as centered
+    drifting = parser.compile_line("L_STICK@+003-002 R_STICK@-004+000 0s")
+    assert drifting[0] & FRAME_INPUT
+    parser.hold_input(drifting)
+
+    assert not parser.direct_input_pending()
+    assert not parser.is_neutral(parser.compile_line("L_STICK@+050+000 0s"))
+
+
+def test_scheduled_input_latest_due():
+
+    parser = make_parser()
+    now = time.monotonic()
+    # Scheduled out of order
+    parser.schedule_input(now - 0.01, parser.compile_line("B 0s"))
+    parser.schedule_input(now - 0.02, parser.compile_line("A 0s"))
+    parser.schedule_input(now + 10, parser.compile_line("X 0s"))
+
+    # Only the latest due frame is held
+    parser.set_protocol_input()
+    assert parser.protocol.buttons == buttons(parser, "B")
+    assert parser.next_start() == now + 10
+
+
+def test_scheduled_input_same_time():
+
+    parser = make_parser()
+    now = time.monotonic()
+    parser.schedule_input(now, parser.compile_line("A 0s"))
+    parser.schedule_input(now, parser.compile_line("B 0s"))
+
+    # Frames due at the same time are applied in the order scheduled
+    parser.apply_scheduled_input()
+    assert parser.held_input == parser.compile_line("B 0s")
+    assert not parser.scheduled_input
+
+
+def test_scheduled_input_release():
+
+    parser = make_parser()
+    parser.hold_input(parser.compile_line("A 0s"))
+    parser.schedule_input(time.monotonic() + 0.01, None)
+
+    parser.apply_scheduled_input()
+    assert parser.held_input is not None
+
+    time.sleep(0.02)
+    parser.apply_scheduled_input()
+    assert not parser.direct_input_pending()
@@ -0,0 +1,70 @@
+"""
+Tests the Nxbt client's checks on its controller processes.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("dbus")
+
+from nxbt.nxbt import Nxbt, process_running, _ControllerManager  # noqa: E402
+
+
+def test_process_running():
+
+    assert process_running(os.getpid())
+
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    # Exited, but not reaped
+    os.waitid(os.P_PID, child.pid, os.WEXITED | os.WNOWAIT)
+    assert not process_running(child.pid)
+    child.wait()
+    assert not process_running(child.pid)
+
+
+def make_client(state, supervised=False):
+
+    # Only the state the check needs, without the manager processes
+    nx = Nxbt.__new__(Nxbt)
+    nx.manager_state = state
+    nx.supervise_controllers = supervised
+
+    return nx
+
+
+def test_controller_running():
+
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    state = {
+        0: {"pid": None, "restarts": 0},
+        1: {"pid": os.getpid(), "restarts": 0},
+        2: {"pid": child.pid, "restarts": 0},
+        3: {"pid": child.pid, "restarts": _ControllerManager.MAX_RESTARTS},
+    }
+
+    nx = make_client(state)
+    assert nx._controller_running(0)
+    assert nx._controller_running(1)
+    assert not nx._controller_running(2)
+    assert not nx._controller_running(4)
+
+    # Crashed supervised controllers are restarted
+    nx = make_client(state, supervised=True)
+    assert nx._controller_running(2)
+    assert not nx._controller_running(3)
+
+
+def test_macro_start_skew():
+
+    nx = make_client({
+        0: {"macro_starts": {"first": 10.25}},
+        1: {"macro_starts": {}},
+    })
+    sync = {"start_at": 10.0, "macro_ids": {0: "first", 1: "second", 2: "third"}}
+
+    # Removed controllers and unstarted macros have no skew
+    assert nx.macro_start_skew(sync) == {0: 0.25, 1: None, 2: None}
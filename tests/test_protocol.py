@@ -0,0 +1,77 @@
+"""
+Tests tracking report changes in the ControllerProtocol's report version.
+"""
+
+from nxbt.controller.controller import ControllerTypes
+from nxbt.controller.protocol import ControllerProtocol
+
+
+def make_protocol():
+
+    protocol = ControllerProtocol(ControllerTypes.PRO_CONTROLLER, "7C:BB:8A:12:34:56")
+    packet = bytearray(50)
+    packet[0] = 0xA2
+    # Device info, which enables input
+    packet[11] = 0x02
+    protocol.process_commands(bytes(packet))
+    protocol.get_report()
+
+    return protocol
+
+
+def tick(protocol, buttons=None, left_stick=None):
+
+    protocol.process_commands(None)
+    if buttons:
+        protocol.set_button_inputs(*buttons)
+    if left_stick:
+        protocol.set_left_stick_inputs(left_stick)
+    protocol.get_report()
+
+    return protocol.report_version
+
+
+def test_unchanged_reports():
+
+    protocol = make_protocol()
+    version = tick(protocol)
+
+    assert tick(protocol) == version
+    assert tick(protocol) == version
+
+
+def test_input_changes():
+
+    protocol = make_protocol()
+    version = tick(protocol)
+
+    pressed = tick(protocol, buttons=(0x08, 0, 0))
+    assert pressed > version
+    # Held input isn't a change
+    assert tick(protocol, buttons=(0x08, 0, 0)) == pressed
+
+    moved = tick(protocol, buttons=(0x08, 0, 0), left_stick=[0x00, 0x08, 0x80])
+    assert moved > pressed
+    assert tick(protocol, buttons=(0x08, 0, 0), left_stick=[0x00, 0x08, 0x80]) == moved
+
+    released = tick(protocol)
+    assert released > moved
+    assert tick(protocol) == released
+
+
+def test_subcommand_replies():
+
+    protocol = make_protocol()
+    version = tick(protocol)
+
+    packet = bytearray(50)
+    packet[0] = 0xA2
+    packet[11] = 0x08
+    for _ in range(2):
+        protocol.process_commands(bytes(packet))
+        protocol.get_report()
+        assert protocol.report_version > version
+        version = protocol.report_version
+
+    # Back to input reports
+    assert tick(protocol) > version
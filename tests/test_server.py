@@ -0,0 +1,121 @@
+"""
+Tests sending reports from the ControllerServer, with fake Bluetooth
+and a fake interrupt socket in place of a Switch connection.
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("dbus")
+
+from nxbt.channels import CommandChannels  # noqa: E402
+from nxbt.controller import ControllerTypes  # noqa: E402
+from nxbt.controller.server import ControllerServer  # noqa: E402
+
+
+class FakeBluetooth():
+
+    address = "7C:BB:8A:12:34:56"
+
+    def reset_address(self):
+
+        pass
+
+
+class FakeSocket():
+    """An interrupt socket whose send buffer is full until opened."""
+
+    def __init__(self):
+
+        self.full = True
+        self.sent = []
+
+    def sendall(self, msg):
+
+        if self.full:
+            raise BlockingIOError
+        self.sent.append(msg)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+
+    monkeypatch.setenv("NXBT_AFFINITY_PATH", str(tmp_path / "affinity.json"))
+
+    return ControllerServer(ControllerTypes.PRO_CONTROLLER,
+                            bluetooth=FakeBluetooth(), prepared=True)
+
+
+def macro(parser, macro_id):
+
+    return {"type": "macro", "macro": parser.compile_macro("A 0.1s"),
+            "macro_id": macro_id, "track": None, "start_at": None}
+
+
+def subcommand(subcommand_id):
+
+    packet = bytearray(50)
+    packet[0] = 0xA2
+    packet[11] = subcommand_id
+
+    return bytes(packet)
+
+
+def test_replies_are_not_superseded(server):
+
+    itr = FakeSocket()
+    server.answer_subcommand(itr, subcommand(0x02))
+    server.answer_subcommand(itr, subcommand(0x08))
+    server.queue_report(b"\xA1\x30first")
+    server.queue_report(b"\xA1\x30second")
+
+    assert not server.flush_report(itr)
+    itr.full = False
+    assert server.flush_report(itr)
+
+    # Replies are sent in order, ahead of the newest input report
+    assert [msg[15] for msg in itr.sent[:2]] == [0x02, 0x08]
+    assert itr.sent[2:] == [b"\xA1\x30second"]
+    assert server.reports_superseded == 1
+    assert not server.reports_pending()
+
+
+def test_block_limits_received_macros(server):
+
+    channels = CommandChannels(capacity=1)
+    channels.slots.allocate(0)
+    server.commands = channels.reader(0)
+    server.input.buffer_limit = 2
+    macro_ids = [f"{i:048x}" for i in range(4)]
+    channels.send_many(0, [macro(server.input, macro_id) for macro_id in macro_ids] +
+                       [{"type": "stop", "macro_id": macro_ids[3]}])
+
+    # The stop is taken without the macros past the limit
+    msgs = server.receive_tasks()
+    assert [msg["type"] for msg in msgs] == ["macro", "macro", "stop"]
+    for msg in msgs[:2]:
+        server.input.buffer_macro(msg["macro"], msg["macro_id"])
+    assert server.receive_tasks() == []
+
+    server.input.stop_macro(macro_ids[0])
+    msgs = server.receive_tasks()
+    assert [msg["macro_id"] for msg in msgs] == [macro_ids[2]]
+
+
+def test_macro_starts_on_flush(server):
+
+    itr = FakeSocket()
+    server.input.buffer_macro("A 0.1s", "scheduled", start_at=time.monotonic())
+    server.input.set_protocol_input()
+    server.queue_report(server.protocol.get_report())
+
+    # Not started until the report with its input is sent
+    assert not server.flush_report(itr)
+    assert server.state["macro_starts"] == {}
+
+    itr.full = False
+    sent = time.monotonic()
+    assert server.flush_report(itr)
+    assert server.state["macro_starts"]["scheduled"] >= sent
+    assert server.input.started_macros == []
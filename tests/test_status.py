@@ -0,0 +1,129 @@
+"""
+Tests reading and writing controller statuses in the shared
+StatusTable and the slot allocation behind it.
+"""
+
+import os
+import struct
+
+import pytest
+
+from nxbt.status import StatusTable, EVENT_FORMAT, EVENT_SIZE, SEQUENCE_FORMAT, STATES
+from nxbt.slots import SlotAllocator
+
+
+def make_table(capacity=2):
+
+    table = StatusTable(capacity=capacity)
+    table.slots.allocate(0)
+
+    return table
+
+
+def test_reset():
+
+    table = make_table()
+    assert table.read(0) is None
+
+    table.reset(0)
+
+    assert table.read(0) == {
+        "controller_index": 0,
+        "state": "initializing",
+        "connection_state": None,
+        "error": False,
+        "player_number": None,
+        "last_connection": None,
+        "reconnects": 0,
+        "ticks": 0,
+        "reports_sent": 0,
+        "reports_suppressed": 0,
+    }
+
+
+def test_update():
+
+    table = make_table()
+    table.update(0, state="connected", connection_state="connected",
+                 player_number=2, last_connection="7C:BB:8A:12:34:56",
+                 reconnects=1, ticks=100)
+
+    status = table.read(0)
+    assert status["state"] == "connected"
+    assert status["connection_state"] == "connected"
+    assert status["player_number"] == 2
+    assert status["last_connection"] == "7C:BB:8A:12:34:56"
+    assert status["reconnects"] == 1
+    assert status["ticks"] == 100
+
+    table.reset(0)
+    assert table.read(0)["state"] == "initializing"
+    assert table.read(0)["last_connection"] is None
+
+
+def test_unknown_field():
+
+    with pytest.raises(ValueError):
+        make_table().update(0, unknown=1)
+
+
+def test_controllers_without_slots():
+
+    table = make_table()
+    table.reset(0)
+
+    assert table.read(1) is None
+    with pytest.raises(ValueError):
+        table.reset(1)
+
+
+def test_state_events():
+
+    table = make_table()
+    table.reset(0)
+    table.update(0, ticks=1)
+    table.update(0, state="connecting")
+
+    # Only state changes are published
+    data = os.read(table.event_fd, EVENT_SIZE * 3)
+    assert [event[1] for event in struct.iter_unpack(EVENT_FORMAT, data)] == [
+        STATES.index("initializing"), STATES.index("connecting")]
+
+
+def test_slots():
+
+    slots = SlotAllocator(2)
+    table = StatusTable(capacity=2, slots=slots)
+
+    assert slots.allocate(64) == 0
+    assert slots.allocate(3) == 1
+    assert slots.allocate(64) == 0
+    with pytest.raises(ValueError):
+        slots.allocate(5)
+
+    table.reset(64)
+    slots.release(64)
+    assert slots.slot(64) is None
+    assert table.read(64) is None
+
+    # A released slot is reused without the old controller's status
+    assert slots.allocate(5) == 0
+    assert table.read(5) is None
+
+
+def test_abandoned_write():
+
+    table = make_table()
+    table.reset(0)
+    table.update(0, ticks=5)
+
+    # A writer terminated mid-write leaves the sequence number odd
+    sequence = struct.unpack_from(SEQUENCE_FORMAT, table.buffer, 0)[0]
+    struct.pack_into(SEQUENCE_FORMAT, table.buffer, 0, sequence + 1)
+    table.READ_RETRIES = 10
+    assert table.read(0) is None
+
+    # The slot's next writer recovers it
+    table.reset(0)
+    assert table.read(0)["ticks"] == 0
+    assert struct.unpack_from(SEQUENCE_FORMAT, table.buffer, 0)[0] % 2 == 0